@@ -1,9 +1,31 @@
-from IPython.display import display, HTML
+try:
+    from IPython.display import display, HTML, Javascript
+    from IPython import get_ipython
+except ImportError:
+    # Without IPython only the headless and capture backends can be used
+    display = HTML = Javascript = get_ipython = None
+import os
 import time
 import math
 import re
 import sys
 import inspect
+import json
+import uuid
+import gzip
+import io
+import bisect
+import itertools
+import functools
+import asyncio
+import threading
+import weakref
+from array import array
+try:
+    import numpy as np
+except ImportError:
+    # walk() and path() fall back to plain Python without NumPy
+    np = None
 
 """ 
 Original Created at: 23rd October 2018
@@ -61,63 +83,1268 @@ VALID_COLORS = ('black', 'navy', 'darkblue', 'mediumblue', 'blue', 'darkgreen',
                 'lightgoldenrodyellow', 'oldlace', 'red', 'fuchsia', 'magenta', 'deeppink', 'orangered', 'tomato', 'hotpink', 'coral', 'darkorange', 
                 'lightsalmon', 'orange', 'lightpink', 'pink', 'gold', 'peachpuff', 'navajowhite', 'moccasin', 'bisque', 'mistyrose', 'blanchedalmond', 
                 'papayawhip', 'lavenderblush', 'seashell', 'cornsilk', 'lemonchiffon', 'floralwhite', 'snow', 'yellow', 'lightyellow', 'ivory', 'white','none','')
-#VALID_COLORS_SET = set(VALID_COLORS)
+VALID_COLORS_SET = frozenset(VALID_COLORS)
+# Patterns for 3 or 6 digit hex color codes and rgb color codes
+HEX_COLOR_PATTERN = re.compile(r"#([0-9a-f]{3}|[0-9a-f]{6})$")
+RGB_COLOR_PATTERN = re.compile(r"rgb\(\s*(\d{1,3})\s*,?\s*(\d{1,3})\s*,?\s*(\d{1,3})\s*\)$")
+# Number of colors whose normalized form is kept
+COLOR_CACHE_SIZE = 1024
+# Colormaps for colormap(), given by colors at evenly spaced points from 0 to 1
+COLORMAPS = {"gray": [(0,0,0), (255,255,255)],
+             "hot": [(10,0,0), (255,0,0), (255,255,0), (255,255,255)],
+             "rainbow": [(255,0,0), (255,255,0), (0,255,0), (0,255,255), (0,0,255), (255,0,255)],
+             "viridis": [(68,1,84), (71,44,122), (59,81,139), (44,113,142), (33,144,141), 
+                         (39,173,129), (92,200,99), (170,220,50), (253,231,37)]}
 VALID_MODES = ('standard','logo','world','svg')
 DEFAULT_TURTLE_SHAPE = 'classic'
 VALID_TURTLE_SHAPES = ('turtle', 'ring', 'classic', 'arrow', 'square', 'triangle', 'circle', 'turtle2', 'blank') 
 DEFAULT_MODE = 'standard'
 DEFAULT_ANGLE_MODE = 'degrees'
+DEFAULT_DELTA_MODE = False
+# Number of decimals of the coordinates in the svg output
+DEFAULT_PRECISION = 3
+# Limits on updates of the drawing window: frames per second and average bytes per second.
+# Jupyter drops output above 1000000 bytes per second by default.
+DEFAULT_FRAME_RATE = 30
+DEFAULT_BYTE_RATE = 800000
+# The display backend is chosen when the screen is created, see Screen().
+# The environment variable COLABTURTLEPLUS_BACKEND overrides the default.
+DEFAULT_BACKEND = 'ipython' if display is not None else 'headless'
 SVG_TEMPLATE = """
-      <svg width="{window_width}" height="{window_height}">  
-        <rect width="100%" height="100%" style="fill:{backcolor};stroke:{kolor};stroke-width:1"/>
-        {drawlines}
-        {stampsB}
-        {lines}
-        {dots}
-        {stampsT}
-        {turtle}
+      <svg id="{svg_id}" width="{window_width}" height="{window_height}">  
+        {groups}
       </svg>
     """
-TURTLE_TURTLE_SVG_TEMPLATE = """<g id="turtle" visibility="{visibility}" transform="rotate({degrees},{rotation_x},{rotation_y}) translate({turtle_x}, {turtle_y})">
-<path style="stroke:{pcolor};fill-rule:evenodd;fill:{turtle_color};fill-opacity:1;" transform="skewX({sk}) scale({sx},{sy})" d="m 1.1536693,-18.56101 c -2.105469,1.167969 -3.203125,3.441407 -3.140625,6.5 l 0.011719,0.519532 -0.300782,-0.15625 c -1.308594,-0.671875 -2.828125,-0.824219 -4.378906,-0.429688 -1.9375,0.484375 -3.8906253,2.089844 -6.0117193,4.9257825 -1.332031,1.785156 -1.714843,2.644531 -1.351562,3.035156 l 0.113281,0.125 h 0.363281 c 0.71875,0 1.308594,-0.265625 4.6679693,-2.113282 1.199219,-0.660156 2.183594,-1.199218 2.191406,-1.199218 0.00781,0 -0.023437,0.089844 -0.074218,0.195312 -0.472657,1.058594 -1.046876,2.785156 -1.335938,4.042969 -1.054688,4.574219 -0.351562,8.453125 2.101562,11.582031 0.28125,0.355469 0.292969,0.253906 -0.097656,0.722656 -2.046875,2.4609375 -3.027344,4.8984375 -2.734375,6.8046875 0.050781,0.339844 0.042969,0.335938 0.679688,0.335938 2.023437,0 4.15625,-1.316407 6.21875,-3.835938 0.222656,-0.269531 0.191406,-0.261719 0.425781,-0.113281 0.730469,0.46875 2.460938,1.390625 2.613281,1.390625 0.160157,0 1.765625,-0.753906 2.652344,-1.246094 0.167969,-0.09375 0.308594,-0.164062 0.308594,-0.160156 0.066406,0.105468 0.761719,0.855468 1.085937,1.171875 1.613282,1.570312 3.339844,2.402343 5.3593747,2.570312 0.324219,0.02734 0.355469,0.0078 0.425781,-0.316406 0.375,-1.742187 -0.382812,-4.058594 -2.1445307,-6.5585935 l -0.320312,-0.457031 0.15625,-0.183594 c 3.2460927,-3.824218 3.4335927,-9.08593704 0.558593,-15.816406 l -0.050781,-0.125 1.7382807,0.859375 c 3.585938,1.773437 4.371094,2.097656 5.085938,2.097656 0.945312,0 0.75,-0.863281 -0.558594,-2.507812 C 11.458356,-11.838353 8.3333563,-13.268041 4.8607003,-11.721166 l -0.363281,0.164063 0.019531,-0.09375 c 0.121094,-0.550781 0.183594,-1.800781 0.121094,-2.378907 -0.203125,-1.867187 -1.035157,-3.199218 -2.695313,-4.308593 -0.523437,-0.351563 -0.546875,-0.355469 -0.789062,-0.222657" />
-</g>"""
+SVG_GROUP_TEMPLATE = """<g id="{id}">{svg}</g>"""
+SVG_BACKGROUND_TEMPLATE = """<rect width="100%" height="100%" style="fill:{backcolor};stroke:{kolor};stroke-width:1"/>"""
+# Client-side receiver for delta rendering. Each op starts with a kind and a group id:
+#   ["s", id, svg]        replaces the contents of the group
+#   ["a", id, svg]        appends to the group
+#   ["c", id, keep, svg]  keeps the first keep child groups of a layer group and appends svg
+#   ["e", id, data]       extends the path data of the last element of a layer group
+#   ["r", id]             removes the element
+# Animations in new content are restarted since the SVG document clock has already passed their begin time.
+# In playback mode the drawing window plays a timeline of steps [duration, ops, glides, ops]: the first ops
+# (styles, symbols and turtles) are applied, the turtles glide to their new place for duration seconds, 
+# each glide [turtle id, dx, dy, turn, x, y] optionally drawing a line [overlay id, x1, y1, class] behind it,
+# and the other ops are applied. A step ["w", svg id, svg] in the first ops replaces the whole drawing.
+# A drawing window that is shown again while steps are still played is put aside until they are done,
+# unless more steps came after it.
+DELTA_RECEIVER_JS = """
+window.ColabTurtlePlus = window.ColabTurtlePlus || {
+  players: {},
+  play: function(svgId, steps) {
+    var p = this.players[svgId] || (this.players[svgId] = {queue: [], running: false, received: 0});
+    for (var i = 0; i < steps.length; i++) p.queue.push(steps[i]);
+    p.received += steps.length;
+    if (p.running) return;
+    p.stage = document.getElementById(svgId);
+    if (!p.stage) { p.queue = []; return; }
+    p.running = true;
+    p.shown = null;
+    p.observer = new MutationObserver(function() {
+      var shown = document.getElementById(svgId);
+      if (shown && shown !== p.stage && p.stage) {
+        shown.parentNode.replaceChild(p.stage, shown);
+        p.shown = shown;
+        p.shownAt = p.received;
+      }
+    });
+    p.observer.observe(document.body, {childList: true, subtree: true});
+    this.next(svgId, p);
+  },
+  steps: function(svgId, p, ops) {
+    if (ops.length && ops[0][0] === "w") {
+      var box = document.createElement("div");
+      box.innerHTML = ops[0][2];
+      var svg = box.querySelector("svg");
+      if (p.stage.parentNode) p.stage.parentNode.replaceChild(svg, p.stage);
+      p.stage = svg;
+    } else {
+      this.apply(svgId, ops);
+    }
+  },
+  next: function(svgId, p) {
+    var self = this;
+    while (p.queue.length) {
+      var step = p.queue.shift(), glides = step[2], duration = 1000*step[0], start = null;
+      this.steps(svgId, p, step[1]);
+      if (duration > 0 && glides.length) {
+        var frame = function(now) {
+          if (start === null) start = now;
+          var u = 1 - Math.min(1, (now - start)/duration);
+          for (var i = 0; i < glides.length; i++) {
+            var a = glides[i], g = document.getElementById(a[0]), o = a.length > 6 && document.getElementById(a[6]);
+            if (g) g.setAttribute("transform", u ? "translate(" + (-a[1]*u) + "," + (-a[2]*u) + ") rotate(" + (-a[3]*u) + "," + a[4] + "," + a[5] + ")" : "");
+            if (o) o.innerHTML = u ? '<line x1="' + a[7] + '" y1="' + a[8] + '" x2="' + (a[4] - a[1]*u) + '" y2="' + (a[5] - a[2]*u) + '" stroke-linecap="round" ' + a[9] + ' />' : "";
+          }
+          if (u) return requestAnimationFrame(frame);
+          self.steps(svgId, p, step[3]);
+          self.next(svgId, p);
+        };
+        return requestAnimationFrame(frame);
+      }
+      if (duration > 0) {
+        return setTimeout(function() { self.steps(svgId, p, step[3]); self.next(svgId, p); }, duration);
+      }
+      this.steps(svgId, p, step[3]);
+    }
+    p.running = false;
+    p.observer.disconnect();
+    if (p.shown && p.shownAt === p.received && p.stage.parentNode) p.stage.parentNode.replaceChild(p.shown, p.stage);
+    p.shown = null;
+  },
+  apply: function(svgId, ops) {
+    if (!document.getElementById(svgId)) return;
+    for (var i = 0; i < ops.length; i++) {
+      var op = ops[i], g = document.getElementById(op[1]);
+      if (!g) continue;
+      if (op[0] === "r") {
+        g.parentNode.removeChild(g);
+        continue;
+      }
+      if (op[0] === "s") {
+        g.innerHTML = op[2];
+      } else if (op[0] === "a") {
+        g.insertAdjacentHTML("beforeend", op[2]);
+      } else if (op[0] === "e") {
+        var run = g.lastElementChild && g.lastElementChild.lastElementChild;
+        if (run) run.setAttribute("d", run.getAttribute("d") + op[2]);
+      } else {
+        while (g.children.length > op[2]) g.removeChild(g.lastElementChild);
+        g.insertAdjacentHTML("beforeend", op[3]);
+      }
+      var anims = g.querySelectorAll("animateTransform[begin='0s']");
+      for (var j = 0; j < anims.length; j++) anims[j].beginElement();
+    }
+  }
+};
+"""
+# Shapes drawn through a symbol: each shape used is written once as a symbol in the defs of the drawing
+# and turtles and stamps refer to it with a use element that carries the transform and the colors.
+# The ring and circle shapes depend on the stretch factors in other ways and are written out in full.
+TURTLE_SHAPE_SYMBOLS = {"turtle": """<path fill-rule="evenodd" stroke-width="1" d="m 1.1536693,-18.56101 c -2.105469,1.167969 -3.203125,3.441407 -3.140625,6.5 l 0.011719,0.519532 -0.300782,-0.15625 c -1.308594,-0.671875 -2.828125,-0.824219 -4.378906,-0.429688 -1.9375,0.484375 -3.8906253,2.089844 -6.0117193,4.9257825 -1.332031,1.785156 -1.714843,2.644531 -1.351562,3.035156 l 0.113281,0.125 h 0.363281 c 0.71875,0 1.308594,-0.265625 4.6679693,-2.113282 1.199219,-0.660156 2.183594,-1.199218 2.191406,-1.199218 0.00781,0 -0.023437,0.089844 -0.074218,0.195312 -0.472657,1.058594 -1.046876,2.785156 -1.335938,4.042969 -1.054688,4.574219 -0.351562,8.453125 2.101562,11.582031 0.28125,0.355469 0.292969,0.253906 -0.097656,0.722656 -2.046875,2.4609375 -3.027344,4.8984375 -2.734375,6.8046875 0.050781,0.339844 0.042969,0.335938 0.679688,0.335938 2.023437,0 4.15625,-1.316407 6.21875,-3.835938 0.222656,-0.269531 0.191406,-0.261719 0.425781,-0.113281 0.730469,0.46875 2.460938,1.390625 2.613281,1.390625 0.160157,0 1.765625,-0.753906 2.652344,-1.246094 0.167969,-0.09375 0.308594,-0.164062 0.308594,-0.160156 0.066406,0.105468 0.761719,0.855468 1.085937,1.171875 1.613282,1.570312 3.339844,2.402343 5.3593747,2.570312 0.324219,0.02734 0.355469,0.0078 0.425781,-0.316406 0.375,-1.742187 -0.382812,-4.058594 -2.1445307,-6.5585935 l -0.320312,-0.457031 0.15625,-0.183594 c 3.2460927,-3.824218 3.4335927,-9.08593704 0.558593,-15.816406 l -0.050781,-0.125 1.7382807,0.859375 c 3.585938,1.773437 4.371094,2.097656 5.085938,2.097656 0.945312,0 0.75,-0.863281 -0.558594,-2.507812 C 11.458356,-11.838353 8.3333563,-13.268041 4.8607003,-11.721166 l -0.363281,0.164063 0.019531,-0.09375 c 0.121094,-0.550781 0.183594,-1.800781 0.121094,-2.378907 -0.203125,-1.867187 -1.035157,-3.199218 -2.695313,-4.308593 -0.523437,-0.351563 -0.546875,-0.355469 -0.789062,-0.222657" />""",
+                        "classic": """<polygon points="-5,-4.5 0,-2.5 5,-4.5 0,4.5" />""",
+                        "arrow": """<polygon points="-10,-5 0,5 10,-5" />""",
+                        "square": """<polygon points="10,-10 10,10 -10,10 -10,-10" />""",
+                        "triangle": """<polygon points="10,-8.66 0,8.66 -10,-8.66" />""",
+                        "turtle2": """<polygon points="0,16 2,14 1,10 4,7 7,9 9,8 6,5 7,1 5,-3 8,-6 6,-8 4,-5 0,-7 -4,-5 -6,-8 -8,-6 -5,-3 -7,1 -6,5 -9,8 -7,9 -4,7 -1,10 -2,14" stroke-width="1" />"""}
+SVG_SYMBOL_TEMPLATE = """<symbol id="{id}" overflow="visible">{svg}</symbol>"""
+SVG_DEFS_TEMPLATE = """<defs id="{id}">{svg}</defs>"""
+TURTLE_USE_SVG_TEMPLATE = """<use xlink:href="#{href}" visibility="{visibility}" transform="rotate({degrees},{rotation_x},{rotation_y}) translate({turtle_x}, {turtle_y}) skewX({sk}) scale({sx},{sy})" stroke="{pcolor}" fill="{turtle_color}" stroke-width="{pw}"></use>"""
+# The animation of a turn, added before the closing tag of the turtle's shape while right() turns it
+TURTLE_TURN_ANIMATION_TEMPLATE = """<animateTransform id = "one" attributeName="transform" 
+                      type="scale"
+                      from="1 1" to="{turn_sx} {turn_sy}"
+                      begin="0s" dur="0.01s"
+                      repeatCount="1"
+                      additive="sum"
+                      fill="freeze"
+                /><animateTransform attributeName="transform"
+                    type="rotate"
+                    from="0 0 0" to ="{extent} 0 0"
+                    begin="one.end" dur="{dur}s"
+                    repeatCount="1"
+                    additive="sum"
+                    fill="freeze"
+                />"""
+# Number of turtle sprites kept for reuse by each screen
+SPRITE_CACHE_SIZE = 256
 TURTLE_RING_SVG_TEMPLATE = """<g id="ring" visibility="{visibility}" transform="rotate({degrees},{rotation_x},{rotation_y}) translate({turtle_x}, {turtle_y})">
 <ellipse stroke="{pcolor}" transform="skewX({sk})" stroke-width="3" fill="transparent" rx="{rx}" ry = "{ry}" cx="0" cy="{cy}" />
 <polygon points="0,5 5,0 -5,0" transform="skewX({sk}) scale({sx},{sy})" style="fill:{turtle_color};stroke:{pcolor};stroke-width:1" />
 </g>"""
-TURTLE_CLASSIC_SVG_TEMPLATE = """<g id="classic" visibility="{visibility}" transform="rotate({degrees},{rotation_x},{rotation_y}) translate({turtle_x}, {turtle_y})">
-<polygon points="-5,-4.5 0,-2.5 5,-4.5 0,4.5" transform="skewX({sk}) scale({sx},{sy})" style="stroke:{pcolor};fill:{turtle_color};stroke-width:{pw}" />
-</g>"""
-TURTLE_ARROW_SVG_TEMPLATE = """<g id="arrow" visibility="{visibility}" transform="rotate({degrees},{rotation_x},{rotation_y}) translate({turtle_x}, {turtle_y})">
-<polygon points="-10,-5 0,5 10,-5" transform="skewX({sk}) scale({sx},{sy})" style="stroke:{pcolor};fill:{turtle_color};stroke-width:{pw}" />
-</g>"""
-TURTLE_SQUARE_SVG_TEMPLATE = """<g id="square" visibility="{visibility}" transform="rotate({degrees},{rotation_x},{rotation_y}) translate({turtle_x}, {turtle_y})">
-<polygon points="10,-10 10,10 -10,10 -10,-10" transform="skewX({sk}) scale({sx},{sy})" style="stroke:{pcolor};fill:{turtle_color};stroke-width:{pw}" />
-</g>"""
-TURTLE_TRIANGLE_SVG_TEMPLATE = """<g id="triangle" visibility="{visibility}" transform="rotate({degrees},{rotation_x},{rotation_y}) translate({turtle_x}, {turtle_y})">
-<polygon points="10,-8.66 0,8.66 -10,-8.66" transform="skewX({sk}) scale({sx},{sy})" style="stroke:{pcolor};fill:{turtle_color};stroke-width:{pw}" />
-</g>"""
 TURTLE_CIRCLE_SVG_TEMPLATE = """<g id="ellipse" visibility="{visibility}" transform="rotate({degrees},{rotation_x},{rotation_y}) translate({turtle_x}, {turtle_y})">
 <ellipse transform="skewX({sk}) scale({sx},{sy})" style="stroke:{pcolor};fill:{turtle_color};stroke-width:{pw}" rx="{rx}" ry = "{ry}" cx="0" cy="0" />
 </g>"""
-TURTLE_TURTLE2_SVG_TEMPLATE = """<g id="turtle2" visibility="{visibility}" transform="rotate({degrees},{rotation_x},{rotation_y}) translate({turtle_x}, {turtle_y})">
-<polygon points="0,16 2,14 1,10 4,7 7,9 9,8 6,5 7,1 5,-3 8,-6 6,-8 4,-5 0,-7 -4,-5 -6,-8 -8,-6 -5,-3 -7,1 -6,5 -9,8 -7,9 -4,7 -1,10 -2,14" transform="skewX({sk}) scale({sx},{sy})" style="stroke:{pcolor};stroke-width:1;fill:{turtle_color}" />
-</g>"""
 
 SPEED_TO_SEC_MAP = {0: 0, 1: 1.0, 2: 0.8, 3: 0.5, 4: 0.3, 5: 0.25, 6: 0.20, 7: 0.15, 8: 0.125, 9: 0.10, 10: 0.08, 11: 0.04, 12: 0.02, 13: 0.005}
 
+# Templates for the primitives kept in a geometry store. The last field is the class of the style from the screen's style table.
+SVG_LINE_TEMPLATE = """<line x1="{}" y1="{}" x2="{}" y2="{}" stroke-linecap="round" {} />"""
+SVG_RUN_TEMPLATE = """<path d="M{} {}l{}" stroke-linecap="round" stroke-linejoin="round" fill="none" {} />"""
+# The vertices of long runs are written to files in pieces of this many numbers
+SVG_RUN_PIECE = 2000
+# Amount of text collected before each write when an svg file is written
+SVG_WRITE_BUFFER = 1 << 16
+SVG_ARC_TEMPLATE = """<path d="M {} {} A {} {} 0 0 {} {} {}" stroke-linecap="round" fill="transparent" fill-opacity="0" {} />"""
+SVG_FILL_TEMPLATE = """<path d="{}" stroke-linecap="round" {} />"""
+SVG_TEXT_TEMPLATE = """<text x="{}" y="{}" {}>{}</text>"""
+SVG_DOT_TEMPLATE = """<circle cx="{}" cy="{}" r="{}" {} />"""
+SVG_STYLE_TEMPLATES = {"stroke": 'stroke:{};stroke-width:{}',
+                       "fill": 'fill-rule:{};fill-opacity:{};stroke:{};stroke-width:{};fill:{}',
+                       "text": 'fill:{};text-anchor:{};{}',
+                       "dot": 'fill:{};fill-opacity:1'}
+# Each style of the table is a css class, whose rule only applies inside the svg element of the screen.
+# Saved files write the style into each element instead, so they look the same wherever they are used.
+SVG_STYLE_CLASS_TEMPLATE = 'class="s{}"'
+SVG_STYLE_INLINE_TEMPLATE = 'style="{}"'
+SVG_STYLE_RULE_TEMPLATE = '#{} .s{}{{{}}}'
+SVG_STYLE_SHEET_TEMPLATE = """<style id="{id}">{svg}</style>"""
+# Number of primitives in each group of a layer when the whole drawing is sent to the drawing window
+SVG_CHUNK_SIZE = 1000
+# Size in pixels of the cells of the grid that finds the primitives in a region, and the number of
+# cells above which a primitive is kept in a list of large primitives instead
+SPATIAL_CELL_SIZE = 64
+SPATIAL_BIG_CELLS = 64
+# Number of segments in each piece of a run that the grid keeps apart
+SPATIAL_RUN_PIECE = 32
+# Primitives further than this many pixels, or the widest pen, outside the drawing window are left out
+CULL_MARGIN = 16
+
+#------------------------------------------------------------------------------------------------
+
+# Helper function that writes a number with at most 'precision' decimals in its shortest form,
+# e.g. 400.0 as "400", 0.5 as ".5" and -0.25 as "-.25"
+def _shortNumber(v, precision):
+    s = "%.*f" % (precision, v)
+    if precision:
+        s = s.rstrip("0").rstrip(".")
+    if s[:2] == "0.":
+        return s[1:]
+    if s[:3] == "-0.":
+        return "-" + s[2:]
+    return "0" if s == "-0" else s
+
+# Helper function that joins the numbers of path data. No space is needed before a minus sign.
+# The result starts with a space unless the first number is negative.
+def _joinNumbers(numbers):
+    return "".join([s if s[0] == "-" else " " + s for s in numbers])
+
+# Helper function for the distance from (x, y) to the polyline with vertices coords[j:end], of at least
+# one segment, and the index in coords of the end of its nearest segment
+def _polylineDistance(x, y, coords, j, end):
+    if np is not None and end - j > 64:
+        v = np.frombuffer(coords, dtype=float)[j:end]
+        x1, y1, x2, y2 = v[0:-2:2], v[1:-2:2], v[2::2], v[3::2]
+        dx, dy = x2 - x1, y2 - y1
+        length2 = dx*dx + dy*dy
+        t = np.clip(((x - x1)*dx + (y - y1)*dy)/np.where(length2 > 0, length2, 1), 0, 1)
+        d2 = (x1 + t*dx - x)**2 + (y1 + t*dy - y)**2
+        m = int(d2.argmin())
+        return float(math.sqrt(d2[m])), j + 2 + 2*m
+    best = None
+    for k in range(j, end-2, 2):
+        x1, y1, x2, y2 = coords[k], coords[k+1], coords[k+2], coords[k+3]
+        dx, dy = x2 - x1, y2 - y1
+        length2 = dx*dx + dy*dy
+        t = min(max(((x - x1)*dx + (y - y1)*dy)/length2, 0), 1) if length2 else 0
+        d = math.hypot(x1 + t*dx - x, y1 + t*dy - y)
+        if best is None or d < best[0]:
+            best = (d, k+2)
+    return best
+
+# Helper function that tells whether the segment from (x1, y1) to (x2, y2) meets box = (xmin, ymin, xmax, ymax).
+# The segment is clipped to the box one side at a time, as in the Liang-Barsky algorithm.
+def _segmentMeetsBox(x1, y1, x2, y2, box):
+    t0, t1 = 0, 1
+    dx, dy = x2 - x1, y2 - y1
+    for d, q in ((-dx, x1 - box[0]), (dx, box[2] - x1), (-dy, y1 - box[1]), (dy, box[3] - y1)):
+        if d == 0:
+            if q < 0:
+                return False
+        elif d < 0:
+            t0 = max(t0, q/d)
+        else:
+            t1 = min(t1, q/d)
+    return t0 <= t1
+
+# Helper function that simplifies the polylines with vertices (xs[i], ys[i]) for i from a to b for each
+# pair a, b by Douglas-Peucker: a polyline is cut at its vertex farthest from the segment between its
+# ends while that is more than tolerance away, and the cuts are marked in keep. A vertex on a straight
+# line with its neighbours is never farthest by more than 0, so collinear segments are merged. With
+# NumPy, all polylines that are still cut are handled at once.
+def _douglasPeucker(xs, ys, pairs, tolerance, keep):
+    limit = tolerance*tolerance
+    if np is not None and not isinstance(xs, list):
+        a, b = np.array([p[0] for p in pairs], dtype=int), np.array([p[1] for p in pairs], dtype=int)
+        while len(a):
+            inner = b - a > 1
+            a, b = a[inner], b[inner]
+            if not len(a):
+                break
+            lengths = b - a - 1
+            offsets = np.cumsum(lengths) - lengths
+            seg = np.repeat(np.arange(len(a)), lengths)
+            idx = np.arange(len(seg)) - offsets[seg] + a[seg] + 1
+            dx, dy = (xs[b] - xs[a])[seg], (ys[b] - ys[a])[seg]
+            px, py = xs[idx] - xs[a][seg], ys[idx] - ys[a][seg]
+            length2 = dx*dx + dy*dy
+            t = np.clip((px*dx + py*dy)/np.where(length2 > 0, length2, 1), 0, 1)
+            ex, ey = px - t*dx, py - t*dy
+            d = ex*ex + ey*ey
+            worst = np.maximum.reduceat(d, offsets)
+            hits = np.flatnonzero(d == worst[seg])
+            firsts = np.unique(seg[hits], return_index=True)[1]
+            far = worst > limit
+            cut = idx[hits[firsts]][far]
+            keep[cut] = True
+            a, b = np.concatenate((a[far], cut)), np.concatenate((cut, b[far]))
+        return
+    stack = list(pairs)
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        dx, dy = xs[b] - xs[a], ys[b] - ys[a]
+        length2 = dx*dx + dy*dy
+        worst, cut = -1, a
+        for i in range(a+1, b):
+            px, py = xs[i] - xs[a], ys[i] - ys[a]
+            t = min(max((px*dx + py*dy)/(length2 if length2 > 0 else 1), 0), 1)
+            ex, ey = px - t*dx, py - t*dy
+            d = ex*ex + ey*ey
+            if d > worst:
+                worst, cut = d, i
+        if worst > limit:
+            keep[cut] = True
+            stack.append((a, cut))
+            stack.append((cut, b))
+
+# Offsets in path data already written for each precision, as text with its separator
+_offset_cache = [{} for precision in range(11)]
+
+# Kinds of primitives in a geometry store and the numbers kept for each in its coords:
+#   _LINE  x1 y1 x2 y2
+#   _ARC   x1 y1 rx ry sweep x2 y2
+#   _FILL  x y, then 0 x y for each line or 1 rx ry sweep x y for each arc of the path
+#   _TEXT  x y n, where n is the index of the string in texts
+#   _DOT   cx cy r
+#   _RUN   x0 y0 x1 y1 ... for a polyline of consecutive moves with the same pen
+_LINE, _ARC, _FILL, _TEXT, _DOT, _RUN = range(6)
+# Names of the kinds of primitives for find_items() and nearest()
+SPATIAL_KIND_NAMES = ('line', 'arc', 'fill', 'text', 'dot', 'line')
+
+class _GeometryStore:
+    """Compact record of the primitives drawn in one layer.
+
+    Coordinates are kept in a flat array of doubles and each primitive
+    refers to an entry of the screen's style table, so drawing a segment
+    only appends a few numbers. The SVG for the primitives is produced
+    when the drawing is displayed or saved.
+
+    The store also remembers how much of it the drawing window already 
+    shows: synced is the number of leading primitives unchanged since the
+    last update and chunk_ends gives the primitive count at the end of 
+    each group of elements sent to the window.
+
+    Consecutive pen-down moves with the same style extend one open run
+    (a single path element) until the run is sealed or another primitive
+    is added. When the window already shows the run, only its new vertices
+    are sent.
+
+    Every change bumps version, which marks the layer dirty. The svg of
+    the layer is cached in chunks, and cached is the number of leading 
+    primitives whose chunks can be reused, so only chunks after a change 
+    are rendered again.
+
+    The bounding boxes of the primitives are kept in boxes, for the first
+    boxed primitives, and are computed when they are first needed. They
+    are used to leave out the primitives outside a view. When the layer
+    is first searched, its primitives are cut into pieces, with at most
+    SPATIAL_RUN_PIECE segments of a run in each, and a grid of cells of
+    SPATIAL_CELL_SIZE pixels finds the pieces in a region, so a search
+    only looks at the segments of a long run near the region.
+    """
+    def __init__(self):
+        self.chunk_ends = []
+        self.version = 0
+        self.render_version = -1
+        self.render_svg = ""
+        self.render_chunks = []
+        self.render_precision = None
+        self.render_view = None
+        self.clear()
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def clear(self):
+        self.kinds = array('b')
+        self.styles = array('l')
+        self.starts = array('l')
+        self.coords = array('d')
+        self.texts = []
+        self.synced = 0
+        self.synced_end = 0
+        self.synced_culled = False
+        self.open_run = False
+        self.cached = 0
+        self.boxes = array('d')
+        self.boxed = 0
+        self.box_end = 0
+        self.grid = {}
+        self.big = []
+        self.pieces = array('l')
+        self.piece_boxes = array('d')
+        self.first_piece = array('l')
+        self.piece_end = 0
+        self.version += 1
+
+    def add(self, kind, style, values):
+        self.open_run = False
+        self.version += 1
+        self.kinds.append(kind)
+        self.styles.append(style)
+        self.starts.append(len(self.coords))
+        self.coords.extend(values)
+
+    def addText(self, style, x, y, text):
+        self.add(_TEXT, style, (x, y, len(self.texts)))
+        self.texts.append(text)
+
+    # Add a segment, extending the open run if it has the same style and ends where the segment starts
+    def addSegment(self, style, x1, y1, x2, y2):
+        c = self.coords
+        if self.open_run and self.styles[-1] == style and c[-2] == x1 and c[-1] == y1:
+            c.append(x2)
+            c.append(y2)
+            self.version += 1
+            self.cached = min(self.cached, len(self.kinds)-1)
+        else:
+            self.add(_RUN, style, (x1, y1, x2, y2))
+            self.open_run = True
+
+    # Add a polyline from (x1, y1) through the coordinates in points, a buffer of doubles
+    # such as array('d'), extending the open run like addSegment
+    def addPolyline(self, style, x1, y1, points):
+        c = self.coords
+        if self.open_run and self.styles[-1] == style and c[-2] == x1 and c[-1] == y1:
+            c.frombytes(memoryview(points).cast("B"))
+            self.version += 1
+            self.cached = min(self.cached, len(self.kinds)-1)
+        else:
+            self.add(_RUN, style, (x1, y1))
+            c.frombytes(memoryview(points).cast("B"))
+            self.open_run = True
+
+    # Close the open run so that the next segment starts a new element
+    def seal(self):
+        self.open_run = False
+
+    # Remove all primitives after the first n
+    def truncate(self, n):
+        if n >= len(self.kinds):
+            return
+        for i in range(n, len(self.kinds)):
+            if self.kinds[i] == _TEXT:
+                del self.texts[int(self.coords[self.starts[i]+2]):]
+                break
+        del self.coords[self.starts[n]:]
+        del self.kinds[n:]
+        del self.styles[n:]
+        del self.starts[n:]
+        self.synced = min(self.synced, n)
+        self.cached = min(self.cached, n)
+        self.boxed = min(self.boxed, n)
+        self.box_end = min(self.box_end, len(self.coords))
+        if n < len(self.first_piece):
+            self._dropPieces(self.first_piece[n])
+            del self.first_piece[n:]
+        self.piece_end = min(self.piece_end, len(self.coords))
+        self.open_run = False
+        self.version += 1
+
+    # Helper function for the bounding box of a primitive whose numbers are coords[j:end]
+    def _primitiveBox(self, kind, j, end):
+        c = self.coords
+        if kind == _RUN:
+            xs, ys = c[j:end:2], c[j+1:end:2]
+            return min(xs), min(ys), max(xs), max(ys)
+        if kind == _LINE:
+            return min(c[j], c[j+2]), min(c[j+1], c[j+3]), max(c[j], c[j+2]), max(c[j+1], c[j+3])
+        if kind == _DOT:
+            r = c[j+2]
+            return c[j]-r, c[j+1]-r, c[j]+r, c[j+1]+r
+        if kind == _ARC:
+            # an arc of at most half a circle lies within its radius of the middle of its chord,
+            # and the radii of a clockwise arc are negative
+            r = max(abs(c[j+2]), abs(c[j+3]))
+            mx, my = (c[j] + c[j+5])/2, (c[j+1] + c[j+6])/2
+            return (min(mx-r, c[j], c[j+5]), min(my-r, c[j+1], c[j+6]),
+                    max(mx+r, c[j], c[j+5]), max(my+r, c[j+1], c[j+6]))
+        if kind == _FILL:
+            xs, ys, r = [c[j]], [c[j+1]], 0
+            j += 2
+            while j < end:
+                if c[j] == 0:
+                    xs.append(c[j+1])
+                    ys.append(c[j+2])
+                    j += 3
+                else:
+                    r = max(r, abs(c[j+1]), abs(c[j+2]))
+                    xs.append(c[j+4])
+                    ys.append(c[j+5])
+                    j += 6
+            return min(xs)-r, min(ys)-r, max(xs)+r, max(ys)+r
+        return c[j], c[j+1], c[j], c[j+1]
+
+    # Helper function that computes the boxes of the primitives added since the last call,
+    # and grows the box of the last primitive if it is a run that was extended
+    def _boxTo(self):
+        n = len(self.kinds)
+        kinds, starts, c, boxes = self.kinds, self.starts, self.coords, self.boxes
+        k = self.boxed
+        if k and kinds[k-1] == _RUN:
+            end = starts[k] if k < n else len(c)
+            if end > self.box_end:
+                x0, y0, x1, y1 = self._primitiveBox(_RUN, self.box_end, end)
+                boxes[4*k-4:4*k] = array('d', (min(x0, boxes[4*k-4]), min(y0, boxes[4*k-3]), 
+                                               max(x1, boxes[4*k-2]), max(y1, boxes[4*k-1])))
+        del boxes[4*k:]
+        for i in range(k, n):
+            boxes.extend(self._primitiveBox(kinds[i], starts[i], starts[i+1] if i+1 < n else len(c)))
+        self.boxed = n
+        self.box_end = len(c)
+
+    # Helper function that tells whether primitive i lies outside the view (xmin, ymin, xmax, ymax).
+    # Texts are never left out since their size is not known.
+    def _culled(self, i, view):
+        b = self.boxes
+        return (self.kinds[i] != _TEXT and 
+                (b[4*i+2] < view[0] or b[4*i] > view[2] or b[4*i+3] < view[1] or b[4*i+1] > view[3]))
+
+    # Helper function that adds a piece of primitive i, the numbers coords[a:b], to the grid. The piece
+    # of a line or run is made of the segments that end at k for k in range(a, b, 2). Pieces that cover
+    # more than SPATIAL_BIG_CELLS cells are kept in a list of their own.
+    def _addPiece(self, i, a, b):
+        p = len(self.pieces)//3
+        kind = self.kinds[i]
+        box = self._primitiveBox(kind, a-2, b) if kind in (_LINE, _RUN) else self._primitiveBox(kind, a, b)
+        self.pieces.extend((i, a, b))
+        self.piece_boxes.extend(box)
+        size = SPATIAL_CELL_SIZE
+        cx0, cy0, cx1, cy1 = int(box[0] // size), int(box[1] // size), int(box[2] // size), int(box[3] // size)
+        if (cx1 - cx0 + 1)*(cy1 - cy0 + 1) > SPATIAL_BIG_CELLS:
+            self.big.append(p)
+            return
+        for cx in range(cx0, cx1+1):
+            for cy in range(cy0, cy1+1):
+                self.grid.setdefault((cx, cy), []).append(p)
+
+    # Helper function that cuts primitive i into pieces from a to end: a run from its segment that ends
+    # at a every SPATIAL_RUN_PIECE segments, and any other primitive, from its start a, as one piece
+    def _cutPieces(self, i, a, end):
+        if self.kinds[i] == _RUN:
+            step = 2*SPATIAL_RUN_PIECE
+            for k in range(a, end, step):
+                self._addPiece(i, k, min(k + step, end))
+        else:
+            self._addPiece(i, a, end)
+
+    # Helper function that removes piece p and all later pieces from the grid
+    def _dropPieces(self, p):
+        b, size = self.piece_boxes, SPATIAL_CELL_SIZE
+        for q in range(p, len(self.pieces)//3):
+            cx0, cy0, cx1, cy1 = int(b[4*q] // size), int(b[4*q+1] // size), int(b[4*q+2] // size), int(b[4*q+3] // size)
+            if (cx1 - cx0 + 1)*(cy1 - cy0 + 1) > SPATIAL_BIG_CELLS:
+                continue
+            for cx in range(cx0, cx1+1):
+                for cy in range(cy0, cy1+1):
+                    cell = self.grid.get((cx, cy), [])
+                    while cell and cell[-1] >= p:
+                        cell.pop()
+                    if not cell:
+                        self.grid.pop((cx, cy), None)
+        while self.big and self.big[-1] >= p:
+            self.big.pop()
+        del self.pieces[3*p:]
+        del self.piece_boxes[4*p:]
+
+    # Helper function that adds the primitives added since the last call to the grid. When the last run
+    # was extended since, its last piece is cut again.
+    def _gridTo(self):
+        n = len(self.kinds)
+        kinds, starts, c, pieces = self.kinds, self.starts, self.coords, self.pieces
+        k = len(self.first_piece)
+        if k and kinds[k-1] == _RUN:
+            end = starts[k] if k < n else len(c)
+            if end > self.piece_end:
+                p = len(pieces)//3 - 1
+                if p >= self.first_piece[k-1]:
+                    a = pieces[3*p+1]
+                    self._dropPieces(p)
+                else:
+                    a = starts[k-1] + 2
+                self._cutPieces(k-1, a, end)
+        for i in range(k, n):
+            self.first_piece.append(len(pieces)//3)
+            j = starts[i] + 2 if kinds[i] in (_LINE, _RUN) else starts[i]
+            self._cutPieces(i, j, starts[i+1] if i+1 < n else len(c))
+        self.piece_end = len(c)
+
+    def find(self, box):
+        """Returns the sorted pairs (i, k) for the parts of the primitives that meet box = (xmin, ymin, xmax, ymax).
+
+        For a line or run, k is the index in coords of the end of a segment that meets the box. For
+        any other primitive whose bounding box meets the box, k is its start.
+        """
+        self._gridTo()
+        size = SPATIAL_CELL_SIZE
+        cx0, cy0, cx1, cy1 = int(box[0] // size), int(box[1] // size), int(box[2] // size), int(box[3] // size)
+        if (cx1 - cx0 + 1)*(cy1 - cy0 + 1) > len(self.grid):
+            candidates = set(p for cell in self.grid.values() for p in cell)
+        else:
+            candidates = set(p for cx in range(cx0, cx1+1) for cy in range(cy0, cy1+1) for p in self.grid.get((cx, cy), ()))
+        candidates.update(self.big)
+        kinds, pieces, b, c = self.kinds, self.pieces, self.piece_boxes, self.coords
+        found = []
+        for p in candidates:
+            if b[4*p] > box[2] or b[4*p+2] < box[0] or b[4*p+1] > box[3] or b[4*p+3] < box[1]:
+                continue
+            i, a, e = pieces[3*p], pieces[3*p+1], pieces[3*p+2]
+            if kinds[i] not in (_LINE, _RUN):
+                found.append((i, a))
+            elif b[4*p] >= box[0] and b[4*p+2] <= box[2] and b[4*p+1] >= box[1] and b[4*p+3] <= box[3]:
+                found.extend([(i, k) for k in range(a, e, 2)])
+            else:
+                found.extend([(i, k) for k in range(a, e, 2) if _segmentMeetsBox(c[k-2], c[k-1], c[k], c[k+1], box)])
+        found.sort()
+        return found
+
+    def nearest(self, x, y):
+        """Returns (distance, i, k) for the segment of a line or run that passes closest to (x, y),
+        where k is the index in coords of the end of the segment, or None if there is none."""
+        self._gridTo()
+        kinds, pieces, c = self.kinds, self.pieces, self.coords
+        size = SPATIAL_CELL_SIZE
+        best = None
+        seen = set()
+        def visit(p):
+            nonlocal best
+            i = pieces[3*p]
+            if p in seen or kinds[i] not in (_LINE, _RUN):
+                return
+            seen.add(p)
+            d, k = _polylineDistance(x, y, c, pieces[3*p+1]-2, pieces[3*p+2])
+            if best is None or d < best[0]:
+                best = (d, i, k)
+        for p in self.big:
+            visit(p)
+        if self.grid:
+            cx, cy = int(x // size), int(y // size)
+            xs = [cell[0] for cell in self.grid]
+            ys = [cell[1] for cell in self.grid]
+            rings = max(abs(cx - min(xs)), abs(cx - max(xs)), abs(cy - min(ys)), abs(cy - max(ys)))
+            for r in range(rings + 1):
+                if best is not None and best[0] <= (r - 1)*size:
+                    break
+                for gx in range(cx - r, cx + r + 1):
+                    for gy in ((cy - r, cy + r) if abs(gx - cx) != r else range(cy - r, cy + r + 1)):
+                        for p in self.grid.get((gx, gy), ()):
+                            visit(p)
+        return best
+
+    def points(self, i, k):
+        """Returns the points (x, y) of the part of primitive i found as (i, k) by find() or nearest().
+
+        These are the ends of the segment for a line or run, the ends of an arc, the corners of the
+        outline of a fill, and the position of a text or dot.
+        """
+        c, kind = self.coords, self.kinds[i]
+        if kind in (_LINE, _RUN):
+            return ((c[k-2], c[k-1]), (c[k], c[k+1]))
+        if kind == _ARC:
+            return ((c[k], c[k+1]), (c[k+5], c[k+6]))
+        if kind == _FILL:
+            end = self.starts[i+1] if i+1 < len(self.kinds) else len(c)
+            points = [(c[k], c[k+1])]
+            k += 2
+            while k < end:
+                if c[k] == 0:
+                    points.append((c[k+1], c[k+2]))
+                    k += 3
+                else:
+                    points.append((c[k+4], c[k+5]))
+                    k += 6
+            return tuple(points)
+        return ((c[k], c[k+1]),)
+
+    # Helper function for the path data of a fill whose numbers are coords[j:end]
+    def _pathData(self, j, end, precision):
+        c = self.coords
+        p = lambda v: _shortNumber(v, precision)
+        d = ["M {} {}".format(p(c[j]), p(c[j+1]))]
+        j += 2
+        while j < end:
+            if c[j] == 0:
+                d.append("L {} {}".format(p(c[j+1]), p(c[j+2])))
+                j += 3
+            else:
+                d.append("A {} {} 0 0 {} {} {}".format(p(c[j+1]), p(c[j+2]), int(c[j+3]), p(c[j+4]), p(c[j+5])))
+                j += 6
+        return " ".join(d)
+
+    # Helper function for the relative path data of the vertices of a run in coords[j:end].
+    # Each vertex is written as its offset from the previous one, computed from the rounded
+    # positions in units of the last decimal so that rounding errors do not add up along the run.
+    # With a view, the segments outside it are left out, except the first segment of the run, 
+    # which starts at coords[first], and the path moves on to the next segment that is kept.
+    # With a tolerance lod in pixels, the vertices that change the path by less than lod are left out too.
+    def _runData(self, j, end, precision, view=None, first=None, lod=None):
+        c = self.coords
+        scale = 10 ** precision
+        cache = _offset_cache[precision]
+        out = []
+        if view is None and not lod:
+            keep, moves = range(j, end, 2), {}
+        else:
+            keep, moves = self._keptVertices(j, end, view, first, lod)
+        px, py = round(c[j-2]*scale), round(c[j-1]*scale)
+        for k in keep:
+            m = moves.get(k)
+            if m is not None:
+                px, py = round(c[m]*scale), round(c[m+1]*scale)
+                out.append("M" + _shortNumber(px/scale, precision) + _joinNumbers([_shortNumber(py/scale, precision)]) + "l")
+            x, y = round(c[k]*scale), round(c[k+1]*scale)
+            for d in (x - px, y - py):
+                text = cache.get(d)
+                if text is None:
+                    if len(cache) > 100000:
+                        cache.clear()
+                    text = cache[d] = _joinNumbers([_shortNumber(d/scale, precision)])
+                out.append(text)
+            px, py = x, y
+        return "".join(out)
+
+    # Helper function for the vertices in coords[j:end] that are written for a run, with a dict of the
+    # first vertex of each stretch of kept segments to the vertex the path has to move to before it.
+    # Segments outside the view are left out, apart from the first segment of the run, which starts at
+    # coords[first]. With a tolerance lod, each stretch is simplified by Douglas-Peucker. The last vertex
+    # of a stretch is always kept, so a run written in several pieces still joins up.
+    def _keptVertices(self, j, end, view, first, lod):
+        c = self.coords
+        n = (end - j)//2 + 1
+        if view is None:
+            outside = lambda k: False
+        else:
+            xmin, ymin, xmax, ymax = view
+            outside = lambda k: (k != first+2 and 
+                                 (max(c[k-2], c[k]) < xmin or min(c[k-2], c[k]) > xmax or 
+                                  max(c[k-1], c[k+1]) < ymin or min(c[k-1], c[k+1]) > ymax))
+        # vertex i is coords[j-2+2*i], and seen[i] tells whether the segment ending there is kept
+        before = j-2 == first or not outside(j-2)
+        if np is not None and n > 33:
+            v = np.frombuffer(c, dtype=float)[j-2:end]
+            xs, ys = v[0::2], v[1::2]
+            seen = np.ones(n, dtype=bool)
+            if view is not None:
+                seen[1:] = ~((np.maximum(xs[:-1], xs[1:]) < xmin) | (np.minimum(xs[:-1], xs[1:]) > xmax) |
+                             (np.maximum(ys[:-1], ys[1:]) < ymin) | (np.minimum(ys[:-1], ys[1:]) > ymax))
+                if j == first + 2:
+                    seen[1] = True
+            seen[0] = False
+            starts = np.flatnonzero(seen[1:] & ~seen[:-1])
+            stops = np.flatnonzero(seen & ~np.append(seen[1:], False))
+            if lod:
+                keep = np.zeros(n, dtype=bool)
+                keep[stops] = True
+                _douglasPeucker(xs, ys, list(zip(starts.tolist(), stops.tolist())), lod, keep)
+            else:
+                keep = seen
+            ks = np.flatnonzero(keep)
+            heads = ks[np.searchsorted(ks, starts, side="right")].tolist()
+            starts, ks = starts.tolist(), (j - 2 + 2*ks).tolist()
+        else:
+            seen = [False] + [not outside(k) for k in range(j, end, 2)]
+            starts = [i for i in range(n-1) if seen[i+1] and not seen[i]]
+            stops = [i for i in range(1, n) if seen[i] and (i == n-1 or not seen[i+1])]
+            if lod:
+                keep = [False]*n
+                for i in stops:
+                    keep[i] = True
+                _douglasPeucker(c[j-2:end:2].tolist(), c[j-1:end:2].tolist(), list(zip(starts, stops)), lod, keep)
+            else:
+                keep = seen
+            ks = [i for i in range(n) if keep[i]]
+            heads = [ks[bisect.bisect_right(ks, i)] for i in starts]
+            ks = [j - 2 + 2*i for i in ks]
+        return ks, {j-2+2*h: j-2+2*i for h, i in zip(heads, starts) if i or not before}
+
+    def markup(self, styles, start=0, stop=None, sep="", precision=DEFAULT_PRECISION, view=None, lod=None):
+        """Returns the svg elements for primitives start..stop-1."""
+        return sep.join(self.iterMarkup(styles, start, stop, precision=precision, view=view, lod=lod))
+
+    def iterMarkup(self, styles, start=0, stop=None, pieces=False, precision=DEFAULT_PRECISION, view=None, lod=None):
+        """Yields the svg elements for primitives start..stop-1.
+
+        Numbers are written in their shortest form with at most precision
+        decimals and runs as relative path data. With pieces=True, long 
+        runs are yielded in several pieces so that no string much longer
+        than SVG_RUN_PIECE numbers is built. If a view (xmin, ymin, xmax,
+        ymax) is given, the primitives outside it are left out. If a 
+        tolerance lod in pixels is given, runs are simplified to what can
+        be told apart at that tolerance.
+        """
+        n = len(self.kinds)
+        if stop is None:
+            stop = n
+        if view is not None:
+            self._boxTo()
+        kinds, starts, c = self.kinds, self.starts, self.coords
+        p = lambda v: _shortNumber(v, precision)
+        for i in range(start, stop):
+            if view is not None and self._culled(i, view):
+                continue
+            kind = kinds[i]
+            j = starts[i]
+            style = styles[self.styles[i]]
+            if kind == _RUN:
+                end = starts[i+1] if i+1 < n else len(c)
+                if pieces and end - j > SVG_RUN_PIECE:
+                    head, sep, mid, tail, close = SVG_RUN_TEMPLATE.split("{}")
+                    yield head + p(c[j]) + sep + p(c[j+1]) + mid
+                    for k in range(j+2, end, SVG_RUN_PIECE):
+                        data = self._runData(k, min(k+SVG_RUN_PIECE, end), precision, view, j, lod)
+                        yield data.lstrip() if k == j+2 else data
+                    yield tail + style + close
+                else:
+                    yield SVG_RUN_TEMPLATE.format(p(c[j]), p(c[j+1]), self._runData(j+2, end, precision, view, j, lod).lstrip(), style)
+            elif kind == _LINE:
+                yield SVG_LINE_TEMPLATE.format(p(c[j]), p(c[j+1]), p(c[j+2]), p(c[j+3]), style)
+            elif kind == _ARC:
+                yield SVG_ARC_TEMPLATE.format(p(c[j]), p(c[j+1]), p(c[j+2]), p(c[j+3]), int(c[j+4]), p(c[j+5]), p(c[j+6]), style)
+            elif kind == _FILL:
+                end = starts[i+1] if i+1 < n else len(c)
+                yield SVG_FILL_TEMPLATE.format(self._pathData(j, end, precision), style)
+            elif kind == _TEXT:
+                yield SVG_TEXT_TEMPLATE.format(p(c[j]), p(c[j+1]), style, self.texts[int(c[j+2])])
+            else:
+                yield SVG_DOT_TEMPLATE.format(p(c[j]), p(c[j+1]), p(c[j+2]), style)
+
+    # The primitive counts at the end of each group when the whole layer is sent
+    def fullChunkEnds(self):
+        n = len(self.kinds)
+        return list(range(SVG_CHUNK_SIZE, n, SVG_CHUNK_SIZE)) + ([n] if n else [])
+
+    def chunkedMarkup(self, styles, precision=DEFAULT_PRECISION, view=None, lod=None):
+        """Returns the svg for the whole layer, in groups of SVG_CHUNK_SIZE elements."""
+        if precision != self.render_precision or (view, lod) != self.render_view:
+            self.render_chunks = []
+            self.render_version = -1
+            self.render_precision = precision
+            self.render_view = (view, lod)
+        if self.render_version == self.version:
+            return self.render_svg
+        chunks = self.render_chunks
+        keep = min(len(chunks), self.cached // SVG_CHUNK_SIZE)
+        del chunks[keep:]
+        start = keep*SVG_CHUNK_SIZE
+        for end in self.fullChunkEnds()[keep:]:
+            chunks.append("<g>" + self.markup(styles, start, end, precision=precision, view=view, lod=lod) + "</g>")
+            start = end
+        self.cached = len(self.kinds)
+        self.render_svg = "".join(chunks)
+        self.render_version = self.version
+        return self.render_svg
+
+    def markSynced(self, view=None):
+        self.synced = len(self.kinds)
+        self.synced_end = len(self.coords)
+        self.synced_culled = self._lastCulled(view)
+        self.chunk_ends = self.fullChunkEnds()
+
+    # Helper function that tells whether the last primitive is left out of the view
+    def _lastCulled(self, view):
+        if view is None or not self.kinds:
+            return False
+        self._boxTo()
+        return self._culled(len(self.kinds)-1, view)
+
+    def delta(self, gid, styles, precision=DEFAULT_PRECISION, view=None, lod=None):
+        """Returns the ops that bring the layer group gid up to date.
+    
+        If the window shows the open run, its new vertices are appended 
+        to the path with an "e" op. Otherwise the groups sent after the 
+        first changed primitive are dropped and everything from the start
+        of the first dropped group is sent again as one new group. A run
+        that was left out of the view and has grown into it counts as
+        changed, and so does a run that has grown when it is simplified
+        with a tolerance lod, so that the window shows the same run as a
+        whole frame would.
+        """
+        n = len(self.kinds)
+        ops = []
+        synced = self.synced
+        if synced and self.synced_culled and self.kinds[synced-1] == _RUN:
+            self._boxTo()
+            if not self._culled(synced-1, view):
+                synced -= 1
+        elif synced and self.chunk_ends and self.chunk_ends[-1] == synced and self.kinds[synced-1] == _RUN:
+            end = self.starts[synced] if synced < n else len(self.coords)
+            if end > self.synced_end and lod:
+                # a simplified run depends on all its vertices, so it is sent again
+                synced -= 1
+            elif end > self.synced_end:
+                ops.append(["e", gid, self._runData(self.synced_end, end, precision, view, self.starts[synced-1], lod)])
+        if synced != n or (self.chunk_ends[-1] if self.chunk_ends else 0) != n:
+            keep = bisect.bisect_right(self.chunk_ends, synced)
+            start = self.chunk_ends[keep-1] if keep else 0
+            del self.chunk_ends[keep:]
+            svg = ""
+            if n > start:
+                svg = "<g>" + self.markup(styles, start, n, precision=precision, view=view, lod=lod) + "</g>"
+                self.chunk_ends.append(n)
+            ops.append(["c", gid, keep, svg])
+        self.synced = n
+        self.synced_end = len(self.coords)
+        self.synced_culled = self._lastCulled(view)
+        return ops
+
+class _StampStore:
+    """Stamps of one turtle in one layer, in the order they were made.
+
+    Each stamp is kept by its id as the (renderer, values) pairs of the 
+    shapes it shows and is only turned into svg when the layer is first
+    displayed or saved. Removing a stamp is a dict removal and does not
+    touch the other stamps.
+
+    In the drawing window each stamp is a group whose id ends with the 
+    stamp id. synced is the last stamp id the window shows and removed
+    lists the ids removed from it since, so an update adds the new stamps
+    and removes the deleted ones without sending the others again. After
+    clear() the ids start again, so the whole layer is replaced.
+    """
+    def __init__(self):
+        self.items = {}
+        self.version = 0
+        self.render_version = -1
+        self.render_svg = ""
+        self.synced = 0
+        self.removed = []
+        self.replace = False
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, sid, shapes):
+        self.items[sid] = shapes
+        self.version += 1
+
+    def remove(self, sid):
+        if self.items.pop(sid, None) is None:
+            return False
+        if sid <= self.synced and not self.replace:
+            self.removed.append(sid)
+        self.version += 1
+        return True
+
+    def clear(self):
+        self.items = {}
+        self.removed = []
+        self.replace = True
+        self.version += 1
+
+    # Helper function for the svg of one stamp, made when it is first needed
+    def _svg(self, sid):
+        item = self.items[sid]
+        if not isinstance(item, str):
+            item = self.items[sid] = "".join([render(values) for render, values in item])
+        return item
+
+    def iterSvg(self):
+        """Yields the svg of each stamp, in the order they were made."""
+        for sid in self.items:
+            yield self._svg(sid)
+
+    # Helper function for the svg of the given stamps, each in a group whose id is prefix followed by the stamp id
+    def _markup(self, prefix, sids):
+        return "".join([SVG_GROUP_TEMPLATE.format(id=prefix+str(sid), svg=self._svg(sid)) for sid in sids])
+
+    def markup(self, prefix):
+        """Returns the svg for the whole layer. It is cached until the stamps change."""
+        if self.render_version != self.version:
+            self.render_svg = self._markup(prefix, list(self.items))
+            self.render_version = self.version
+        return self.render_svg
+
+    def markSynced(self):
+        last = next(reversed(self.items), 0)
+        self.synced = last if self.replace else max(self.synced, last)
+        self.removed = []
+        self.replace = False
+
+    def delta(self, gid, prefix):
+        """Returns the ops that bring the layer group gid up to date.
+
+        Removed stamps are dropped by id with "r" ops and the stamps made
+        since the last update are appended with one "a" op.
+        """
+        if self.replace:
+            ops = [["s", gid, self.markup(prefix)]]
+        else:
+            ops = [["r", prefix + str(sid)] for sid in self.removed]
+            new = []
+            for sid in reversed(self.items):
+                if sid <= self.synced:
+                    break
+                new.append(sid)
+            if new:
+                ops.append(["a", gid, self._markup(prefix, reversed(new))])
+        self.markSynced()
+        return ops
+
+# Shape templates compiled into functions of their values: (template, animated) -> function
+_shape_renderers = {}
+
+# Helper function that compiles a shape template, with the turn animation if animated, into a function that
+# returns the svg for a dict of values. The fields become printf-style fields, so no parsing is left for each call.
+def _shapeRenderer(template, animated=False):
+    render = _shape_renderers.get((template, animated))
+    if render is None:
+        source = template
+        end = source.rfind("</")
+        if animated and end >= 0:
+            source = source[:end] + TURTLE_TURN_ANIMATION_TEMPLATE + source[end:]
+        render = _shape_renderers[(template, animated)] = re.sub(r"\{(\w+)\}", r"%(\1)s", source.replace("%", "%%")).__mod__
+    return render
+
+# A turtle method called with await, e.g. await t.aforward(100). The method runs in a thread of its own, 
+# but never at the same time as the event loop: resume() lets it run until it would wait between frames,
+# and sleep() hands control back to the event loop, which waits with asyncio.sleep so that other 
+# coroutines, and other turtles, can run meanwhile. The journal depth of the screen belongs to the call
+# and is put back while the call waits.
+class _AsyncCall:
+    local = threading.local()
+
+    def __init__(self, screen, method, args, kwargs):
+        self.screen = screen
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.go = threading.Event()
+        self.paused = threading.Event()
+        self.thread = None
+        self.delay = None
+        self.hurry = False
+        self.result = self.error = None
+
+    async def run(self):
+        try:
+            while self.resume() is not None:
+                await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            # the rest of the call is done at once, so the turtle is not left halfway
+            self.hurry = True
+            while self.resume() is not None:
+                pass
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    # Lets the call run until it waits or ends, and returns how long it waits, or None when it ended
+    def resume(self):
+        self.depth = self.screen._journal_depth
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.main, daemon=True)
+            self.thread.start()
+        else:
+            self.go.set()
+        self.paused.wait()
+        self.paused.clear()
+        return self.delay
+
+    def main(self):
+        _AsyncCall.local.call = self
+        try:
+            self.result = self.method(*self.args, **self.kwargs)
+        except BaseException as error:
+            self.error = error
+        self.delay = None
+        self.paused.set()
+
+    def sleep(self, seconds):
+        if self.hurry:
+            return
+        self.delay = seconds
+        depth = self.screen._journal_depth
+        self.screen._journal_depth = self.depth
+        self.go.clear()
+        self.paused.set()
+        self.go.wait()
+        self.screen._journal_depth = depth
+
+# Helper function that waits between frames, or hands control back to the event loop in a call made with await
+def _sleep(seconds):
+    call = getattr(_AsyncCall.local, "call", None)
+    if call is None:
+        time.sleep(seconds)
+    else:
+        call.sleep(seconds)
+
+# Context manager returned by batch(). The drawing is sent once when the outermost block ends.
+class _Batch:
+    def __init__(self, screen):
+        self.screen = screen
+
+    def __enter__(self):
+        self.screen._batch_depth += 1
+        return self.screen
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.screen._batch_depth -= 1
+        if not self.screen._batch_depth and self.screen._frame_pending:
+            self.screen._pushDrawing()
+        return False
+
+# Context manager returned by together(). The calls made to turtles in the block are queued, one queue
+# per turtle, and the turtles go through their queues at the same time when the outermost block ends.
+class _Together:
+    def __init__(self, screen):
+        self.screen = screen
+        self.outer = False
+
+    def __enter__(self):
+        if self.screen._together is None:
+            self.screen._together = {}
+            self.outer = True
+            _useJournalWrappers(1)
+        return self.screen
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.outer:
+            queues, self.screen._together = self.screen._together, None
+            try:
+                if exc_type is None:
+                    self.screen._runTogether(queues)
+            finally:
+                _useJournalWrappers(-1)
+        return False
+
 #------------------------------------------------------------------------------------------------
+# Display backends. The screen calls open() when it is created, frame() with the whole svg drawing,
+# delta() with the javascript of a delta update, and close() when the screen is cleared.
+# 'renders' tells whether the screen renders frames at all, and 'realtime' whether animations
+# are shown as they happen, with the delays of the turtle speed and the frame rate limit.
+
+class _IPythonBackend:
+    """Shows the drawing in the output of the notebook cell.
+
+    The screens shown are synced after each cell by a single post_run_cell
+    hook of the kernel. A screen leaves the hook when it is cleared or no
+    longer used, so replaced screens are neither kept nor synced.
+    """
+    name = "ipython"
+    renders = True
+    realtime = True
+    # The open screens, and the kernel whose post_run_cell hook syncs them
+    screens = weakref.WeakSet()
+    hooked = None
+
+    def __init__(self):
+        if display is None:
+            raise ImportError("The ipython backend needs the IPython package.")
+        self.screen = None
+        self.drawing_window = None
+        self.delta_channel = None
+
+    def open(self, screen):
+        self.screen = screen
+        self.drawing_window = display(HTML(screen._generateSvgDrawing()), display_id=True)
+        # The receiver must live in the same output as the drawing window, so it is installed now
+        self.delta_channel = display(Javascript(DELTA_RECEIVER_JS), display_id=True)
+        ipython = get_ipython()
+        if ipython is not None:
+            _IPythonBackend.screens.add(screen)
+            if _IPythonBackend.hooked is not ipython:
+                ipython.events.register('post_run_cell', _syncIPythonScreens)
+                _IPythonBackend.hooked = ipython
+
+    def frame(self, svg):
+        self.drawing_window.update(HTML(svg))
+
+    def delta(self, js):
+        self.delta_channel.update(Javascript(js))
+
+    def close(self):
+        _IPythonBackend.screens.discard(self.screen)
+
+# Helper function run by the kernel after each cell, which syncs the screens shown in the notebook
+def _syncIPythonScreens(result=None):
+    for screen in list(_IPythonBackend.screens):
+        screen._syncDrawing()
+
+class _HeadlessBackend:
+    """Keeps the drawing without showing it, for scripts and batch jobs.
+
+    Nothing is rendered until the drawing is saved or shown with saveSVG 
+    or showSVG, and turtles move without animation or delays.
+    """
+    name = "headless"
+    renders = False
+    realtime = False
+
+    def open(self, screen):
+        pass
+
+    def frame(self, svg):
+        pass
+
+    def delta(self, js):
+        pass
+
+    def close(self):
+        pass
+
+class _CaptureBackend:
+    """Keeps every update of the drawing window in memory, for tests.
+
+    frames is the list of svg drawings sent and deltas the list of delta
+    updates sent in delta mode. Animations are rendered without delays.
+    """
+    name = "capture"
+    renders = True
+    realtime = False
+
+    def __init__(self):
+        self.frames = []
+        self.deltas = []
+
+    def open(self, screen):
+        self.frames.append(screen._generateSvgDrawing())
+
+    def frame(self, svg):
+        self.frames.append(svg)
+
+    def delta(self, js):
+        self.deltas.append(js)
+
+    def close(self):
+        pass
 
-def Screen():
+BACKENDS = {"ipython": _IPythonBackend, "headless": _HeadlessBackend, "capture": _CaptureBackend}
+
+# Helper function that returns a backend object for a backend name or object
+def _makeBackend(backend):
+    if backend is None:
+        backend = os.environ.get("COLABTURTLEPLUS_BACKEND") or DEFAULT_BACKEND
+    if isinstance(backend, str):
+        if backend.lower() not in BACKENDS:
+            raise ValueError("The backend must be one of " + ", ".join(BACKENDS) + ".")
+        return BACKENDS[backend.lower()]()
+    return backend
+
+def Screen(backend=None):
     """Return the singleton screen object.
     If none exists at the moment, create a new one and return it,
-    else return the existing one."""
+    else return the existing one.
+
+    Args:
+        backend: (optional) 'ipython', 'headless', 'capture' or a backend
+            object, used when a new screen is created
+
+    The ipython backend shows the drawing in the notebook. The headless
+    backend only keeps the drawing, e.g. to save figures with saveSVG from
+    a script, and the capture backend keeps every frame in its list 
+    'frames'. The default is given by the environment variable 
+    COLABTURTLEPLUS_BACKEND, or else 'ipython'."""
     if Turtle._screen is None:
-        Turtle._screen = _Screen()
+        Turtle._screen = _Screen(backend)
     return Turtle._screen
 
 class _Screen:
-    def __init__(self):
+    def __init__(self, backend=None):
         self._turtles = []
         self.window_size = DEFAULT_WINDOW_SIZE
         self._mode = DEFAULT_MODE
@@ -128,10 +1355,48 @@ class _Screen:
             self.xmin = self.ymax = 0
             self.xscale = 1
             self.yscale = -1
-        self._svg_drawlines_string = ""
+        self._drawline_store = _GeometryStore()
+        self._styles = []
+        self._inline_styles = []
+        self._style_index = {}
+        self._style_rules = []
+        self._style_sheet = (0, "")
+        self._max_width = 0
+        self._culling = True
+        self._lod = 0
+        self._lod_files = False
+        self._symbols = {}
+        self._drawing_key = None
+        self._drawing_svg = ""
+        self._precision = DEFAULT_PRECISION
+        self._cache_stats = dict.fromkeys(("drawing_hits", "drawing_misses", "layer_hits", "layer_misses", "sprite_hits", "sprite_misses"), 0)
+        self._sprites = {}
         self.background_color = DEFAULT_BACKGROUND_COLOR
         self.border_color = DEFAULT_BORDER_COLOR
-        self.drawing_window = display(HTML(self._generateSvgDrawing()), display_id=True)
+        self._svg_id = "ctp-" + uuid.uuid4().hex[:12]
+        self._next_tid = 0
+        self._delta = DEFAULT_DELTA_MODE
+        self._sent = {}
+        self._sent_structure = None
+        self._delta_pending = False
+        self._frame_rate = DEFAULT_FRAME_RATE
+        self._byte_rate = DEFAULT_BYTE_RATE
+        self._next_frame = 0
+        self._frame_pending = False
+        self._batch_depth = 0
+        self._tracer = 1
+        self._tracer_delay = None
+        self._update_count = 0
+        self._playback = False
+        self._timeline = []
+        self._played = {}
+        self._together = None
+        self._scheduling = False
+        self._journal = []
+        self._journal_depth = 0
+        self._journaling = False
+        self.backend = _makeBackend(backend)
+        self.backend.open(self)
 
     # Helper function that maps [0,13] speed values to ms delays
     def _speedToSec(self, speed):
@@ -139,6 +1404,10 @@ class _Screen:
 
     # Add to list of turtles when new object created
     def _add(self, turtle):
+        turtle._tid = self._next_tid
+        self._next_tid += 1
+        if self._journaling and not self._journal_depth:
+            self._journal.append((turtle._tid, None, (), None))
         self._turtles.append(turtle)
         self._updateDrawing() 
 
@@ -153,9 +1422,28 @@ class _Screen:
             svg += self._generateOneSvgTurtle(turtle = turtle)
         return svg
 
-    # Helper function for generating svg string of one turtle
+    # Helper function for generating svg string of one turtle.
+    # The sprites of recent visual states are kept, so a turtle that did not change costs a dict lookup.
     def _generateOneSvgTurtle(self,turtle):
-        svg = ""
+        state = (turtle.shapeDict[turtle.turtle_shape], turtle.turtle_shape, turtle.is_turtle_visible, turtle.turtle_pos,
+                 turtle.turtle_orient if self._mode == "world" else turtle.turtle_degree, turtle.tilt_angle, self._mode,
+                 turtle.stretchfactor, turtle.shear_factor, turtle.fill_color, turtle.pen_color, turtle.outline_width,
+                 turtle.turn_animation)
+        sprites = self._sprites
+        svg = sprites.pop(state, None)
+        if svg is None:
+            self._cache_stats["sprite_misses"] += 1
+            render, values = self._turtleShape(turtle)
+            svg = render(values)
+            if len(sprites) >= SPRITE_CACHE_SIZE:
+                del sprites[next(iter(sprites))]
+        else:
+            self._cache_stats["sprite_hits"] += 1
+        sprites[state] = svg
+        return svg
+
+    # Helper function for the compiled shape of a turtle and the values that fill it in
+    def _turtleShape(self, turtle):
         if turtle.is_turtle_visible:
             vis = 'visible'
         else:
@@ -178,8 +1466,7 @@ class _Screen:
         else:
             degrees -= 90
        
-        svg = turtle.shapeDict[turtle.turtle_shape].format(
-                           turtle_color=turtle.fill_color,
+        values = dict(turtle_color=turtle.fill_color,
                            pcolor=turtle.pen_color,
                            turtle_x=turtle_x, 
                            turtle_y=turtle_y,
@@ -193,58 +1480,210 @@ class _Screen:
                            cy=-(10*turtle.stretchfactor[1]+4),
                            pw = turtle.outline_width,
                            rotation_x=turtle.turtle_pos[0], 
-                           rotation_y=turtle.turtle_pos[1])
-        return svg
+                           rotation_y=turtle.turtle_pos[1],
+                           href=self._shapeSymbol(turtle.turtle_shape))
+        if turtle.turn_animation is not None:
+            values.update(zip(("extent", "dur", "turn_sx", "turn_sy"), turtle.turn_animation))
+        return _shapeRenderer(turtle.shapeDict[turtle.turtle_shape], turtle.turn_animation is not None), values
+
+    # Helper function for the id of the symbol of a shape. The symbol is added to the defs of the drawing when first used.
+    def _shapeSymbol(self, shape):
+        symbol_id = "{}-shape-{}".format(self._svg_id, shape)
+        if shape in TURTLE_SHAPE_SYMBOLS and shape not in self._symbols:
+            self._symbols[shape] = SVG_SYMBOL_TEMPLATE.format(id=symbol_id, svg=TURTLE_SHAPE_SYMBOLS[shape])
+        return symbol_id
     
-    # helper function for linking svg strings of text
-    def _generateSvgLines(self):
-        svg = ""
+    # Helper function for the number of a style in the screen's style table. The key is the kind of
+    # style (see SVG_STYLE_TEMPLATES) followed by its values, and new styles are added to the table.
+    # Elements refer to a style by its class, and the rules of the classes make up the style sheet.
+    # The table of inline styles has the same style as a style attribute, for saved files.
+    def _styleIndex(self, *key):
+        index = self._style_index.get(key)
+        if index is None:
+            index = self._style_index[key] = len(self._styles)
+            css = SVG_STYLE_TEMPLATES[key[0]].format(*key[1:])
+            self._styles.append(SVG_STYLE_CLASS_TEMPLATE.format(index))
+            self._inline_styles.append(SVG_STYLE_INLINE_TEMPLATE.format(css))
+            self._style_rules.append(SVG_STYLE_RULE_TEMPLATE.format(self._svg_id, index, css))
+            if key[0] in ("stroke", "fill"):
+                self._max_width = max(self._max_width, key[2 if key[0] == "stroke" else 4])
+        return index
+
+    # Helper function for the part of the drawing that is written out: the drawing window with a margin 
+    # for the widest pen, or None when culling is off
+    def _cullView(self):
+        if not self._culling:
+            return None
+        m = max(CULL_MARGIN, self._max_width)
+        return (-m, -m, self.window_size[0] + m, self.window_size[1] + m)
+
+    # Helper function for the style sheet with the rules of all the styles. It is joined again only after styles were added.
+    def _styleSheet(self):
+        if self._style_sheet[0] != len(self._style_rules):
+            self._style_sheet = (len(self._style_rules), "".join(self._style_rules))
+        return self._style_sheet[1]
+
+    # Helper function for the style of lines drawn by a turtle
+    def _strokeStyle(self, turtle):
+        return self._styleIndex("stroke", turtle.pen_color, turtle.pen_width)
+
+    # Helper function that yields the svg file of the drawing in pieces, one element per line.
+    # Geometry is read straight from the stores, so the whole file is never held in memory.
+    # Each element has its own style attribute rather than a class, so the file needs no style sheet
+    # and can be edited or put in another document as it is.
+    def _iterSvgFile(self, turtle=False):
+        sprites = self._generateTurtlesSvgDrawing() if turtle else ""
+        yield ("""<svg id="{svg_id}" width="{w}" height="{h}" viewBox="0 0 {w} {h}" xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">\n""").format(
+            svg_id=self._svg_id,
+            w= self.window_size[0],
+            h= self.window_size[1]) 
+        yield ("""<rect width="100%" height="100%" style="fill:{fillcolor};stroke:{kolor};stroke-width:1" />\n""").format(
+            fillcolor=self.background_color,
+            kolor=self.border_color)
+        if self._symbols:
+            yield "<defs>\n" + "\n".join(self._symbols.values()) + "\n</defs>\n"
+        for t in self._turtles:
+            for stamp in t.stampsB.iterSvg():
+                yield stamp.replace("</use>","</use>\n").replace("</g>","</g>\n")
+        stores = [self._drawline_store] + [t.line_store for t in self._turtles] + [t.dot_store for t in self._turtles]
+        view = self._cullView()
+        lod = self._lod if self._lod_files else None
+        for store in stores:
+            for element in store.iterMarkup(self._inline_styles, pieces=True, precision=self._precision, view=view, lod=lod):
+                yield element
+                if element.endswith(">"):
+                    yield "\n"
+        for t in self._turtles:
+            for stamp in t.stampsT.iterSvg():
+                yield stamp.replace("</use>","</use>\n").replace("</g>","</g>\n")
+        if turtle:
+            yield sprites + " \n"
+        yield "</svg>"
+
+    # Helper function that writes the svg file to a text or binary file object in buffered pieces
+    def _writeSvgFile(self, out, turtle=False):
+        binary = isinstance(out, (io.RawIOBase, io.BufferedIOBase)) or "b" in getattr(out, "mode", "")
+        buffer = []
+        size = 0
+        for piece in self._iterSvgFile(turtle):
+            buffer.append(piece)
+            size += len(piece)
+            if size >= SVG_WRITE_BUFFER:
+                text = "".join(buffer)
+                out.write(text.encode("utf-8") if binary else text)
+                buffer, size = [], 0
+        text = "".join(buffer)
+        out.write(text.encode("utf-8") if binary else text)
+
+    # Helper function for the id of the svg group holding one turtle's part of a layer
+    def _groupId(self, layer, turtle=None):
+        if turtle is None:
+            return self._svg_id + "-" + layer
+        return "{}-{}-{}".format(self._svg_id, layer, turtle._tid)
+
+    # Helper function for generating the (group id, svg string) pairs that make up the drawing, in drawing order.
+    # The first groups hold the style sheet and the defs with the symbols of the shapes used so far, 
+    # which are only known after the rest.
+    # Each turtle has its own group in each layer so that a layer can be updated one turtle at a time.
+    # A turtle's overlay group holds the part of a move still being animated and follows its lines.
+    def _generateSvgGroups(self):
+        groups = [(self._groupId("bg"), SVG_BACKGROUND_TEMPLATE.format(backcolor=self.background_color, kolor=self.border_color)),
+                  (self._groupId("drawlines"), self._drawline_store)]
         for turtle in self._turtles:
-            svg+=turtle.svg_lines_string 
-        return svg
-
-    # helper function for linking svg strings of text
-    def _generateSvgFill(self):
-        svg = ""
+            groups.append((self._groupId("stampsB", turtle), turtle.stampsB))
         for turtle in self._turtles:
-            svg+=turtle.svg_fill_string 
-        return svg
-    
-    # helper function for linking svg strings of text
-    def _generateSvgDots(self):
-        svg = ""
+            groups.append((self._groupId("lines", turtle), turtle.line_store))
+            groups.append((self._groupId("overlay", turtle), turtle.svg_overlay_string))
         for turtle in self._turtles:
-            svg+=turtle.svg_dots_string 
-        return svg
-    
-    # helper function for linking svg strings of text
-    def _generateSvgStampsB(self):
-        svg = ""
+            groups.append((self._groupId("dots", turtle), turtle.dot_store))
         for turtle in self._turtles:
-            svg+=turtle.svg_stampsB_string 
-        return svg
-    
-    # helper function for linking svg strings of text
-    def _generateSvgStampsT(self):
-        svg = ""
+            groups.append((self._groupId("stampsT", turtle), turtle.stampsT))
         for turtle in self._turtles:
-            svg+=turtle.svg_stampsT_string 
-        return svg
-    
-
-    # Helper function for generating the whole svg string
-    def _generateSvgDrawing(self):
-        return SVG_TEMPLATE.format(window_width=self.window_size[0], 
+            groups.append((self._groupId("turtle", turtle), self._generateOneSvgTurtle(turtle=turtle)))
+        groups[:0] = [(self._groupId("style"), self._styleSheet()), (self._groupId("defs"), "".join(self._symbols.values()))]
+        return groups
+
+    # Helper function for generating the whole svg string.
+    # Groups backed by a geometry store are rendered in chunks of elements so that deltas can replace part of them.
+    # Everything except the turtles is cached and only rebuilt when one of its groups changed, and each 
+    # geometry store caches its own svg, so a frame where only a turtle moved or turned is cheap.
+    def _generateSvgDrawing(self, groups=None):
+        if groups is None:
+            groups = self._generateSvgGroups()
+        nsprites = len(self._turtles)
+        layers, sprites = groups[:len(groups)-nsprites], groups[len(groups)-nsprites:]
+        key = (self._svgStructure(),) + tuple([item.version if isinstance(item, (_GeometryStore, _StampStore)) else item for gid, item in layers])
+        stats = self._cache_stats
+        if key == self._drawing_key:
+            stats["drawing_hits"] += 1
+        else:
+            stats["drawing_misses"] += 1
+            svg = []
+            templates = {self._groupId("style"): SVG_STYLE_SHEET_TEMPLATE, self._groupId("defs"): SVG_DEFS_TEMPLATE}
+            view = self._cullView()
+            for gid, item in layers:
+                if isinstance(item, _GeometryStore):
+                    if item.render_version == item.version:
+                        stats["layer_hits"] += 1
+                    else:
+                        stats["layer_misses"] += 1
+                    item = item.chunkedMarkup(self._styles, self._precision, view, self._lod or None)
+                elif isinstance(item, _StampStore):
+                    item = item.markup(gid + "-")
+                svg.append(templates.get(gid, SVG_GROUP_TEMPLATE).format(id=gid, svg=item))
+            self._drawing_svg = "".join(svg)
+            self._drawing_key = key
+        return SVG_TEMPLATE.format(svg_id=self._svg_id,
+                               window_width=self.window_size[0], 
                                window_height=self.window_size[1],
-                               backcolor=self.background_color,
-                               fill=self._generateSvgFill(),
-                               lines=self._generateSvgLines(),
-                               dots=self._generateSvgDots(),
-                               stampsB=self._generateSvgStampsB(),
-                               stampsT=self._generateSvgStampsT(),
-                               turtle=self._generateTurtlesSvgDrawing(),
-                               drawlines=self._svg_drawlines_string,
-                               kolor=self.border_color)
+                               groups=self._drawing_svg + "".join([SVG_GROUP_TEMPLATE.format(id=gid, svg=svg) for gid, svg in sprites]))
+
+    def cachestats(self):
+        """Returns the hit and miss counts of the render caches.
+
+        Returns:
+            dict: counts for the drawing, the layers, the turtles and the colors
+    
+        The drawing counts are for the whole drawing apart from the turtles,
+        which is reused when nothing but the turtles changed. The layer 
+        counts are for the lines and dots of each turtle, which are only 
+        rendered again after they changed. The sprite counts are for the
+        svg of the turtles, which is kept for the last SPRITE_CACHE_SIZE
+        positions, headings and looks of the turtles. The color counts are
+        for the normalized colors, which are shared by all screens.
+        """
+        colors = _cachedColor.cache_info()
+        return dict(self._cache_stats, color_hits=colors.hits, color_misses=colors.misses)
+
+    # Helper function for the layout of the drawing, including the view outside which primitives are left out
+    # and the tolerance to which runs are simplified.
+    # When this changes, deltas can no longer be applied.
+    def _svgStructure(self):
+        return (self.window_size, tuple([turtle._tid for turtle in self._turtles]), self._cullView(), self._lod)
+
+    # Helper function for generating the changes since the last update as a list of ops for the receiver.
+    # Layers kept in a geometry store send only the primitives after the first change, and stamp layers
+    # only the stamps added or removed. For the other groups,
+    # one that only grew at the end gets an append op with just the new part; any other change replaces the group.
+    def _generateSvgDelta(self, groups):
+        ops = []
+        view = self._cullView()
+        for gid, item in groups:
+            if isinstance(item, _GeometryStore):
+                ops.extend(item.delta(gid, self._styles, self._precision, view, self._lod or None))
+                continue
+            if isinstance(item, _StampStore):
+                ops.extend(item.delta(gid, gid + "-"))
+                continue
+            sent = self._sent.get(gid)
+            if item == sent:
+                continue
+            if sent is not None and item.startswith(sent):
+                ops.append(["a", gid, item[len(sent):]])
+            else:
+                ops.append(["s", gid, item])
+            self._sent[gid] = item
+        return ops
 
     def showSVG(self, turtle=False):
         """Shows the SVG code for the image to the screen.
@@ -258,59 +1697,48 @@ class _Screen:
         or Adobe Illustrator, or displaying the image in a webpage.
         """
 
-        header = ("""<svg width="{w}" height="{h}" viewBox="0 0 {w} {h}" xmlns="http://www.w3.org/2000/svg">\n""").format(
-            w= self.window_size[0],
-            h= self.window_size[1]) 
-        header += ("""<rect width="100%" height="100%" style="fill:{fillcolor};stroke:{kolor};stroke-width:1" />\n""").format(
-            fillcolor=self.background_color,
-            kolor=self.border_color)
-        lines = self._svg_drawlines_string.replace("/>","/>\n")
-        image = self._generateSvgLines().replace("/>","/>\n")
-        stampsB = self._generateSvgStampsB().replace("</g>","</g>\n")
-        stampsT = self._generateSvgStampsT().replace("</g>","</g>\n")    
-        dots = self._generateSvgDots().replace(">",">\n")
-        turtle_svg = (self._generateTurtlesSvgDrawing() + " \n") if turtle else ""
-        output = header + stampsB + lines + image + dots + stampsT + turtle_svg + "</svg>"
-        print(output) 
+        self._writeSvgFile(sys.stdout, turtle)
+        print()
 
     # Save the image as an SVG file using given filename. Set turtle=True to include turtle in svg output
     def saveSVG(self, file=None, turtle=False):
         """Saves the image as an SVG file.
     
         Args:
-            file: a string giving filename for saved file. The extension 
-                ".svg" will be added if missing. If no filename is given,
-                the default name SVGimage.svg will be used.
+            file: a string giving filename for saved file, or a file object
+                opened for writing. The extension ".svg" will be added to a 
+                filename if missing, unless the filename ends with ".svgz", 
+                in which case the file is compressed with gzip. If no 
+                filename is given, the default name SVGimage.svg will be used.
             turtle: an optional boolean that determines if the turtles 
                 are included in the svg output saved to the file. Default is False.
     
         The SVG commands can be printed on screen (after the drawing is 
         completed) or saved to a file for use in a program like inkscape 
         or Adobe Illustrator, or displaying the image in a webpage.
+        The file is written element by element, so large drawings can be
+        saved without building the whole file in memory. What lies outside
+        the drawing window is left out, unless culling() is turned off, and
+        paths are simplified if simplify() was set to do so for files.
+        Each element has its own style attribute, so the file can be put
+        in a web page or another drawing as it is.
         """
     
         if file is None:
             file = "SVGimage.svg"
         elif not isinstance(file, str):
-            raise ValueError("File name must be a string")
+            if not hasattr(file, "write"):
+                raise ValueError("File must be a file name or a file object")
+            self._writeSvgFile(file, turtle)
+            return
+        if file.endswith(".svgz"):
+            with gzip.open(file, "wt", encoding="utf-8") as text_file:
+                self._writeSvgFile(text_file, turtle)
+            return
         if not file.endswith(".svg"):
             file += ".svg"
-        text_file = open(file, "w")
-        header = ("""<svg width="{w}" height="{h}" viewBox="0 0 {w} {h}" xmlns="http://www.w3.org/2000/svg">\n""").format(
-            w= self.window_size[0],
-            h= self.window_size[1]) 
-        header += ("""<rect width="100%" height="100%" style="fill:{fillcolor};stroke:{kolor};stroke-width:1" />\n""").format(
-            fillcolor=self.background_color,
-            kolor=self.border_color)
-        lines = self._svg_drawlines_string.replace("/>","/>\n")
-        image = self._generateSvgLines().replace("/>","/>\n")
-        stampsB = self._generateSvgStampsB().replace("</g>","</g>\n")
-        stampsT = self._generateSvgStampsT().replace("</g>","</g>\n")    
-        dots = self._generateSvgDots().replace(">",">\n")
-        turtle_svg = (self._generateTurtlesSvgDrawing() + " \n") if turtle else ""
-        output = header + stampsB + lines + image + dots + stampsT + turtle_svg + "</svg>"
-        text_file.write(output)
-        text_file.close()   
+        with open(file, "w") as text_file:
+            self._writeSvgFile(text_file, turtle)
 
     #=========================
     # screen drawing functions
@@ -319,14 +1747,623 @@ class _Screen:
     # Helper functions for updating the screen using the latest positions/angles/lines etc.
     # If the turtle speed is 0, the update is skipped so animation is done.
     # If the delay is False (or 0), update immediately without any delay
-    def _updateDrawing(self, turtle=None, delay=True):
-        if turtle is not None:
-            if turtle.turtle_speed != 0:
-                self.drawing_window.update(HTML(self._generateSvgDrawing()))         
-                if delay:
-                    time.sleep(turtle.timeout)
+    # Inside batch() or with tracer(0) nothing is sent, and with tracer(n) only every n-th update is sent.
+    # Delays only follow updates that are sent, so skipped updates run at full speed.
+    # In playback mode the update becomes a step of the timeline that lasts as long as the delay,
+    # in which the turtle turns by turn and draws a line from line as it moves.
+    # With now=True a frame that is sent is not held back by the frame rate, for frames that must be seen.
+    def _updateDrawing(self, turtle=None, delay=True, turn=None, line=None, now=False):
+        if self._batch_depth or not self._tracer:
+            self._frame_pending = True
+        elif turtle is None or turtle.turtle_speed != 0:
+            self._update_count += 1
+            if self._update_count % self._tracer:
+                self._frame_pending = True
+                return
+            if self._playing():
+                duration = 0
+                if turtle is not None and delay:
+                    duration = turtle.timeout if self._tracer_delay is None else self._tracer_delay/1000
+                self._queueStep(turtle, duration, turn, line)
+                return
+            if self._scheduling:
+                self._frame_pending = True
+            elif now:
+                self._pushDrawing()
+            else:
+                self._requestFrame()
+            if turtle is not None and delay and (self.backend.realtime or self._scheduling):
+                _sleep(turtle.timeout if self._tracer_delay is None else self._tracer_delay/1000)
+
+    # Helper function that runs the calls queued by together() for each turtle. Each call runs as with await,
+    # see _AsyncCall, so a turtle that waits between the frames of its animation is left until its wait is
+    # over. In each round, every turtle that is due runs until it waits or its queue is done, then one frame
+    # shows the changes of all of them, and the screen waits until the next turtle is due.
+    def _runTogether(self, queues):
+        calls = {}
+        due = dict.fromkeys(queues, 0)
+        clock = 0
+        self._scheduling = True
+        try:
+            while due:
+                for turtle in [t for t in due if due[t] <= clock]:
+                    delay = None
+                    while delay is None and (turtle in calls or queues[turtle]):
+                        if turtle not in calls:
+                            method, args, kwargs = queues[turtle].pop(0)
+                            calls[turtle] = _AsyncCall(self, method, args, kwargs)
+                        delay = calls[turtle].resume()
+                        if delay is None:
+                            call = calls.pop(turtle)
+                            if call.error is not None:
+                                raise call.error
+                    if delay is None:
+                        del due[turtle]
+                    else:
+                        due[turtle] = clock + delay
+                if self._frame_pending and not self._batch_depth and self._tracer:
+                    self._requestFrame()
+                if due:
+                    wait = min(due.values()) - clock
+                    clock += wait
+                    if wait and self.backend.realtime:
+                        _sleep(wait)
+        finally:
+            self._scheduling = False
+            for call in calls.values():
+                call.hurry = True
+                while call.resume() is not None:
+                    pass
+
+    # Helper function that tells whether the moves and turns of a turtle are animated.
+    # Nothing is animated while updates are suspended or when the backend does not render.
+    def _animating(self, turtle):
+        return turtle.turtle_speed != 0 and turtle.animate and not self._batch_depth and self._tracer != 0 and self.backend.renders
+
+    # Helper function that tells whether animations are played by the drawing window
+    def _playing(self):
+        return self._playback and self.backend.renders
+
+    # Helper function that adds a step to the timeline played by the drawing window, with the changes since
+    # the last step. The turtles whose sprite changed glide from where the last step left them for duration 
+    # seconds, turning by the difference of their headings, or by turn for the given turtle, which draws a 
+    # line from line if given. The steps go out together, at most once per frame.
+    def _queueStep(self, turtle=None, duration=0, turn=None, line=None):
+        groups = self._generateSvgGroups()
+        structure = self._svgStructure()
+        if structure != self._sent_structure:
+            self._timeline.append([0, [["w", self._svg_id, self._generateSvgDrawing(groups)]], [], []])
+            self._markSent(groups, structure)
         else:
-            self.drawing_window.update(HTML(self._generateSvgDrawing()))
+            ops = self._generateSvgDelta(groups)
+            sprites = {self._groupId("turtle", t): t for t in self._turtles}
+            shown = set(sprites) | {self._groupId("style"), self._groupId("defs")}
+            first = [op for op in ops if op[1] in shown]
+            glides = []
+            for op in first:
+                t = sprites.get(op[1])
+                played = self._played.get(op[1])
+                if t is None or played is None or not duration:
+                    continue
+                x, y = t.turtle_pos
+                dx, dy = round(x - played[0], 3), round(y - played[1], 3)
+                if t is turtle and turn is not None:
+                    angle = turn
+                else:
+                    angle = round((self._spriteHeading(t) - played[2] + 180) % 360 - 180, 3)
+                if dx or dy or angle:
+                    glides.append([op[1], dx, dy, angle, x, y])
+                    if t is turtle and line is not None:
+                        glides[-1] += [self._groupId("overlay", t), line[0], line[1], self._styles[self._strokeStyle(t)]]
+            if ops or duration:
+                self._timeline.append([round(duration, 3), first, glides, [op for op in ops if op[1] not in shown]])
+            self._played = {self._groupId("turtle", t): t.turtle_pos + (self._spriteHeading(t),) for t in self._turtles}
+        self._frame_pending = False
+        if not self.backend.realtime or time.perf_counter() >= self._next_frame:
+            self._flushTimeline()
+
+    # Helper function for the heading of a turtle's sprite in the drawing window
+    def _spriteHeading(self, turtle):
+        return turtle.turtle_orient if self._mode == "world" else turtle.turtle_degree
+
+    # Helper function that sends the steps of the timeline not sent yet
+    def _flushTimeline(self):
+        if self._timeline:
+            start = time.perf_counter()
+            js = "ColabTurtlePlus.play({},{});".format(json.dumps(self._svg_id), json.dumps(self._timeline, separators=(",", ":")))
+            self._timeline = []
+            self.backend.delta(js)
+            self._delta_pending = True
+            self._frameSent(start, len(js))
+
+    # Helper function that sends a frame unless the previous frame was sent too recently.
+    # A skipped frame is not lost: its changes, together with those of all turtles since, 
+    # go out with the next frame or at the end of the cell.
+    def _requestFrame(self):
+        if self.backend.realtime and time.perf_counter() < self._next_frame:
+            self._frame_pending = True
+        else:
+            self._pushDrawing()
+
+    # Helper function that sends the drawing to the drawing window.
+    # In delta mode only the changes since the last update are sent, unless full=True
+    # or the layout of the drawing changed.
+    # The next frame is due after the frame interval, or later if the bytes sent would 
+    # exceed the byte rate or if rendering took longer than the interval.
+    # In playback mode the changes become a step of the timeline, and a whole frame is only sent after the
+    # steps before it, which the drawing window plays before showing it.
+    def _pushDrawing(self, full=False):
+        if not self.backend.renders:
+            self._frame_pending = False
+            return
+        if self._playing():
+            if not full:
+                self._queueStep()
+                return
+            self._flushTimeline()
+        start = time.perf_counter()
+        sent = 0
+        groups = self._generateSvgGroups()
+        structure = self._svgStructure()
+        if not self._delta or full or structure != self._sent_structure:
+            svg = self._generateSvgDrawing(groups)
+            sent = len(svg)
+            self.backend.frame(svg)
+            if self._delta or self._playing():
+                self._markSent(groups, structure)
+            self._delta_pending = False
+        else:
+            ops = self._generateSvgDelta(groups)
+            if ops:
+                js = "ColabTurtlePlus.apply({},{});".format(json.dumps(self._svg_id), json.dumps(ops, separators=(",", ":")))
+                sent = len(js)
+                self.backend.delta(js)
+                self._delta_pending = True
+        self._frame_pending = False
+        self._frameSent(start, sent)
+
+    # Helper function that records the groups of the drawing as shown by the drawing window,
+    # after the whole drawing was sent, so that the next update can send only the changes.
+    def _markSent(self, groups, structure):
+        self._sent = {}
+        for gid, item in groups:
+            if isinstance(item, _GeometryStore):
+                item.markSynced(self._cullView())
+            elif isinstance(item, _StampStore):
+                item.markSynced()
+            else:
+                self._sent[gid] = item
+        self._sent_structure = structure
+        self._played = {self._groupId("turtle", t): t.turtle_pos + (self._spriteHeading(t),) for t in self._turtles}
+
+    # Helper function that sets when the next frame is due, after sent bytes went out of a frame started at start.
+    def _frameSent(self, start, sent):
+        interval = 1 / self._frame_rate if self._frame_rate else 0
+        if self._byte_rate:
+            interval = max(interval, sent / self._byte_rate)
+        self._next_frame = max(start + interval, time.perf_counter())
+
+    # Called after each cell is run. The changes sent as deltas are not part of the saved
+    # notebook output, so the full drawing is sent once at the end of the cell, as is
+    # a frame that was skipped by the frame rate limit.
+    def _syncDrawing(self, result=None):
+        if self._delta_pending or self._frame_pending or self._timeline:
+            self._pushDrawing(full=True)
+
+    def journal(self, start=None, stop=None):
+        """Returns the list of commands given to the screen and its turtles.
+
+        Args:
+            start: (optional) index of the first command
+            stop: (optional) index after the last command
+
+        Each command is a tuple (turtle, name, args, kwargs) where turtle
+        is the number of the turtle, or None for a screen function, and
+        kwargs is None when there are no keyword arguments. A command 
+        whose name is None creates turtle number 'turtle'. Functions that 
+        only return information are not in the journal. Commands are only
+        kept while journaling is on, see journaling().
+        """
+        return self._journal[start:stop]
+
+    def journaling(self, on=None):
+        """Sets or returns whether the commands given are kept in the journal.
+
+        Args:
+            on: (optional) True or False
+
+        The journal, see journal() and replay(), keeps every command given
+        to the screen and its turtles, which costs far more memory than 
+        the drawing itself, so it is off by default. Turn it on before 
+        drawing: turtles that already exist are recorded as created when
+        it is turned on, with their settings at that time unknown. 
+        Turning it off keeps the commands recorded so far.
+        """
+        if on is None:
+            return self._journaling
+        if on and not self._journaling:
+            created = {tid for tid, name, args, kwargs in self._journal if name is None}
+            self._journal.extend((turtle._tid, None, (), None) for turtle in self._turtles if turtle._tid not in created)
+            _useJournalWrappers(1)
+        elif self._journaling and not on:
+            _useJournalWrappers(-1)
+        self._journaling = bool(on)
+
+    def replay(self, stop=None, journal=None, size=None, mode=None, worldcoordinates=None, speed=None, backend="headless"):
+        """Draws the commands of the journal again on a new screen.
+
+        Args:
+            stop: (optional) number of commands to replay, default all
+            journal: (optional) a list of commands from journal(), default
+                the journal of this screen
+            size: (optional) the (width,height) of the new window
+            mode: (optional) one of "standard", "logo", "world" or "svg"
+            worldcoordinates: (optional) the tuple (llx, lly, urx, ury) as
+                for setworldcoordinates
+            speed: (optional) speed of all turtles
+            backend: (optional) the backend of the new screen, default 
+                'headless'
+
+        Returns the new screen. The settings given replace the calls to 
+        setup, mode, setworldcoordinates or speed in the journal, so the
+        same drawing can be made at another size or in another coordinate
+        system without running the turtle code again, e.g.
+        >>> screen.journaling(True)
+        >>> ...  # draw
+        >>> screen.replay(size=(1600,1200)).saveSVG("big.svg")
+        """
+        commands = self._journal if journal is None else journal
+        if stop is not None:
+            commands = commands[:stop]
+        screen = _Screen(backend)
+        skip = set()
+        if size is not None:
+            screen.setup(*size)
+            skip.update(("setup", "initializescreen", "initializeTurtle"))
+        if mode is not None:
+            screen.mode(mode)
+            skip.update(("mode", "setworldcoordinates", "initializescreen", "initializeTurtle"))
+        if worldcoordinates is not None:
+            screen.setworldcoordinates(*worldcoordinates)
+            skip.update(("mode", "setworldcoordinates", "initializescreen", "initializeTurtle"))
+        if speed is not None:
+            skip.add("speed")
+        turtles = {}
+        for tid, name, args, kwargs in commands:
+            if name is None:
+                turtle = RawTurtle(screen)
+                if speed is not None:
+                    turtle.speed(speed)
+            elif name in skip:
+                continue
+            elif tid is None:
+                getattr(screen, name)(*args, **(kwargs or {}))
+            else:
+                if tid not in turtles:
+                    turtles.update((turtle._tid, turtle) for turtle in screen._turtles)
+                getattr(turtles[tid], name)(*args, **(kwargs or {}))
+        return screen
+
+    def batch(self):
+        """Returns a context manager that suspends updates of the drawing window.
+
+        No argument
+
+        Example:
+        >>> with batch():
+        ...     for i in range(100):
+        ...         forward(5)
+        ...         left(7)
+
+        Inside the with block turtles move without animation and nothing
+        is sent to the drawing window, whatever the speed of the turtles.
+        All changes, including those made by screen functions, are shown 
+        at once at the end of the block. delay() does not wait and done()
+        leaves the drawing to the end of the block. Blocks can be nested.
+        """
+        return _Batch(self)
+
+    def together(self):
+        """Returns a context manager in which turtles move at the same time.
+
+        No argument
+
+        Example:
+        >>> with together():
+        ...     for t in turtles():
+        ...         t.forward(200)
+
+        The calls made to turtles inside the with block are not run at once
+        but queued, one queue for each turtle, and return None. When the 
+        block ends, each turtle goes through its queue while the others go 
+        through theirs, at the speed of each turtle, and each frame of the 
+        animation shows all the turtles that moved, so a race of many 
+        turtles costs one update of the drawing window per frame. Functions
+        that only return information, and screen functions, run at once.
+        """
+        return _Together(self)
+
+    def tracer(self, n=None, delay=None):
+        """Turns turtle animation on/off and sets delay for update drawings.
+
+        Args:
+            n: (optional) nonnegative integer
+            delay: (optional) nonnegative integer, delay in milliseconds
+
+        If n is given, only each n-th regular update of the drawing 
+        window is really performed. tracer(0) turns updates off until
+        tracer is turned on again or update() is called. If delay is given,
+        it replaces the delay set by the speed of the turtles.
+        Without arguments, returns the value of n.
+        """
+        if n is None and delay is None:
+            return self._tracer
+        if n is not None:
+            if not isinstance(n, int) or n < 0:
+                raise ValueError("n must be a nonnegative integer.")
+            self._tracer = n
+            self._update_count = 0
+        if delay is not None:
+            if not isinstance(delay, (int, float)) or delay < 0:
+                raise ValueError("The delay must be a nonnegative number.")
+            self._tracer_delay = delay
+        if self._tracer and self._frame_pending and not self._batch_depth:
+            self._pushDrawing()
+
+    def update(self):
+        """Sends all changes to the drawing window.
+
+        No argument
+
+        Use with tracer(0) to show the drawing at chosen moments.
+        """
+        self._pushDrawing()
+
+    def framerate(self, fps=None, bytes_per_second=None):
+        """Sets or returns the limits on updates of the drawing window.
+
+        Args:
+            fps: (optional) a positive number, the maximum number of 
+                updates per second, or 0 for no limit
+            bytes_per_second: (optional) a positive number, the maximum 
+                average amount of data sent per second, or 0 for no limit
+
+        Without arguments, returns the tuple (fps, bytes_per_second).
+    
+        The changes made by all turtles between two updates are shown 
+        together. When the drawing changes faster than the limits allow,
+        frames are skipped and the turtles move in larger steps, which keeps 
+        long animations below the output rate limit of Jupyter. The last 
+        frame is always shown at the end of the cell. Default is 30 frames 
+        and 800000 bytes per second.
+        """
+        if fps is None and bytes_per_second is None:
+            return self._frame_rate, self._byte_rate
+        for value in (fps, bytes_per_second):
+            if value is not None and (not isinstance(value, (int, float)) or value < 0):
+                raise ValueError("The limits must be non-negative numbers, 0 for no limit.")
+        if fps is not None:
+            self._frame_rate = fps
+        if bytes_per_second is not None:
+            self._byte_rate = bytes_per_second
+        self._next_frame = 0
+
+    def precision(self, n=None):
+        """Sets or returns the number of decimals of coordinates in the svg output.
+
+        Args:
+            n: (optional) an integer from 0 to 10
+
+        Coordinates are written in their shortest form with at most n 
+        decimals, e.g. 412.5 rather than 412.500, and lines drawn one 
+        after another are written as one path of relative moves. Fewer
+        decimals make updates and saved files smaller. Default is 3, the
+        precision to which turtle positions are kept.
+        """
+        if n is None:
+            return self._precision
+        if not isinstance(n, int) or not 0 <= n <= 10:
+            raise ValueError("The precision must be an integer from 0 to 10.")
+        self._precision = n
+        self._drawing_key = None
+        self._sent_structure = None
+        self._updateDrawing()
+
+    def culling(self, on=None):
+        """Sets or returns whether what lies outside the drawing window is left out.
+
+        Args:
+            on: (optional) True or False
+
+        With culling on, lines, arcs, fills and dots that lie entirely 
+        outside the drawing window are not written to the drawing or to 
+        saved svg files, which makes a view zoomed into a small part of a 
+        large drawing much cheaper. Nothing that would be visible is left 
+        out, and the drawing itself keeps all of them, so turning culling
+        off shows them again. Default is on.
+        """
+        if on is None:
+            return self._culling
+        self._culling = bool(on)
+        self._drawing_key = None
+        self._sent_structure = None
+        self._updateDrawing()
+
+    def simplify(self, tolerance=None, files=None):
+        """Sets or returns the tolerance in pixels to which long paths are simplified.
+
+        Args:
+            tolerance: (optional) a non-negative number, 0 for no simplification
+            files: (optional) True or False, whether saved svg files are 
+                simplified too
+
+        Deep L-systems and plots of many points have far more vertices 
+        than there are pixels. With a tolerance, the paths drawn with the
+        pen down are simplified by Douglas-Peucker, which leaves out the 
+        vertices that change a path by less than the tolerance, including
+        the ones on a straight line with their neighbours, so the drawing 
+        shows no more than can be told apart. The drawing itself keeps 
+        every vertex, so setting the tolerance to 0 shows them all again,
+        and saved files keep them all unless files is True. A tolerance 
+        of 0.5 is hardly visible. Default is 0.
+        """
+        if tolerance is None and files is None:
+            return self._lod
+        if tolerance is not None:
+            if not isinstance(tolerance, (int, float)) or tolerance < 0:
+                raise ValueError("The tolerance must be a non-negative number.")
+            self._lod = tolerance
+        if files is not None:
+            self._lod_files = bool(files)
+        self._drawing_key = None
+        self._sent_structure = None
+        self._updateDrawing()
+
+    # Helper function for the (turtle, store) pairs of the layers that are searched, screen drawlines first
+    def _searchLayers(self):
+        return [(None, self._drawline_store)] + [(t, store) for t in self._turtles for store in (t.line_store, t.dot_store)]
+
+    # Helper function for the (turtle, kind, points) item of the part (i, k) of a primitive in store,
+    # with its points in turtle coordinates
+    def _searchItem(self, turtle, store, i, k):
+        points = tuple((x/self.xscale + self.xmin, self.ymax - y/self.yscale) for x, y in store.points(i, k))
+        return (turtle, SPATIAL_KIND_NAMES[store.kinds[i]], points)
+
+    def find_items(self, bbox):
+        """Returns the items of the drawing that lie in a rectangle.
+
+        Args:
+            bbox: a tuple (x1, y1, x2, y2) of two opposite corners of the 
+                rectangle, in turtle coordinates
+
+        Returns:
+            list: a tuple (turtle, kind, points) for each item that meets
+                the rectangle, where turtle is the turtle that drew it, or
+                None for lines drawn with drawline(), kind is one of 'line',
+                'arc', 'fill', 'text' and 'dot', and points is a tuple of
+                points (x, y) in turtle coordinates
+
+        A 'line' is one straight segment, with its two ends as points, and
+        is found when the segment crosses the rectangle, so a long path
+        drawn with one pen gives only its segments near the rectangle. An
+        'arc' has its two ends as points, a 'fill' the corners of its
+        outline, and a 'text' or 'dot' the point where it was drawn. These
+        are found when the box around them meets the rectangle.
+        """
+        if len(bbox) != 4:
+            raise ValueError("The box must be a tuple (x1, y1, x2, y2).")
+        xs = (self._convertx(bbox[0]), self._convertx(bbox[2]))
+        ys = (self._converty(bbox[1]), self._converty(bbox[3]))
+        box = (min(xs), min(ys), max(xs), max(ys))
+        items = []
+        for turtle, store in self._searchLayers():
+            items.extend([self._searchItem(turtle, store, i, k) for i, k in store.find(box)])
+        return items
+
+    def nearest(self, x, y=None):
+        """Returns the line of the drawing that passes closest to a point.
+
+        Args:
+            x: a number or a pair of numbers (x, y)
+            y: a number, or None if x is a pair
+
+        Returns:
+            a tuple ((turtle, 'line', points), distance) for the nearest
+            straight segment, as in find_items(), with the distance in
+            pixels of the drawing window, or None if no line has been drawn
+        """
+        if y is None:
+            x, y = x
+        px, py = self._convertx(x), self._converty(y)
+        best = None
+        for turtle, store in self._searchLayers():
+            found = store.nearest(px, py)
+            if found is not None and (best is None or found[0] < best[1]):
+                best = (self._searchItem(turtle, store, found[1], found[2]), found[0])
+        return best
+
+    def deltamode(self, on=None):
+        """Sets or returns whether only changes are sent to the drawing window.
+
+        Args:
+            on: (optional) True or False
+
+        With delta rendering on, each update sends only the parts of the
+        drawing added since the previous update and the turtles that changed,
+        instead of the whole SVG drawing, so animations stay fast as the 
+        drawing grows. The notebook must run javascript (Colab or a trusted 
+        Jupyter notebook). The whole drawing is still sent at the end of each
+        cell so that the saved notebook shows the final image.
+        """
+        if on is None:
+            return self._delta
+        self._delta = bool(on)
+        self._sent_structure = None
+
+    def playback(self, on=None):
+        """Sets or returns whether animations are played by the drawing window.
+
+        Args:
+            on: (optional) True or False
+
+        With playback on, turtles do not wait for their animations. Each 
+        move, turn, fill or stamp is drawn at once and sent to the drawing
+        window as a step of a timeline, which the browser plays at the 
+        speed of the turtles, so the cell finishes as soon as the drawing
+        is computed while the animation goes on. The timeline is sent in 
+        one message per frame, see framerate(). The notebook must run 
+        javascript (Colab or a trusted Jupyter notebook). The final image 
+        is still sent at the end of each cell and shown when the timeline 
+        has been played. Default is off.
+        """
+        if on is None:
+            return self._playback
+        if self._playback and not on:
+            self._flushTimeline()
+        self._playback = bool(on)
+        self._sent_structure = None
+
+    # Helper function that animates a motion of a turtle made of pieces that take turtle.timeout seconds each,
+    # or the delay set by tracer(). show(f) puts the turtle at the fraction f of the motion.
+    # When the backend shows animations as they happen, the motion follows the clock: each frame shows
+    # where the turtle should be by then, and the next one is due when the frame rate, the byte rate and
+    # the time spent on the last frame allow, counted from when the last frame started. Frames are dropped
+    # when drawing falls behind, so the motion takes the same time however large the drawing is, but the
+    # last frame, at the end of the motion, is always sent.
+    # Otherwise, and when the pieces become steps of a timeline or are paced by together(), the motion
+    # is shown piece by piece.
+    # The last frame shows the end of the motion as left by finish(), e.g. with the line added to the
+    # drawing instead of the overlay, or by show(1) if finish is not given.
+    def _animateMotion(self, turtle, pieces, show, finish=None):
+        if finish is None:
+            finish = lambda: show(1)
+        if not pieces:
+            finish()
+            return
+        if not self.backend.realtime or self._scheduling or self._playing():
+            for k in range(1, pieces):
+                show(k/pieces)
+                self._updateDrawing(turtle=turtle)
+            finish()
+            self._updateDrawing(turtle=turtle)
+            return
+        duration = pieces*(turtle.timeout if self._tracer_delay is None else self._tracer_delay/1000)
+        start = time.perf_counter()
+        end = start + duration
+        f = 0
+        while f < 1:
+            now = time.perf_counter()
+            # less than a millisecond before the end the motion is over
+            f = (now - start)/duration if end - now > .001 else 1
+            if f < 1:
+                show(f)
+            else:
+                finish()
+            # the frame at the end of the motion is always sent
+            self._updateDrawing(turtle=turtle, delay=False, now=f == 1)
+            if f < 1:
+                due = max(now + (1/self._frame_rate if self._frame_rate else 0), self._next_frame)
+                _sleep(max(0, min(due, end) - time.perf_counter()))
 
     # Helper function for managing any kind of move to a given 'new_pos' and draw lines if pen is down
     # Animate turtle motion along line
@@ -337,72 +2374,42 @@ class _Screen:
     
         timeout_orig = turtle.timeout
         start_pos = turtle.turtle_pos           
-        svg_lines_string_orig = turtle.svg_lines_string       
-        s = 1 if units > 0 else -1            
-        if turtle.turtle_speed != 0 and turtle.animate:
-            if round(self.xscale,6) == round(abs(self.yscale),6):
-                # standard, logo, svg mode, or world mode with same aspect ratio for axes and window
-                initial_pos = turtle.turtle_pos         
-                alpha = math.radians(turtle.turtle_degree)
-                tenx, teny = 10/self.xscale, 10/abs(self.yscale)
-                dunits = s*10/self.xscale
-                turtle.timeout = turtle.timeout*.20    
-                while s*units > 0:
-                    dx = min(tenx,s*units)
-                    dy = min(teny,s*units)
-                    turtle.turtle_pos = (initial_pos[0] + s * dx * self.xscale * math.cos(alpha), initial_pos[1] + s * dy * abs(self.yscale) * math.sin(alpha))
-                    if turtle.is_pen_down:
-                        turtle.svg_lines_string += \
-                        """<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke-linecap="round" style="stroke:{pcolor};stroke-width:{pwidth}" />""".format(
-                            x1=initial_pos[0],
-                            y1=initial_pos[1],
-                            x2=turtle.turtle_pos[0],
-                            y2=turtle.turtle_pos[1],
-                            pcolor=turtle.pen_color, 
-                            pwidth=turtle.pen_width) 
-                    initial_pos = turtle.turtle_pos
-                    self._updateDrawing(turtle=turtle)
-                    units -= dunits
-            else:
-                # world mode with aspect ratio of axes different than aspect ratio of the window
-                initial_pos = turtle.position()
-                alpha = math.radians(turtle.turtle_degree)
-                turtle.timeout = turtle.timeout*0.20
-                xpixunits = self._convertx(1)-self._convertx(0)  #length of 1 world unit along x-axis in pixels
-                ypixunits = self._converty(1)-self._converty(0)  #length of 1 world unit along y-axis in pixels
-                xstep = 10/(max(xpixunits,ypixunits))  #length of 10 pixels in world units 
-                ystep = xstep
-                dunits = s*xstep
-                while s*units > 0:
-                    dx = min(xstep,s*units)
-                    dy = min(ystep,s*units)
-                    temp_turtle_pos = (initial_pos[0] + s * dx * math.cos(alpha), initial_pos[1] - s * dy * math.sin(alpha))
-                    turtle.turtle_pos = (self._convertx(temp_turtle_pos[0]), self._converty(temp_turtle_pos[1]))
-                    if turtle.is_pen_down:
-                        turtle.svg_lines_string += \
-                        """<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke-linecap="round" style="stroke:{pcolor};stroke-width:{pwidth}" />""".format(
-                            x1=self._convertx(initial_pos[0]),
-                            y1=self._converty(initial_pos[1]),
-                            x2= turtle.turtle_pos[0],
-                            y2= turtle.turtle_pos[1],
-                            pcolor=turtle.pen_color, 
-                            pwidth=turtle.pen_width) 
-                    initial_pos = temp_turtle_pos
-                    self._updateDrawing(turtle=turtle)
-                    units -= dunits
-        if turtle.is_pen_down:
-            # now create the permanent svg string that does not display the animation
-            turtle.svg_lines_string = svg_lines_string_orig + \
-                """<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke-linecap="round" style="stroke:{pcolor};stroke-width:{pwidth}" />""".format(
+        # the move takes as long as its pieces of 10 pixels, each turtle.timeout*0.2
+        pieces = math.ceil(math.hypot(new_pos[0] - start_pos[0], new_pos[1] - start_pos[1])/10)
+        playing = self._animating(turtle) and self._playing()
+
+        # the animated part of the move was drawn in the overlay, so the drawing itself only grows
+        def finish():
+            turtle.svg_overlay_string = ""
+            if turtle.is_pen_down:
+                turtle.line_store.addSegment(self._strokeStyle(turtle), start_pos[0], start_pos[1], new_pos[0], new_pos[1])
+            if turtle.is_filling:
+                turtle.fill_path.extend((0, new_pos[0], new_pos[1]))
+            turtle.turtle_pos = new_pos
+
+        if playing:
+            turtle.timeout = turtle.timeout*.20*pieces
+            finish()
+        elif self._animating(turtle):
+            turtle.timeout = turtle.timeout*.20
+
+            # Puts the turtle at the fraction f of the move, with the line drawn so far in the overlay
+            def show(f):
+                turtle.turtle_pos = (start_pos[0] + f*(new_pos[0] - start_pos[0]), start_pos[1] + f*(new_pos[1] - start_pos[1]))
+                if turtle.is_pen_down:
+                    turtle.svg_overlay_string = \
+                    """<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke-linecap="round" style="stroke:{pcolor};stroke-width:{pwidth}" />""".format(
                         x1=start_pos[0],
                         y1=start_pos[1],
-                        x2=new_pos[0],
-                        y2=new_pos[1],
+                        x2=turtle.turtle_pos[0],
+                        y2=turtle.turtle_pos[1],
                         pcolor=turtle.pen_color, 
-                        pwidth=turtle.pen_width)
-        if turtle.is_filling:
-            turtle.svg_fill_string += """ L {x1} {y1} """.format(x1=new_pos[0],y1=new_pos[1])  
-        turtle.turtle_pos = new_pos
+                        pwidth=turtle.pen_width) 
+            self._animateMotion(turtle, pieces, show, finish)
+        else:
+            finish()
+        if playing and turtle.timeout:
+            self._updateDrawing(turtle=turtle, line=start_pos if turtle.is_pen_down else None)
         turtle.timeout = timeout_orig
         if not turtle.animate: self._updateDrawing(turtle=turtle)                    
  
@@ -418,20 +2425,9 @@ class _Screen:
     
         start_pos = turtle.turtle_pos
         if turtle.is_pen_down:  
-            turtle.svg_lines_string += \
-            """<path d="M {x1} {y1} A {rx} {ry} 0 0 {s} {x2} {y2}" stroke-linecap="round" 
-            fill="transparent" fill-opacity="0" style="stroke:{pcolor};stroke-width:{pwidth}"/>""".format(
-            x1=start_pos[0], 
-            y1=start_pos[1],
-            rx = rx,
-            ry = ry,
-            x2=new_pos[0],
-            y2=new_pos[1],
-            pcolor=turtle.pen_color,
-            pwidth=turtle.pen_width,
-            s=sweep)    
+            turtle.line_store.add(_ARC, self._strokeStyle(turtle), (start_pos[0], start_pos[1], rx, ry, sweep, new_pos[0], new_pos[1]))
         if turtle.is_filling:
-            turtle.svg_fill_string += """ A {rx} {ry} 0 0 {s} {x2} {y2} """.format(rx=r,ry=r,x2=new_pos[0],y2=new_pos[1],s=sweep)  
+            turtle.fill_path.extend((1, rx, ry, sweep, new_pos[0], new_pos[1]))
         turtle.turtle_pos = new_pos
 
     # Helper function to draw a circular arc
@@ -452,6 +2448,53 @@ class _Screen:
         turtle.turtle_degree = (turtle.turtle_degree - s*degrees) % 360
         turtle.turtle_orient = turtle._turtleOrientation()
         if draw: self._updateDrawing(turtle=turtle)                      
+
+    # Helper function that animates the turtle along a circular arc of 'degrees' in the overlay, then adds
+    # the arc to the drawing once, in pieces of at most 180 degrees as drawn without animation.
+    # Positive radius has arc to left of turtle, negative radius has arc to right of turtle.
+    def _animateArc(self, radius, degrees, turtle):
+        alpha = math.radians(turtle.turtle_degree)
+        s = radius/abs(radius)  # 1=left, -1=right
+        rx = radius*self.xscale
+        ry = radius*abs(self.yscale)
+        sweep = 0 if radius > 0 else 1  # SVG arc sweep flag
+        circle_center = (turtle.turtle_pos[0] + rx*math.sin(alpha), turtle.turtle_pos[1] - ry*math.cos(alpha))
+        turtle_degree_orig = turtle.turtle_degree
+        turtle_pos_orig = turtle.turtle_pos
+
+        # Returns the point of the arc after turning by 'theta' degrees
+        def point(theta):
+            gamma = alpha - s*math.radians(theta)
+            return (round(circle_center[0] - rx*math.sin(gamma),3), round(circle_center[1] + ry*math.cos(gamma),3))
+
+        # Puts the turtle at the fraction f of the arc, with the arc drawn so far in the overlay,
+        # in pieces of at most 180 degrees
+        def show(f):
+            theta = f*degrees
+            turtle.turtle_pos = point(theta)
+            turtle.turtle_degree = (turtle_degree_orig - s*theta) % 360
+            turtle.turtle_orient = turtle._turtleOrientation()
+            if turtle.is_pen_down:
+                d = ["M {} {}".format(*turtle_pos_orig)]
+                for done in range(180, math.ceil(theta), 180):
+                    d.append("A {} {} 0 0 {} {} {}".format(rx, ry, sweep, *point(done)))
+                d.append("A {} {} 0 0 {} {} {}".format(rx, ry, sweep, *turtle.turtle_pos))
+                turtle.svg_overlay_string = \
+                """<path d="{d}" fill="none" stroke-linecap="round" style="stroke:{pcolor};stroke-width:{pwidth}" />""".format(
+                    d=" ".join(d),
+                    pcolor=turtle.pen_color,
+                    pwidth=turtle.pen_width)
+
+        # Goes back to the start and adds the arc to the drawing
+        def finish():
+            turtle.svg_overlay_string = ""
+            turtle.turtle_degree = turtle_degree_orig
+            turtle.turtle_pos = turtle_pos_orig
+            remaining = degrees
+            while remaining > 0:
+                self._arc(radius, min(180,remaining), False, turtle)
+                remaining -= 180
+        self._animateMotion(turtle, math.ceil(degrees/15), show, finish)
    
     # Convert user coordinates to SVG coordinates
     def _convertx(self, x):
@@ -486,13 +2529,8 @@ class _Screen:
         if width is None:
             width = DEFAULT_PEN_WIDTH
         
-        self._svg_drawlines_string += """<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke-lineca="round" style="stroke:{pencolor};stroke-width:{penwidth}" />""".format(
-            x1=self._convertx(x_1),
-            y1=self._converty(y_1),
-            x2=self._convertx(x_2),
-            y2=self._converty(y_2),
-            pencolor = color,
-            penwidth = width)
+        self._drawline_store.add(_LINE, self._styleIndex("stroke", color, width), 
+                                 (self._convertx(x_1), self._converty(y_1), self._convertx(x_2), self._converty(y_2)))
         self._updateDrawing()   
     line = drawline #alias 
 
@@ -604,20 +2642,20 @@ class _Screen:
         """
         if self._turtles == []: return
         for turtle in self._turtles:
-            turtle.svg_lines_string = ""
-            turtle.svg_fill_string = ""
-            turtle.svg_dots_string = ""
-            turtle.svg_stampsB_string = ""
-            turtle.svg_stampsT_string = ""
-            turtle.stampdictB = {}
-            turtle.stampdictT = {}
+            turtle.line_store.clear()
+            turtle.svg_overlay_string = ""
+            turtle.dot_store.clear()
+            turtle.stampsB.clear()
+            turtle.stampsT.clear()
+            turtle.stamp_layer = {}
             turtle.stampnum = 0
-            turtle.stamplist=[]
             turtle.is_filling = False
-            self._svg_drawlines_string = ""
+            self._drawline_store.clear()
         self._turtles = []
-        Turtle._pen = None
-        Turtle._screen = None       
+        self.backend.close()
+        if Turtle._screen is self:
+            Turtle._pen = None
+            Turtle._screen = None       
 
     # Reset all Turtles on the Screen to their initial state.
     def reset(self):
@@ -737,13 +2775,7 @@ class _Screen:
         
     # Used to validate a color string
     def _validateColorString(self, color):
-        if color in VALID_COLORS: # 140 predefined html color names
-            return True
-        if re.search("^#(?:[0-9a-fA-F]{3}){1,2}$", color): # 3 or 6 digit hex color code
-            return True
-        if re.search("rgb\(\s*(?:(?:\d{1,2}|1\d\d|2(?:[0-4]\d|5[0-5]))\s*,?){3}\)$", color): # rgb color code
-            return True
-        return False
+        return color in VALID_COLORS_SET or HEX_COLOR_PATTERN.match(color.lower()) is not None or _rgbColor(color.lower()) is not None
 
     # Used to validate if a 3 tuple of integers is a valid RGB color
     def _validateColorTuple(self, color):
@@ -755,28 +2787,29 @@ class _Screen:
             return False
         return True
 
-    # Helps validate color input to functions
+    # Helps validate color input to functions. Normalized colors are cached, see _normalizeColor.
     def _processColor(self,color):
-        if isinstance(color, str):    
-            if color == "": color = "none"
-            color = color.lower().strip()
-            if 'rgb' not in color: color = color.replace(" ","")
-            if not self._validateColorString(color):
-                err = 'Color ' + color + ' is invalid. It can be a known html color name, 3-6 digit hex string, or rgb string.'
-                raise ValueError(err)
-            return color
-        elif isinstance(color, tuple):
-            if not self._validateColorTuple(color):
-                err = 'Color tuple ' + color + ' is invalid. It must be a tuple of three integers, which are in the interval [0,255]'
-                raise ValueError(err)
-            return 'rgb(' + str(color[0]) + ',' + str(color[1]) + ',' + str(color[2]) + ')'
-        else:
-            err = 'The color parameter ' + color + ' must be a color string or a tuple'
-            raise ValueError(err)
+        if not isinstance(color, (str, tuple)):
+            raise ValueError('The color parameter {} must be a color string or a tuple'.format(color))
+        try:
+            return _normalizeColor(color)
+        except TypeError:
+            raise ValueError('Color tuple {} is invalid. It must be a tuple of three integers, which are in the interval [0,255]'.format(color))
 
 
 
 #----------------------------------------------------------------------------------------------        
+
+# Helper function for the numbers given to walk() or path(). A range, a generator or any other iterable
+# is read into a list, so that it is taken the same way with or without NumPy. Numbers, lists, tuples
+# and NumPy arrays are returned as they are, as is anything else, which is then turned down as not numbers.
+def _listedNumbers(values):
+    if isinstance(values, (int, float, list, tuple)) or (np is not None and isinstance(values, np.ndarray)):
+        return values
+    try:
+        return list(values)
+    except TypeError:
+        return values
       
         
 class RawTurtle:     
@@ -795,9 +2828,12 @@ class RawTurtle:
         self.fill_color = DEFAULT_FILL_COLOR
         self.turtle_degree = DEFAULT_TURTLE_DEGREE if (screen._mode in ["standard","world"]) else (270 - DEFAULT_TURTLE_DEGREE)
         self.turtle_orient = self.turtle_degree
-        self.svg_lines_string = self.svg_fill_string = self.svg_dots_string = ""
-        self.svg_stampsB_string = self.svg_stampsT_string = ""
-        self.svg_lines_string_temp = ""
+        self.line_store = _GeometryStore()
+        self.dot_store = _GeometryStore()
+        self.fill_path = array('d')
+        self.fill_mark = 0
+        self.fill_style = None
+        self.svg_overlay_string = ""
         self.is_pen_down = DEFAULT_IS_PEN_DOWN
         self.pen_width = DEFAULT_PEN_WIDTH
         self.turtle_shape = DEFAULT_TURTLE_SHAPE
@@ -817,18 +2853,21 @@ class RawTurtle:
         self.angle_mode = DEFAULT_ANGLE_MODE
         self.fill_rule = "evenodd"
         self.fill_opacity = 1
-        self.stampdictB = {}
-        self.stampdictT = {}
+        # stamps below and above the other items, and the layer of each stamp id in the order they were made
+        # (extent, duration, stretch x, stretch y) of the turn being animated by right(), or None
+        self.turn_animation = None
+        self.stampsB = _StampStore()
+        self.stampsT = _StampStore()
+        self.stamp_layer = {}
         self.stampnum = 0
-        self.stamplist=[]
-        self.shapeDict = {"turtle":TURTLE_TURTLE_SVG_TEMPLATE, 
+        self.shapeDict = {"turtle":TURTLE_USE_SVG_TEMPLATE, 
               "ring":TURTLE_RING_SVG_TEMPLATE, 
-              "classic":TURTLE_CLASSIC_SVG_TEMPLATE,
-              "arrow":TURTLE_ARROW_SVG_TEMPLATE,
-              "square":TURTLE_SQUARE_SVG_TEMPLATE,
-              "triangle":TURTLE_TRIANGLE_SVG_TEMPLATE,
+              "classic":TURTLE_USE_SVG_TEMPLATE,
+              "arrow":TURTLE_USE_SVG_TEMPLATE,
+              "square":TURTLE_USE_SVG_TEMPLATE,
+              "triangle":TURTLE_USE_SVG_TEMPLATE,
               "circle":TURTLE_CIRCLE_SVG_TEMPLATE,
-              "turtle2":TURTLE_TURTLE2_SVG_TEMPLATE,
+              "turtle2":TURTLE_USE_SVG_TEMPLATE,
               "blank":""}
         if screen._mode == "svg": self.shapeDict.update({"circle":TURTLE_RING_SVG_TEMPLATE})                                          
         screen._add(self)
@@ -882,9 +2921,11 @@ class RawTurtle:
     back = backward # alias    
     
     # Makes the turtle move right by 'angle' degrees or radians
-    # Uses SVG animation to rotate turtle.
+    # In playback mode the drawing window turns the turtle.
+    # Otherwise uses SVG animation to rotate turtle: turn_animation makes the sprite include TURTLE_TURN_ANIMATION_TEMPLATE.
     # But this doesn't work for turtle=ring and if stretch factors are different for x and y directions,
-    # so in that case break the rotation into pieces of at most 30 degrees.
+    # or for a shape drawn through a symbol when it is sheared, since the shear is then applied before 
+    # the animation, so in that case break the rotation into pieces of at most 30 degrees.
     def right(self, angle):
         """Turns the turtle right by angle units.
 
@@ -901,51 +2942,37 @@ class RawTurtle:
             raise ValueError('Degrees must be a number.')  
         timeout_orig = self.timeout
         deg = angle*self.angle_conv
-        if self.turtle_speed == 0 or not self.animate:
+        if not self.screen._animating(self):
             self.turtle_degree = (self.turtle_degree + deg) % 360
             self.screen._updateDrawing(turtle=self)
-        elif self.turtle_shape != 'ring' and self.stretchfactor[0]==self.stretchfactor[1]:
+        elif self.screen._playing():
+            self.timeout = self.timeout*abs(deg)/90
+            self.turtle_degree = (self.turtle_degree + deg) % 360
+            self.turtle_orient = self._turtleOrientation()
+            self.screen._updateDrawing(turtle=self, turn=deg)
+            self.timeout = timeout_orig
+        elif self.turtle_shape != 'ring' and self.stretchfactor[0]==self.stretchfactor[1] and (self.shear_factor == 0 or self.shapeDict[self.turtle_shape] != TURTLE_USE_SVG_TEMPLATE):
             stretchfactor_orig = self.stretchfactor
-            template = self.shapeDict[self.turtle_shape]        
-            tmp = """<animateTransform id = "one" attributeName="transform" 
-                      type="scale"
-                      from="1 1" to="{sx} {sy}"
-                      begin="0s" dur="0.01s"
-                      repeatCount="1"
-                      additive="sum"
-                      fill="freeze"
-                /><animateTransform attributeName="transform"
-                    type="rotate"
-                    from="0 0 0" to ="{extent} 0 0"
-                    begin="one.end" dur="{t}s"
-                    repeatCount="1"
-                    additive="sum"
-                    fill="freeze"
-                /></g>""".format(extent=deg, t=self.timeout*abs(deg)/90, sx=self.stretchfactor[0], sy=self.stretchfactor[1])
-            newtemplate = template.replace("</g>",tmp)
-            self.shapeDict.update({self.turtle_shape:newtemplate})
+            self.turn_animation = (deg, self.timeout*abs(deg)/90, self.stretchfactor[0], self.stretchfactor[1])
             self.stretchfactor = 1,1
             self.timeout = self.timeout*abs(deg)/90+0.001
-            self.screen._updateDrawing(self)
+            # the turn is only animated by this frame, so it is not held back by the frame rate
+            self.screen._updateDrawing(self, now=True)
             self.turtle_degree = (self.turtle_degree + deg) % 360
             self.turtle_orient = self._turtleOrientation()
-            self.shapeDict.update({self.turtle_shape:template})
+            self.turn_animation = None
             self.stretchfactor = stretchfactor_orig
             self.timeout = timeout_orig
         else: #_turtle_shape == 'ring' or _stretchfactor[0] != _stretchfactor[1]
             turtle_degree_orig = self.turtle_degree
-            s = 1 if angle > 0 else -1
-            while s*deg > 0:
-                if s*deg > 30:
-                    self.turtle_degree = (self.turtle_degree + s*30) % 360
-                    self.turtle_orient = self._turtleOrientation()
-                else:
-                    self.turtle_degree = (self.turtle_degree + deg) % 360
-                    self.turtle_orient = self._turtleOrientation()
-                self.screen._updateDrawing(turtle=self)
-                deg -= s*30
+
+            # Turns the turtle by the fraction f of the angle
+            def show(f):
+                self.turtle_degree = (turtle_degree_orig + f*deg) % 360
+                self.turtle_orient = self._turtleOrientation()
+            self.screen._animateMotion(self, math.ceil(abs(deg)/30), show)
             self.timeout = timeout_orig
-            self.turtle_degree = (self.turtle_degree + deg) % 360
+            self.turtle_degree = (turtle_degree_orig + deg) % 360
             self.turtle_orient = self._turtleOrientation()
     rt = right # alias    
     
@@ -1022,27 +3049,12 @@ class RawTurtle:
                 self.left(alpha)
             self.forward(length)
             self.left(alpha/2)  
-        elif self.turtle_speed != 0 and self.animate:
+        elif self.screen._animating(self):
             timeout_temp = self.timeout 
             self.timeout = self.timeout*0.5
             degrees = extent*self.angle_conv
-            extent = degrees
-            # Use temporary svg strings for animation
-            svg_lines_string_temp = self.svg_lines_string
-            svg_fill_string_temp = self.svg_fill_string 
-            turtle_degree_orig = self.turtle_degree
-            turtle_pos_orig = self.turtle_pos        
-            while extent > 0:
-                self.screen._arc(radius,min(15,extent),True, turtle=self)
-                extent -= 15 
-            # return to original position and redo circle for svg strings without animation
-            self.svg_lines_string = svg_lines_string_temp
-            self.svg_fill_string = svg_fill_string_temp
-            self.turtle_degree = turtle_degree_orig
-            self.turtle_pos = turtle_pos_orig
-            while degrees > 0:
-                self.screen._arc(radius,min(180,degrees),False, turtle=self)
-                degrees -= 180 
+            # the animation only draws the arc in the overlay, its geometry is added once at the end
+            self.screen._animateArc(radius, degrees, self)
             self.timeout = timeout_temp
         else:  # no animation
             extent = extent*self.angle_conv
@@ -1075,11 +3087,8 @@ class RawTurtle:
             if size is None:
                 size = self.pen_width + max(self.pen_width,4)
             color = self._processColor(color[0])
-        self.svg_dots_string += """<circle cx="{cx}" cy="{cy}" r="{radius}" fill="{kolor}" fill-opacity="1" />""".format(
-            radius=size/2,
-            cx=self.turtle_pos[0],
-            cy=self.turtle_pos[1],
-            kolor=color)
+        self.line_store.seal()
+        self.dot_store.add(_DOT, self.screen._styleIndex("dot", color), (self.turtle_pos[0], self.turtle_pos[1], size/2))
         self.screen._updateDrawing(turtle = self)
 
     # Move along a regular polygon of size sides, with length being the length of each side. The steps indicates how many sides are drawn.
@@ -1185,6 +3194,136 @@ class RawTurtle:
     setpos = goto # alias
     setposition = goto # alias               
 
+    # Move forward and turn left for each pair of values in distances and turns
+    def walk(self, distances, turns=None):
+        """Moves the turtle through a sequence of steps at once.
+
+        Args:
+            distances: a number or a sequence of numbers (e.g. a list,
+                a range, a generator or a NumPy array)
+            turns: (optional) a number or a sequence of numbers
+
+        Each step moves the turtle forward by a distance and then turns it
+        left by the corresponding angle, as with
+        >>> for d, t in zip(distances, turns):
+        ...     forward(d)
+        ...     left(t)
+        A single number is used for every step. All steps are added to the
+        drawing at once, without animation, so long walks are much faster 
+        than separate calls. Uses NumPy when it is installed.
+        """
+        if turns is None:
+            turns = 0
+        distances, turns = _listedNumbers(distances), _listedNumbers(turns)
+        screen = self.screen
+        x0, y0 = self.turtle_pos
+        xscale, yscale = screen.xscale, abs(screen.yscale)
+        if np is not None:
+            try:
+                d, t = np.broadcast_arrays(np.asarray(distances, dtype=float), np.asarray(turns, dtype=float))
+            except (TypeError, ValueError):
+                raise ValueError('Distances and turns must be numbers or sequences of numbers of the same length.')
+            if d.ndim == 0:
+                d, t = d.reshape(1), t.reshape(1)
+            if d.ndim != 1:
+                raise ValueError('Distances and turns must be one-dimensional.')
+            if not len(d):
+                return
+            alpha = np.empty(len(t))
+            alpha[0] = 0
+            np.cumsum(t[:-1], out=alpha[1:])
+            alpha *= -self.angle_conv
+            alpha += self.turtle_degree
+            np.radians(alpha, out=alpha)
+            xs = np.cumsum(d*np.cos(alpha))
+            ys = np.cumsum(d*np.sin(alpha))
+            for v, scale, start in ((xs, xscale, x0), (ys, yscale, y0)):
+                v *= scale
+                v += start
+                np.round(v, 3, out=v)
+            total = float(t.sum())
+        else:
+            d = list(distances) if isinstance(distances, (list, tuple)) else [distances]
+            t = list(turns) if isinstance(turns, (list, tuple)) else [turns]
+            if len(d) == 1 and len(t) > 1: d = d*len(t)
+            if len(t) == 1 and len(d) > 1: t = t*len(d)
+            if len(d) != len(t):
+                raise ValueError('Distances and turns must be numbers or sequences of numbers of the same length.')
+            if not all(isinstance(v, (int,float)) for v in d+t):
+                raise ValueError('Distances and turns must be numbers or sequences of numbers of the same length.')
+            xs, ys = [], []
+            x, y, degree = x0, y0, self.turtle_degree
+            cos, sin, radians, conv = math.cos, math.sin, math.radians, self.angle_conv
+            for dist, turn in zip(d, t):
+                alpha = radians(degree)
+                x += dist*xscale*cos(alpha)
+                y += dist*yscale*sin(alpha)
+                xs.append(round(x, 3))
+                ys.append(round(y, 3))
+                degree -= conv*turn
+            total = sum(t)
+        self._moveAlong(xs, ys)
+        self.turtle_degree = (self.turtle_degree - self.angle_conv*total) % 360
+        self.turtle_orient = self._turtleOrientation()
+        screen._updateDrawing(turtle=self)
+
+    # Move to each point (xs[i], ys[i]) in turn
+    def path(self, xs, ys):
+        """Moves the turtle through a sequence of points at once.
+
+        Args:
+            xs: a sequence of numbers (e.g. a list, a range, a generator
+                or a NumPy array)
+            ys: a sequence of numbers of the same length
+
+        Moves the turtle to each point (xs[i], ys[i]) in turn, as goto does,
+        drawing lines if the pen is down. The turtle's heading does not 
+        change. All points are added to the drawing at once, without 
+        animation. Uses NumPy when it is installed.
+        """
+        screen = self.screen
+        xs, ys = _listedNumbers(xs), _listedNumbers(ys)
+        if np is not None:
+            try:
+                x, y = np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+            except (TypeError, ValueError):
+                raise ValueError('The coordinates must be sequences of numbers.')
+            if x.ndim != 1 or x.shape != y.shape:
+                raise ValueError('xs and ys must be sequences of the same length.')
+            px = np.round((x - screen.xmin)*screen.xscale, 3)
+            py = np.round((screen.ymax - y)*screen.yscale, 3)
+        else:
+            if not isinstance(xs, (list, tuple)) or not isinstance(ys, (list, tuple)):
+                raise ValueError('The coordinates must be sequences of numbers.')
+            if len(xs) != len(ys):
+                raise ValueError('xs and ys must be sequences of the same length.')
+            if not all(isinstance(v, (int,float)) for v in list(xs)+list(ys)):
+                raise ValueError('The coordinates must be sequences of numbers.')
+            px = [round(screen._convertx(x), 3) for x in xs]
+            py = [round(screen._converty(y), 3) for y in ys]
+        if len(px):
+            self._moveAlong(px, py)
+            screen._updateDrawing(turtle=self)
+
+    # Helper function that moves the turtle through the pixel positions xs, ys in one step,
+    # drawing a polyline if the pen is down and adding the points to the fill path when filling.
+    def _moveAlong(self, xs, ys):
+        n = len(xs)
+        if np is not None and isinstance(xs, np.ndarray):
+            points = np.empty(2*n)
+            points[0::2], points[1::2] = xs, ys
+            if self.is_filling:
+                fill = np.zeros(3*n)
+                fill[1::3], fill[2::3] = xs, ys
+                self.fill_path.frombytes(memoryview(fill).cast("B"))
+        else:
+            points = array('d', [v for xy in zip(xs, ys) for v in xy])
+            if self.is_filling:
+                self.fill_path.extend([v for xy in zip(xs, ys) for v in (0,) + xy])
+        if self.is_pen_down:
+            self.line_store.addPolyline(self.screen._strokeStyle(self), self.turtle_pos[0], self.turtle_pos[1], points)
+        self.turtle_pos = (float(points[-2]), float(points[-1]))
+
     # jump to a point without drawing or animation
     def jumpto(self,x,y=None):
         """Jumps to a specified point without drawing/animation
@@ -1260,7 +3399,7 @@ class RawTurtle:
         else: # mode = "svg"
             new_degree = deg % 360
         alpha = (new_degree - self.turtle_degree) % 360
-        if self.turtle_speed !=0 and self.animate:
+        if self.screen._animating(self):
             if alpha <= 180:
                 if self.angle_mode == "degrees":
                     self.right(alpha)
@@ -1362,8 +3501,12 @@ class RawTurtle:
     
         speed = 0 displays final image with no animation. Need to
         call done() at the end so the final image is displayed.
+        Inside batch() the image is displayed when the block ends.
         """
-        self.screen.drawing_window.update(HTML(self.screen._generateSvgDrawing()))  
+        if self.screen._batch_depth:
+            self.screen._frame_pending = True
+            return
+        self.screen._pushDrawing(full=True)
     update = done #alias        
 
     #=======================
@@ -1394,32 +3537,25 @@ class RawTurtle:
         even if the stamp is originally drawn on top of that object during 
         the animation. To prevent this, set layer=1 or any nonzero number.
        """
+        self.line_store.seal()
         self.stampnum += 1
-        self.stamplist.append(self.stampnum)
         if layer != 0:
-            self.stampdictT[self.stampnum] = self.screen._generateTurtlesSvgDrawing()
-            self.svg_stampsT_string += self.stampdictT[self.stampnum]
+            store = self.stampsT
+            shapes = [self.screen._turtleShape(turtle) for turtle in self.screen._turtles]
         else:
-            self.stampdictB[self.stampnum] = self.screen._generateOneSvgTurtle(turtle=self)
-            self.svg_stampsB_string += self.stampdictB[self.stampnum]
+            store = self.stampsB
+            shapes = [self.screen._turtleShape(self)]
+        store.add(self.stampnum, shapes)
+        self.stamp_layer[self.stampnum] = store
         self.screen._updateDrawing(turtle=self, delay=False)
         return self.stampnum
 
-    # Helper function to do the work for clearstamp() and clearstamps()
-    def _clearstamp(self, stampid):
-        tmp = ""
-        if stampid in self.stampdictB.keys():
-            self.stampdictB.pop(stampid)
-            self.stamplist.remove(stampid)
-            for n in self.stampdictB:
-                tmp += self.stampdictB[n]
-            self.svg_stampsB_string = tmp        
-        elif stampid in self.stampdictT.keys():
-            self.stampdictT.pop(stampid)
-            self.stamplist.remove(stampid)
-            for n in self.stampdictT:
-                tmp += self.stampdictT[n]
-            self.svg_stampsT_string = tmp
+    # Helper function to do the work for clearstamp() and clearstamps(). The drawing is updated once for all the stamps.
+    def _clearstamps(self, stampids):
+        for stampid in stampids:
+            store = self.stamp_layer.pop(stampid, None)
+            if store is not None:
+                store.remove(stampid)
         self.screen._updateDrawing(turtle=self, delay=False)
 
     # Delete stamp with given stampid.
@@ -1431,13 +3567,12 @@ class RawTurtle:
             stampid - an integer, must be return value of previous stamp() call.
         """
         if isinstance(stampid,tuple):
-            for subitem in stampid:
-                self._clearstamp(subitem)
+            self._clearstamps(stampid)
         else:
-            self._clearstamp(stampid)
+            self._clearstamps((stampid,))
 
     # Delete all or first/last n of turtle’s stamps. If n is None, delete all stamps, if n > 0 delete first n stamps,
-    # else if n < 0 delete last n stamps.
+    # else if n < 0 delete last n stamps. Only the stamps deleted are visited.
     def clearstamps(self, n=None):
         """Deletes all or first/last n of turtle's stamps.
 
@@ -1449,13 +3584,14 @@ class RawTurtle:
         If n < 0, deletes the last n stamps.
         """
         if n is None:
-            toDelete = self.stamplist[:]
+            self.stampsB.clear()
+            self.stampsT.clear()
+            self.stamp_layer = {}
+            self.screen._updateDrawing(turtle=self, delay=False)
         elif n > 0:
-            toDelete = self.stamplist[:n]
+            self._clearstamps(list(itertools.islice(self.stamp_layer, n)))
         elif n < 0:
-            toDelete = self.stamplist[n:]
-        for k in toDelete:
-            self._clearstamp(k)
+            self._clearstamps(list(itertools.islice(reversed(self.stamp_layer), -n)))
 
     #====================================
     # Turtle Motion - Tell Turtle's State
@@ -1622,6 +3758,7 @@ class RawTurtle:
         Aliases: penup | pu | up
         """
         self.is_pen_down = False
+        self.line_store.seal()
     pu = penup # alias
     up = penup # alias
 
@@ -1702,6 +3839,7 @@ class RawTurtle:
             self.is_turtle_visible = p["shown"]
         if "pendown" in p:
             self.is_pen_down = p["pendown"]
+            if not self.is_pen_down: self.line_store.seal()
         if "pencolor" in p:
             self.pen_color = self._processColor(p["pencolor"])
         if "fillcolor" in p:
@@ -1856,10 +3994,10 @@ class RawTurtle:
 
         return self.is_filling
 
-    # Initialize the string for the svg path of the filled shape.
+    # Initialize the svg path of the filled shape.
     # Modified from aronma/ColabTurtle_2 github repo
-    # The current _svg_lines_string is stored to be used when the fill is finished because the svg_fill_string will include
-    # the svg code for the path generated between the begin and end fill commands.
+    # The number of lines drawn so far is marked because the lines drawn between the begin and end fill
+    # commands are replaced by the filled path when the fill is finished.
     # When calling begin_fill, a value for the _fill_rule can be given that will apply only to that fill.
     def begin_fill(self, rule=None, opacity=None):
         """Called just before drawing a shape to be filled.
@@ -1886,19 +4024,17 @@ class RawTurtle:
         if (opacity < 0) or (opacity > 1):
             raise ValueError("The fill-opacity should be between 0 and 1.")
         if not self.is_filling:
-            self.svg_lines_string_temp = self.svg_lines_string
-            self.svg_fill_string = """<path fill-rule="{rule}" fill-opacity="{opacity}" d="M {x1} {y1} """.format(
-                x1=self.turtle_pos[0],
-                y1=self.turtle_pos[1],
-                rule=rule,
-                opacity = opacity)
+            self.line_store.seal()
+            self.fill_mark = len(self.line_store)
+            self.fill_path = array('d', self.turtle_pos)
+            self.fill_style = (rule, opacity)
             self.is_filling = True
 
-    # Terminate the string for the svg path of the filled shape
+    # Terminate the svg path of the filled shape
     # Modified from aronma/ColabTurtle_2 github repo
-    # The original _svg_lines_string was previously stored to be used when the fill is finished because the svg_fill_string will include
-    # the svg code for the path generated between the begin and end fill commands.
-    # the svg code for the path generated between the begin and end fill commands.
+    # The lines drawn since begin_fill are replaced by the filled path, which is stroked with the pen color
+    # if the pen is down. The fill is one record of the line store, its path and a style index, so closing
+    # it only costs the vertices of the path, however much was drawn before. A fill without any move adds nothing.
     def end_fill(self):
         """Fill the shape drawn after the call begin_fill()."""
 
@@ -1908,11 +4044,10 @@ class RawTurtle:
                 bddry = self.pen_color
             else:
                 bddry = 'none'
-            self.svg_fill_string += """" stroke-linecap="round" style="stroke:{pen};stroke-width:{size}" fill="{fillcolor}" />""".format(
-                    fillcolor=self.fill_color,
-                    pen = bddry,
-                    size = self.pen_width)
-            self.svg_lines_string = self.svg_lines_string_temp + self.svg_fill_string 
+            style = self.screen._styleIndex("fill", self.fill_style[0], self.fill_style[1], bddry, self.pen_width, self.fill_color)
+            self.line_store.truncate(self.fill_mark)
+            if len(self.fill_path) > 2:
+                self.line_store.add(_FILL, style, self.fill_path)
             self.screen._updateDrawing(turtle=self, delay=False)         
 
     # Allow user to set the svg fill-rule. Options are only 'nonzero' or 'evenodd'. If no argument, return current fill-rule.
@@ -1969,15 +4104,13 @@ class RawTurtle:
         self.shear_factor = DEFAULT_SHEARFACTOR
         self.tilt_angle = DEFAULT_TILT_ANGLE
         self.outline_width = DEFAULT_OUTLINE_WIDTH
-        self.svg_lines_string = ""
-        self.svg_fill_string = ""
-        self.svg_dots_string = ""
-        self.svg_stampsB_string = ""
-        self.svg_stampsT_string = ""
-        self.stampdictB = {}
-        self.stampdictT = {}
+        self.line_store.clear()
+        self.svg_overlay_string = ""
+        self.dot_store.clear()
+        self.stampsB.clear()
+        self.stampsT.clear()
+        self.stamp_layer = {}
         self.stampnum = 0
-        self.stamplist = []
         self.turtle_degree = DEFAULT_TURTLE_DEGREE if (self.screen._mode in ["standard","world"]) else (270 - DEFAULT_TURTLE_DEGREE)
         self.turtle_orient = self.turtle_degree
         if self.screen._mode != "world":
@@ -1996,15 +4129,13 @@ class RawTurtle:
         State and position of the turtle as well as drawings of other
         turtles are not affected.
         """
-        self.svg_lines_string = ""
-        self.svg_fill_string = ""
-        self.svg_dots_string = ""
-        self.svg_stampsB_string = ""
-        self.svg_stampsT_string = ""
-        self.stampdictB = {}
-        self.stampdictT = {}
+        self.line_store.clear()
+        self.svg_overlay_string = ""
+        self.dot_store.clear()
+        self.stampsB.clear()
+        self.stampsT.clear()
+        self.stamp_layer = {}
         self.stampnum = 0
-        self.stamplist=[]
         self.is_filling = False
         self.screen._updateDrawing(turtle=self, delay=False) 
 
@@ -2063,13 +4194,8 @@ class RawTurtle:
         elif font_type == 'underline':
             style_string += "text-decoration: underline;"
             
-        self.svg_lines_string += """<text x="{x}" y="{y}" fill="{strcolor}" text-anchor="{align}" style="{style}">{text}</text>""".format(
-            x=self.turtle_pos[0], 
-            y=self.turtle_pos[1], 
-            text=text, 
-            strcolor=self.pen_color, 
-            align=align, 
-            style=style_string)
+        self.line_store.addText(self.screen._styleIndex("text", self.pen_color, align, style_string), 
+                                self.turtle_pos[0], self.turtle_pos[1], text)
         
         self.screen._updateDrawing(turtle=self)        
 
@@ -2234,7 +4360,7 @@ class RawTurtle:
         """
         if angle == None:
             return self.tilt_angle
-        if self.turtle_speed != 0 and self.animate: 
+        if self.screen._animating(self): 
             turtle_degree_temp = self.turtle_degree
             if self.screen._mode in ["standard","world"]:
                 self.left(-(self.tilt_angle-angle*self.angle_conv))
@@ -2256,7 +4382,7 @@ class RawTurtle:
         Rotates the turtle shape by angle from its current tilt-angle,
         but does NOT change the turtle's heading (direction of movement).
         """
-        if self.turtle_speed != 0 and self.animate and self.screen._mode != "world":
+        if self.screen._animating(self) and self.screen._mode != "world":
             turtle_degree_temp = self.turtle_degree
             if self.screen._mode == "standard":
                 self.left(angle*self.angle_conv)
@@ -2283,9 +4409,20 @@ class RawTurtle:
    
        Args:
        delay_time: positive number giving time in seconds
+
+       Inside batch() nothing is shown, so there is no delay.
        """
 
-       time.sleep(delay_time)
+       screen = self.screen
+       if screen._batch_depth:
+           return
+       if screen._playing() and screen._tracer:
+           screen._queueStep(duration=delay_time)
+       elif screen.backend.realtime or screen._scheduling:
+           # a frame held back by the frame rate is shown before waiting
+           if screen._frame_pending and not screen._scheduling and screen._tracer:
+               screen._pushDrawing()
+           _sleep(delay_time)
 
     # Turn off animation. Forward/back/circle makes turtle jump and likewise left/right make the turtle turn instantly.
     def animationOff(self):
@@ -2303,7 +4440,7 @@ class RawTurtle:
 
     def clone(self):
         screen = self.screen
-        cloneTurtle = Turtle()
+        cloneTurtle = Turtle() if screen is Turtle._screen else RawTurtle(screen)
         cloneTurtle.ht()        
         x,y = self.position()
         cloneTurtle.turtle_pos = screen._convertx(x),screen._converty(y)        
@@ -2317,7 +4454,7 @@ class RawTurtle:
         
     # Used to validate a color string
     def _validateColorString(self,color):
-        return self.screen._validadeColorString(color)
+        return self.screen._validateColorString(color)
 
     # Used to validate if a 3 tuple of integers is a valid RGB color
     def _validateColorTuple(self, color):
@@ -2372,23 +4509,162 @@ def getcolor(n):
         raise ValueError("color index must be an integer between 0 and 139")
     n = int(round(n))
     if (n < 0) or (n > 139):
-        raise valueError("color index must be an integer between 0 and 139")
+        raise ValueError("color index must be an integer between 0 and 139")
     return VALID_COLORS[n]
 
+# Two hex digits for each value of a color channel
+_HEX_DIGITS = ["{:02x}".format(v) for v in range(256)]
+
+# Helper function for the (r,g,b) values of an rgb color code, or None if it is not one
+def _rgbColor(color):
+    match = RGB_COLOR_PATTERN.match(color)
+    if match is None:
+        return None
+    rgb = tuple(int(v) for v in match.groups())
+    return rgb if max(rgb) <= 255 else None
+
+# Helper function that returns the normalized form of a color: a lowercase color name, or #rrggbb for
+# hex and rgb color codes and for tuples of three integers in [0,255]. Raises ValueError if the color is 
+# invalid. The results for the last COLOR_CACHE_SIZE colors are kept, so repeated colors cost a lookup.
+# The types of the values of a tuple are checked first, since (255.0,0,0) would find the result for (255,0,0).
+def _normalizeColor(color):
+    if not isinstance(color, str) and (len(color) != 3 or not all(isinstance(v, int) for v in color)):
+        raise ValueError('Color tuple {} is invalid. It must be a tuple of three integers, which are in the interval [0,255]'.format(color))
+    return _cachedColor(color)
+
+@functools.lru_cache(maxsize=COLOR_CACHE_SIZE)
+def _cachedColor(color):
+    if isinstance(color, str):
+        if color == "": color = "none"
+        color = color.lower().strip()
+        if 'rgb' not in color: color = color.replace(" ","")
+        if color in VALID_COLORS_SET: # 140 predefined html color names
+            return color
+        if HEX_COLOR_PATTERN.match(color):
+            if len(color) == 4:
+                color = "#" + color[1]*2 + color[2]*2 + color[3]*2
+            return color
+        rgb = _rgbColor(color)
+        if rgb is None:
+            raise ValueError('Color ' + color + ' is invalid. It can be a known html color name, 3-6 digit hex string, or rgb string.')
+    else:
+        rgb = color
+        if not all(0 <= v <= 255 for v in rgb):
+            raise ValueError('Color tuple {} is invalid. It must be a tuple of three integers, which are in the interval [0,255]'.format(color))
+    return "#" + _HEX_DIGITS[rgb[0]] + _HEX_DIGITS[rgb[1]] + _HEX_DIGITS[rgb[2]]
+
+# Get normalized color strings for many colors at once
+def getcolors(colors):
+    """Returns the normalized color strings for a sequence of colors.
+
+    Args:
+        colors: a sequence of colors, each a color string or an (r,g,b) 
+            tuple or list of integers in [0,255], or a NumPy array with 
+            one row of r,g,b values per color
 
-_tg_screen_functions = ['bgcolor', 'clearscreen', 'drawline', 'hideborder', 
-         'initializescreen','initializeTurtle', 'showSVG', 'saveSVG',  'line',  'mode', 'resetscreen',  'setup', 
-         'setworldcoordinates', 'showborder', 'turtles',  'window_width', 'window_height' ]
+    Returns:
+        list: a color string for each color, a color name or "#rrggbb"
+
+    The rows of an integer array hold values in [0,255] and the rows of 
+    a float array values in [0,1]. Arrays are converted all at once.
+    """
+    if np is not None and isinstance(colors, np.ndarray):
+        if colors.ndim != 2 or colors.shape[1] != 3:
+            raise ValueError("An array of colors must have one row of three values per color.")
+        if colors.dtype.kind == "f":
+            if colors.size and (colors.min() < 0 or colors.max() > 1):
+                raise ValueError("Float color values must be in the interval [0,1].")
+            colors = np.rint(colors*255)
+        elif colors.dtype.kind not in "iu":
+            raise ValueError("An array of colors must hold integers or floats.")
+        elif colors.size and (colors.min() < 0 or colors.max() > 255):
+            raise ValueError("Integer color values must be in the interval [0,255].")
+        hexdigits = _HEX_DIGITS
+        return ["#" + hexdigits[r] + hexdigits[g] + hexdigits[b] for r, g, b in colors.astype(int).tolist()]
+    if isinstance(colors, str):
+        raise ValueError("Colors must be given as a sequence of colors.")
+    normalized = []
+    for color in colors:
+        if isinstance(color, list):
+            color = tuple(color)
+        elif not isinstance(color, (str, tuple)):
+            raise ValueError('The color {} must be a color string, or a tuple or list of three integers'.format(color))
+        normalized.append(_normalizeColor(color))
+    return normalized
+
+# Colors at evenly spaced points of the colormaps of matplotlib that have been used
+_matplotlib_colormaps = {}
+
+# Helper function for the colors at evenly spaced points of a colormap
+def _colormapPoints(name):
+    points = COLORMAPS.get(name)
+    if points is None:
+        points = _matplotlib_colormaps.get(name)
+    if points is None:
+        try:
+            import matplotlib
+            cmap = matplotlib.colormaps[name]
+        except (ImportError, KeyError):
+            raise ValueError("Unknown colormap {}. Valid options are: {}".format(name, sorted(COLORMAPS)))
+        points = _matplotlib_colormaps[name] = [tuple(int(round(255*c)) for c in cmap(i/255)[:3]) for i in range(256)]
+    return points
+
+# Get the colors of a colormap for numbers
+def colormap(name, values, vmin=0, vmax=1):
+    """Returns the colors of a colormap for a number or a sequence of numbers.
+
+    Args:
+        name: the name of the colormap, one of 'gray', 'hot', 'rainbow' and
+            'viridis', or the name of a matplotlib colormap if matplotlib 
+            is installed
+        values: a number, or a sequence or NumPy array of numbers
+        vmin: (optional) the number for the first color of the colormap
+        vmax: (optional) the number for the last color of the colormap
+
+    Returns:
+        a color string "#rrggbb" for a number, or a list of them
+
+    Numbers outside [vmin,vmax] get the first or last color.
+
+    Example:
+        for i in range(100):
+            pencolor(colormap("viridis", i, 0, 99))
+            forward(5)
+            left(10)
+    """
+    if vmax == vmin:
+        raise ValueError("vmin and vmax must be different.")
+    points = _colormapPoints(name)
+    last = len(points) - 1
+    try:
+        iter(values)
+    except TypeError:
+        t = min(max((values - vmin)/(vmax - vmin), 0), 1)*last
+        i = min(int(t), last - 1)
+        f = t - i
+        return _normalizeColor(tuple([int(round(a + (b - a)*f)) for a, b in zip(points[i], points[i+1])]))
+    if np is not None:
+        t = np.clip((np.asarray(values, dtype=float).ravel() - vmin)/(vmax - vmin), 0, 1)*last
+        i = np.minimum(t.astype(int), last - 1)
+        f = (t - i)[:, None]
+        table = np.array(points, dtype=float)
+        return getcolors(np.rint(table[i]*(1 - f) + table[i+1]*f).astype(int))
+    return [colormap(name, v, vmin, vmax) for v in values]
+
+
+_tg_screen_functions = ['batch', 'bgcolor', 'cachestats', 'clearscreen', 'culling', 'deltamode', 'drawline', 'find_items', 'framerate', 'hideborder', 
+         'initializescreen','initializeTurtle', 'journal', 'journaling', 'replay', 'showSVG', 'saveSVG',  'line',  'mode', 'nearest', 'playback', 'precision', 'resetscreen',  'setup', 
+         'setworldcoordinates', 'showborder', 'simplify', 'together', 'tracer', 'turtles',  'window_width', 'window_height' ]
 
 _tg_turtle_functions = ['animationOff', 'animationOn', 'bk', 'back', 'backward', 'begin_fill',
        'circle', 'clear', 'clearstamp', 'clearstamps', 'color', 'degrees', 'delay', 'distance', 'done',  
        'dot', 'down', 'end_fill', 'face', 'fd', 'fillcolor', 'filling', 'fillopacity', 'fillrule', 'forward',  
        'getheading', 'getx', 'gety', 'goto', 'heading', 'hideturtle', 'home', 'ht', 'isdown',
-       'isvisible', 'jumpto', 'left', 'lt', 'pd', 'pen', 'pencolor', 'pensize', 'pendown', 'penup', 'pos', 
+       'isvisible', 'jumpto', 'left', 'lt', 'path', 'pd', 'pen', 'pencolor', 'pensize', 'pendown', 'penup', 'pos', 
        'position',  'pu', 'radians', 'regularPolygon', 'reset', 'right', 'rt',  'setheading', 'seth',  
        'setpos', 'setposition', 'settiltangle', 'setx','sety', 'shape', 'shapesize', 'shearfactor',  
        'showturtle', 'speed', 'st', 'stamp', 'tilt', 'tiltangle', 'turtlesize', 'towards', 'up', 'update',  
-       'width', 'write', 'xcor', 'ycor' ]
+       'walk', 'width', 'write', 'xcor', 'ycor' ]
 
 def _getmethparlist(ob):
     """Get strings describing the arguments for the given object
@@ -2469,5 +4745,94 @@ _make_global_funcs(_tg_turtle_functions, Turtle, 'Turtle._pen', 'Turtle()',_turt
 
 _make_global_funcs(_tg_screen_functions, _Screen, 'Turtle._screen', 'Screen()',_screen_docrevise)
 
-
-
+# Functions that only return information are not kept in the journal, nor are the functions in
+# _tg_journal_getters when called without arguments, since they then return a setting, nor is journaling().
+_tg_journal_queries = {'batch', 'cachestats', 'distance', 'filling', 'find_items', 'getheading', 'getx', 'gety', 'heading',
+        'isdown', 'isvisible', 'journal', 'journaling', 'nearest', 'pos', 'position', 'replay', 'saveSVG', 'showSVG', 'together', 'towards', 
+        'turtles', 'window_height', 'window_width', 'xcor', 'ycor'}
+_tg_journal_getters = {'bgcolor', 'color', 'culling', 'deltamode', 'fillcolor', 'fillopacity', 'fillrule', 'framerate', 
+        'mode', 'pen', 'pencolor', 'playback', 'precision', 'pensize', 'shape', 'shapesize', 'shearfactor', 'speed', 'tiltangle', 
+        'simplify', 'tracer', 'turtlesize', 'width'}
+
+# Helper function for an argument as kept in the journal. Lists and arrays are copied, so that
+# changing them after the call does not change what replay() draws.
+def _journalValue(value):
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, array):
+        return array(value.typecode, value)
+    if np is not None and isinstance(value, np.ndarray):
+        return value.copy()
+    return value
+
+# Helper function that wraps a public method so that its calls are kept in the journal of the screen
+# while journaling is on. Only the calls made by the user are kept, not the calls that the methods 
+# make to each other.
+# Inside together(), the calls made to turtles are queued instead, and kept when they are run.
+def _journaled(name, method):
+    def wrapper(self, *args, **kwargs):
+        screen = self if isinstance(self, _Screen) else self.screen
+        if screen._journal_depth:
+            return method(self, *args, **kwargs)
+        if (screen._together is not None and self is not screen and name not in _tg_journal_queries 
+                and (args or kwargs or name not in _tg_journal_getters)):
+            screen._together.setdefault(self, []).append((getattr(self, name), args, kwargs))
+            return None
+        screen._journal_depth += 1
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            screen._journal_depth -= 1
+        if screen._journaling and name not in _tg_journal_queries and (args or kwargs or name not in _tg_journal_getters):
+            screen._journal.append((None if self is screen else self._tid, name, tuple(_journalValue(v) for v in args), 
+                                    {k: _journalValue(v) for k, v in kwargs.items()} or None))
+        return result
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    wrapper.__wrapped__ = method
+    return wrapper
+
+# The public methods with their wrappers, as (class, name, method, wrapper). The wrappers are only installed
+# while a screen is journaling or a together() block is open, so otherwise calls go straight to the methods.
+_journal_wrappers = []
+_journal_users = 0
+
+for _cls in (_Screen, RawTurtle):
+    for _name, _method in list(vars(_cls).items()):
+        if not _name.startswith("_") and inspect.isfunction(_method):
+            _journal_wrappers.append((_cls, _name, _method, _journaled(_name, _method)))
+
+# Helper function that counts the screens journaling and the together() blocks open, change=1 for one
+# that starts and -1 for one that ends, and installs the wrappers while the count is above 0
+def _useJournalWrappers(change):
+    global _journal_users
+    wrapped = _journal_users > 0
+    _journal_users += change
+    if (_journal_users > 0) != wrapped:
+        for cls, name, method, wrapper in _journal_wrappers:
+            setattr(cls, name, wrapper if _journal_users > 0 else method)
+
+# Turtle methods that have an awaitable counterpart, named with an "a" in front, e.g. await t.aforward(100)
+_tg_async_functions = ['back', 'backward', 'bk', 'circle', 'delay', 'dot', 'fd', 'forward', 'goto', 'home', 'left', 'lt',
+        'path', 'regularPolygon', 'right', 'rt', 'setheading', 'seth', 'setpos', 'setposition', 'setx', 'sety', 'stamp', 
+        'walk', 'write']
+
+# Helper function for the awaitable counterpart of a turtle method, see _AsyncCall
+def _asyncMethod(name):
+    async def method(self, *args, **kwargs):
+        return await _AsyncCall(self.screen, getattr(self, name), args, kwargs).run()
+    method.__name__ = "a" + name
+    method.__doc__ = """Awaitable counterpart of {0}().
+
+        Example:
+        >>> await t.a{0}(...)
+
+        Does the same as {0}(), but while the turtle waits between the 
+        frames of its animation, other coroutines run, so several turtles
+        can be animated at the same time with asyncio.gather, and the 
+        notebook is not blocked by an animation run as a task. 
+        """.format(name)
+    return method
+
+for _name in _tg_async_functions:
+    setattr(RawTurtle, "a" + _name, _asyncMethod(_name))
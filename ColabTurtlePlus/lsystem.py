@@ -0,0 +1,218 @@
+"""
+L-systems for ColabTurtlePlus.
+
+An L-system is given by an axiom and rewriting rules. Its expansion is
+produced as a stream of chunks of symbols, so deep derivations never build
+the whole string, and the expansions of each (symbol, depth) are kept and
+shared by all L-systems with the same rules. The symbols are interpreted
+with a tight loop that computes the geometry directly and adds it to the
+drawing of a turtle in a few bulk moves.
+
+Example:
+>>> from ColabTurtlePlus.Turtle import *
+>>> from ColabTurtlePlus.lsystem import LSystem
+>>> dragon = LSystem("FX", ["X -> X+YF+", "Y -> -FX-Y"], angle=90)
+>>> t = Turtle()
+>>> dragon.draw(t, 12, 5)
+"""
+
+import math
+
+# Expansions are kept as strings up to this length, longer ones only by their length
+# and produced as chunks of about this many symbols.
+CHUNK_SIZE = 4096
+
+# Expansions shared by all L-systems with the same rules: rules -> {(symbol, depth): (length, string or None)}
+_derivations = {}
+
+def clearCache():
+    """Forgets the expansions kept for all L-systems."""
+    _derivations.clear()
+
+# Helper function that returns the rules as a dict of symbol -> replacement.
+# Rules can be given as a dict or as strings "X -> replacement". Spaces are ignored.
+def _parseRules(rules):
+    if isinstance(rules, dict):
+        items = rules.items()
+    else:
+        items = []
+        for rule in rules:
+            if not isinstance(rule, str) or "->" not in rule:
+                raise ValueError('Rules must be strings of the form "X -> replacement".')
+            items.append(rule.split("->", 1))
+    parsed = {}
+    for key, value in items:
+        key, value = "".join(key.split()), "".join(value.split())
+        if len(key) != 1:
+            raise ValueError('A rule must replace a single symbol, not "{}".'.format(key))
+        parsed[key] = value
+    return parsed
+
+class LSystem:
+    """An L-system given by an axiom, rewriting rules and a turning angle.
+
+    Args:
+        axiom: a string, the initial symbols
+        rules: a dict of symbol -> replacement, or a list of strings of
+            the form "X -> replacement"
+        angle: (optional) a number, the default turning angle for draw
+    """
+    def __init__(self, axiom, rules, angle=90):
+        self.axiom = "".join(axiom.split())
+        self.rules = _parseRules(rules)
+        self.angle = angle
+        self._memo = _derivations.setdefault(tuple(sorted(self.rules.items())), {})
+
+    # Helper function that returns (length, string) for the expansion of a symbol after depth steps.
+    # The string is None when the expansion is longer than CHUNK_SIZE.
+    def _derive(self, symbol, depth):
+        entry = self._memo.get((symbol, depth))
+        if entry is None:
+            rule = self.rules.get(symbol)
+            if depth == 0 or rule is None:
+                entry = (1, symbol)
+            else:
+                parts = [self._derive(s, depth-1) for s in rule]
+                n = sum(part[0] for part in parts)
+                entry = (n, "".join(part[1] for part in parts) if n <= CHUNK_SIZE else None)
+            self._memo[(symbol, depth)] = entry
+        return entry
+
+    # Helper function that yields the expansion of the symbols after depth steps as chunks.
+    # Short expansions are joined so that chunks hold about CHUNK_SIZE symbols.
+    def _chunks(self, symbols, depth):
+        buffer = []
+        size = 0
+        for symbol in symbols:
+            n, s = self._derive(symbol, depth)
+            if s is None:
+                if buffer:
+                    yield "".join(buffer)
+                    buffer, size = [], 0
+                yield from self._chunks(self.rules[symbol], depth-1)
+            else:
+                buffer.append(s)
+                size += n
+                if size >= CHUNK_SIZE:
+                    yield "".join(buffer)
+                    buffer, size = [], 0
+        if buffer:
+            yield "".join(buffer)
+
+    def expand(self, depth):
+        """Yields the symbols after depth rewriting steps, in chunks.
+
+        Args:
+            depth: a nonnegative integer, the number of rewriting steps
+
+        Each chunk is a string of at most a few thousand symbols, so the
+        expansion can be read without building the whole string.
+        """
+        if not isinstance(depth, int) or depth < 0:
+            raise ValueError("The depth must be a nonnegative integer.")
+        return self._chunks(self.axiom, depth)
+
+    def length(self, depth):
+        """Returns the number of symbols after depth rewriting steps."""
+        return sum(self._derive(symbol, depth)[0] for symbol in self.axiom)
+
+    def derivation(self, depth):
+        """Returns the symbols after depth rewriting steps as one string."""
+        return "".join(self.expand(depth))
+
+    def draw(self, turtle, depth, length, angle=None, draw="FGRL", move="f", actions=None):
+        """Draws the L-system with a turtle.
+
+        Args:
+            turtle: the turtle that draws
+            depth: a nonnegative integer, the number of rewriting steps
+            length: a number, the distance moved by each step
+            angle: (optional) a number, the turning angle, default the
+                angle of the L-system
+            draw: (optional) the symbols that move forward drawing a line
+            move: (optional) the symbols that move forward without drawing
+            actions: (optional) a dict of symbol -> function, the function
+                is called with the turtle when the symbol is read
+
+        "+" turns left and "-" turns right by the angle, "|" turns around,
+        "[" saves the position and heading of the turtle and "]" jumps back
+        to the last ones saved. Other symbols are ignored. The drawing
+        starts at the turtle's position and heading, uses its pen and fill
+        and is shown at once, without animation.
+        """
+        if angle is None:
+            angle = self.angle
+        if not isinstance(length, (int,float)) or not isinstance(angle, (int,float)):
+            raise ValueError("The length and the angle must be numbers.")
+        screen = turtle.screen
+        actions = actions or {}
+        draw, move = set(draw), set(move)
+        step = angle*turtle.angle_conv
+        # world y of a step along heading a (clockwise degrees in the drawing window)
+        sign = -abs(screen.yscale)/screen.yscale
+        trig = {}
+        stack = []
+        xs, ys = [], []
+        pendown = turtle.isdown()
+        drawing = True
+
+        # Moves the turtle along the points of the current run. The lists are given away,
+        # since the journal keeps them, and new ones are started.
+        def flush():
+            nonlocal xs, ys
+            if xs:
+                if drawing or not pendown:
+                    turtle.path(xs, ys)
+                else:
+                    turtle.penup()
+                    turtle.path(xs, ys)
+                    turtle.pendown()
+                xs, ys = [], []
+
+        # Turns the turtle to heading a
+        def turn():
+            turtle.left((turtle.turtle_degree - a)/turtle.angle_conv)
+
+        with screen.batch():
+            x, y = turtle.position()
+            a = turtle.turtle_degree
+            for chunk in self.expand(depth):
+                for c in chunk:
+                    if c in draw or c in move:
+                        if (c in draw) != drawing:
+                            flush()
+                            drawing = not drawing
+                        dxy = trig.get(a)
+                        if dxy is None:
+                            alpha = math.radians(a)
+                            dxy = trig[a] = (length*math.cos(alpha), length*sign*math.sin(alpha))
+                        x += dxy[0]
+                        y += dxy[1]
+                        xs.append(x)
+                        ys.append(y)
+                    elif c == "+":
+                        a = round((a - step) % 360, 9)
+                    elif c == "-":
+                        a = round((a + step) % 360, 9)
+                    elif c == "|":
+                        a = round((a + 180) % 360, 9)
+                    elif c == "[":
+                        stack.append((x, y, a))
+                    elif c == "]":
+                        if not stack:
+                            raise ValueError('"]" without matching "[".')
+                        x, y, a = stack.pop()
+                        if drawing:
+                            flush()
+                            drawing = False
+                        xs.append(x)
+                        ys.append(y)
+                    elif c in actions:
+                        flush()
+                        turn()
+                        actions[c](turtle)
+                        x, y = turtle.position()
+                        a = turtle.turtle_degree
+                        pendown = turtle.isdown()
+            flush()
+            turn()
@@ -0,0 +1,137 @@
+"""Shared helpers for the ColabTurtlePlus tests.
+
+RecordingBackend records what would be sent to the drawing window, and
+DrawingWindow rebuilds the drawing from the delta updates as the javascript
+receiver does, so a test can check that the window shows what a whole frame
+would show.
+"""
+
+import json
+import re
+import time
+
+import pytest
+
+import ColabTurtlePlus.Turtle as T
+
+
+class DrawingWindow:
+    """The groups of the drawing as shown by the drawing window, rebuilt from the updates."""
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.groups = {}
+
+    # A whole frame shows every group as it is now
+    def frame(self):
+        s = self.screen
+        for gid, item in s._generateSvgGroups():
+            if isinstance(item, T._GeometryStore):
+                start, chunks = 0, []
+                for end in item.fullChunkEnds():
+                    chunks.append(item.markup(s._styles, start, end, precision=s._precision, view=s._cullView(), lod=s._lod or None))
+                    start = end
+                self.groups[gid] = chunks
+            elif isinstance(item, T._StampStore):
+                self.groups[gid] = item.markup(gid + "-")
+            else:
+                self.groups[gid] = item
+
+    def apply(self, js):
+        m = re.match(r'ColabTurtlePlus.apply\((".*?"),(.*)\);$', js, re.S)
+        assert m, js
+        for op in json.loads(m.group(2)):
+            kind, gid = op[0], op[1]
+            if kind == "s":
+                self.groups[gid] = op[2]
+            elif kind == "a":
+                self.groups[gid] += op[2]
+            elif kind == "c":
+                del self.groups[gid][op[2]:]
+                if op[3]:
+                    assert op[3].startswith("<g>") and op[3].endswith("</g>")
+                    self.groups[gid].append(op[3][3:-4])
+            elif kind == "e":
+                last = self.groups[gid][-1]
+                i = last.rindex(' d="')
+                j = last.index('"', i + 4)
+                self.groups[gid][-1] = last[:j] + op[2] + last[j:]
+            elif kind == "r":
+                for g, v in self.groups.items():
+                    start = '<g id="{}">'.format(gid)
+                    if isinstance(v, str) and start in v:
+                        i = v.index(start)
+                        j, depth = i + 1, 1
+                        while depth:
+                            a, b = v.find("<g", j), v.find("</g>", j)
+                            if a != -1 and a < b:
+                                depth, j = depth + 1, a + 2
+                            else:
+                                depth, j = depth - 1, b + 4
+                        self.groups[g] = v[:i] + v[j:]
+                        break
+                else:
+                    raise AssertionError("missing " + gid)
+            else:
+                raise AssertionError("unknown op " + kind)
+
+    # The markup of a group as the window shows it
+    def markup(self, gid):
+        v = self.groups[gid]
+        return "".join(v) if isinstance(v, list) else v
+
+    # Checks that the window shows what a whole frame would show now
+    def check(self):
+        s = self.screen
+        for gid, item in s._generateSvgGroups():
+            if isinstance(item, T._GeometryStore):
+                expected = item.markup(s._styles, precision=s._precision, view=s._cullView(), lod=s._lod or None)
+            elif isinstance(item, T._StampStore):
+                expected = item.markup(gid + "-")
+            else:
+                expected = item
+            assert self.markup(gid) == expected, gid
+
+
+class RecordingBackend(T._CaptureBackend):
+    """A capture backend that also keeps a model of the drawing window up to date."""
+
+    def __init__(self, realtime=False):
+        super().__init__()
+        self.realtime = realtime
+        self.window = None
+
+    def open(self, screen):
+        super().open(screen)
+        self.window = DrawingWindow(screen)
+        self.window.frame()
+
+    def frame(self, svg):
+        super().frame(svg)
+        self.window.frame()
+
+    def delta(self, js):
+        super().delta(js)
+        self.window.apply(js)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A clock that only moves when the turtles wait, so animations take no time."""
+    now = [0.0]
+    def sleep(seconds):
+        now[0] += seconds
+    monkeypatch.setattr(time, "perf_counter", lambda: now[0])
+    monkeypatch.setattr(time, "sleep", sleep)
+    return now
+
+
+@pytest.fixture
+def recorded():
+    """Makes a screen in delta mode on a RecordingBackend, returning (screen, backend)."""
+    def make(realtime=False):
+        backend = RecordingBackend(realtime)
+        screen = T._Screen(backend)
+        screen.deltamode(True)
+        return screen, backend
+    return make
@@ -0,0 +1,64 @@
+"""Tests of the awaitable turtle methods such as aforward()."""
+
+import asyncio
+
+import pytest
+
+import ColabTurtlePlus.Turtle as T
+
+
+class WatchingBackend(T._CaptureBackend):
+    """Shows animations as they happen and notes where the turtles are in each frame."""
+    realtime = True
+
+    def __init__(self):
+        super().__init__()
+        self.seen = []
+
+    def frame(self, svg):
+        super().frame(svg)
+        self.seen.append([t.position() for t in self.screen.turtles()])
+
+    def open(self, screen):
+        # the turtles are only looked up in frames sent after the screen was made
+        self.screen = screen
+        super().open(screen)
+
+
+def test_gathered_turtles_move_at_the_same_time():
+    screen = T._Screen(WatchingBackend())
+    screen.framerate(0, 0)
+    a, b = T.RawTurtle(screen), T.RawTurtle(screen)
+    for t in (a, b):
+        t.speed(12)
+    b.left(90)
+    async def race():
+        return await asyncio.gather(a.aforward(200), b.aforward(200))
+    assert asyncio.run(race()) == [None, None]
+    assert a.position() == (200, 0) and b.position() == (0, 200)
+    # some frame shows both turtles on their way
+    assert any(0 < seen[0][0] < 200 and 0 < seen[1][1] < 200 for seen in screen.backend.seen if len(seen) == 2)
+    assert len(a.line_store) == len(b.line_store) == 1
+
+
+def test_cancelled_move_is_finished_at_once():
+    screen = T._Screen(WatchingBackend())
+    t = T.RawTurtle(screen)
+    t.speed(13)
+    async def interrupt():
+        task = asyncio.ensure_future(t.aforward(1000))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    asyncio.run(interrupt())
+    assert t.position() == (1000, 0)
+    assert list(t.line_store.coords) == [400.0, 300.0, 1400.0, 300.0]
+
+
+def test_errors_reach_the_caller():
+    t = T.RawTurtle(T._Screen(WatchingBackend()))
+    with pytest.raises(ValueError):
+        asyncio.run(t.acircle(10, "half"))
+    assert asyncio.run(t.astamp()) == t.stamp() - 1
+    assert T.RawTurtle.aforward.__name__ == "aforward"
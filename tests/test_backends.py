@@ -0,0 +1,78 @@
+"""Tests of the display backends."""
+
+import pytest
+
+import ColabTurtlePlus.Turtle as T
+
+
+class Events:
+    def __init__(self):
+        self.hooks = []
+
+    def register(self, event, function):
+        self.hooks.append((event, function))
+
+    def unregister(self, event, function):
+        self.hooks.remove((event, function))
+
+
+class Shell:
+    def __init__(self):
+        self.events = Events()
+
+
+class Output:
+    def __init__(self, content):
+        self.shown = [content]
+
+    def update(self, content):
+        self.shown.append(content)
+
+
+@pytest.fixture
+def kernel(monkeypatch):
+    """A notebook kernel with fake outputs, returning its shell."""
+    shell = Shell()
+    monkeypatch.setattr(T, "display", lambda content, display_id: Output(content))
+    monkeypatch.setattr(T, "HTML", lambda svg: svg)
+    monkeypatch.setattr(T, "Javascript", lambda js: js)
+    monkeypatch.setattr(T, "get_ipython", lambda: shell)
+    monkeypatch.setattr(T._IPythonBackend, "screens", T.weakref.WeakSet())
+    monkeypatch.setattr(T._IPythonBackend, "hooked", None)
+    return shell
+
+
+def test_one_hook_syncs_the_screens_still_shown(kernel):
+    first = T._Screen("ipython")
+    T.RawTurtle(first).forward(10)
+    first.clear()
+    second = T._Screen("ipython")
+    t = T.RawTurtle(second)
+    assert kernel.events.hooks == [("post_run_cell", T._syncIPythonScreens)]
+    assert list(T._IPythonBackend.screens) == [second]
+    second.deltamode(True)
+    t.forward(10)
+    shown = len(second.backend.drawing_window.shown)
+    T._syncIPythonScreens()
+    # the deltas sent in the cell are replaced by the whole drawing
+    assert len(second.backend.drawing_window.shown) == shown + 1
+    assert not second._delta_pending
+
+
+def test_backend_is_chosen_by_name_or_environment(monkeypatch):
+    assert isinstance(T._Screen("headless").backend, T._HeadlessBackend)
+    monkeypatch.setenv("COLABTURTLEPLUS_BACKEND", "capture")
+    assert isinstance(T._Screen().backend, T._CaptureBackend)
+    with pytest.raises(ValueError):
+        T._Screen("window")
+
+
+def test_headless_turtles_move_without_frames():
+    backend = T._CaptureBackend()
+    backend.renders = False
+    screen = T._Screen(backend)
+    t = T.RawTurtle(screen)
+    t.circle(50)
+    t.forward(100)
+    assert len(backend.frames) == 1
+    assert t.position() == (100, 0)
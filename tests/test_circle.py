@@ -0,0 +1,43 @@
+"""Tests of circle(), animated and not."""
+
+import pytest
+
+import ColabTurtlePlus.Turtle as T
+
+
+def draw(screen, radius, extent):
+    t = T.RawTurtle(screen)
+    t.speed(13)
+    t.left(30)
+    t.begin_fill()
+    t.circle(radius, extent)
+    t.end_fill()
+    return t
+
+
+@pytest.mark.parametrize("radius, extent", [(50, 90), (-40, 270), (60, None), (-25, 500)])
+def test_animated_circle_adds_the_same_geometry(radius, extent):
+    plain = draw(T._Screen("headless"), radius, extent)
+    animated = draw(T._Screen(T._CaptureBackend()), radius, extent)
+    assert len(animated.screen.backend.frames) > 3
+    for store in ("line_store", "dot_store"):
+        a, b = getattr(plain, store), getattr(animated, store)
+        assert (list(a.kinds), list(a.coords)) == (list(b.kinds), list(b.coords))
+    assert animated.position() == plain.position()
+    assert animated.heading() == plain.heading()
+
+
+def test_animated_circle_computes_its_arcs_once(monkeypatch):
+    screen = T._Screen(T._CaptureBackend())
+    t = T.RawTurtle(screen)
+    t.speed(13)
+    arcs = []
+    arc = screen._arc
+    monkeypatch.setattr(screen, "_arc", lambda *args: arcs.append(args[1]) or arc(*args))
+    truncated = []
+    monkeypatch.setattr(t.line_store, "truncate", truncated.append)
+    t.circle(30, 270)
+    assert arcs == [180, 90]
+    assert truncated == []
+    # the overlay only held the arc while it was drawn
+    assert t.svg_overlay_string == ""
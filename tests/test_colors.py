@@ -0,0 +1,58 @@
+"""Tests of color normalization, getcolors() and colormap()."""
+
+import pytest
+
+import ColabTurtlePlus.Turtle as T
+
+
+def test_colors_are_normalized():
+    t = T.RawTurtle(T._Screen("headless"))
+    for color, normalized in (("RED", "red"), ("#ABC", "#aabbcc"), ("rgb(255, 0, 16)", "#ff0010"), ((0, 128, 255), "#0080ff")):
+        t.pencolor(color)
+        assert t.pencolor() == normalized
+    with pytest.raises(ValueError):
+        t.pencolor("reddish")
+    with pytest.raises(ValueError):
+        t.pencolor((0, 0, 256))
+
+
+def test_color_validation_does_not_depend_on_the_cache():
+    t = T.RawTurtle(T._Screen("headless"))
+    T._cachedColor.cache_clear()
+    with pytest.raises(ValueError):
+        t.pencolor((255.0, 0, 0))
+    t.pencolor((255, 0, 0))
+    assert t.pencolor() == "#ff0000"
+    with pytest.raises(ValueError):
+        t.pencolor((255.0, 0, 0))
+    assert t.screen.cachestats()["color_misses"] == 1
+
+
+def test_getcolors_normalizes_sequences_and_arrays():
+    assert T.getcolors(["Blue", [255, 255, 0], (1, 2, 3)]) == ["blue", "#ffff00", "#010203"]
+    with pytest.raises(ValueError):
+        T.getcolors("red")
+    with pytest.raises(ValueError):
+        T.getcolors([3])
+    if T.np is None:
+        return
+    np = T.np
+    assert T.getcolors(np.array([[0, 0, 0], [255, 128, 1]])) == ["#000000", "#ff8001"]
+    assert T.getcolors(np.array([[1.0, 0.5, 0.0]])) == ["#ff8000"]
+    with pytest.raises(ValueError):
+        T.getcolors(np.array([[1.5, 0, 0]]))
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_colormap_interpolates_between_its_colors(numpy, monkeypatch):
+    if not numpy:
+        monkeypatch.setattr(T, "np", None)
+    elif T.np is None:
+        pytest.skip("NumPy is not installed")
+    assert T.colormap("gray", [-1, 0, 0.5, 1, 2]) == ["#000000", "#000000", "#808080", "#ffffff", "#ffffff"]
+    assert T.colormap("viridis", range(11), 0, 10)[::10] == ["#440154", "#fde725"]
+    assert T.colormap("gray", 3, 0, 12) == "#404040"
+    with pytest.raises(ValueError):
+        T.colormap("no such map", 0.5)
+    with pytest.raises(ValueError):
+        T.colormap("gray", 0.5, 1, 1)
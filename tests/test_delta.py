@@ -0,0 +1,71 @@
+"""Tests of delta mode, where only the changes of the drawing are sent."""
+
+import json
+
+import ColabTurtlePlus.Turtle as T
+
+
+def test_delta_updates_match_whole_frames(recorded):
+    screen, backend = recorded()
+    t = T.RawTurtle(screen)
+    t.speed(13)
+    for i in range(40):
+        t.forward(30)
+        t.left(100)
+    t.begin_fill()
+    t.circle(40, 270)
+    t.end_fill()
+    t.dot(8, "red")
+    t.write("hello")
+    screen._pushDrawing()
+    assert backend.deltas
+    backend.window.check()
+
+
+def test_longer_path_sends_only_its_new_vertices(recorded):
+    screen, backend = recorded()
+    t = T.RawTurtle(screen)
+    t.speed(13)
+    t.forward(5)
+    for i in range(300):
+        t.left(1)
+        t.forward(1)
+    lines = "{}-lines-0".format(screen._svg_id)
+    ops = [op for js in backend.deltas[-50:] for op in json.loads(js[js.index(",")+1:-2]) if op[1] == lines]
+    # a move adds a few numbers to the path, however long the path already is
+    assert ops and all(op[0] == "e" and len(op[2]) < 20 for op in ops)
+    assert len(t.line_store) == 1
+    backend.window.check()
+
+
+def test_delta_mode_off_sends_whole_frames():
+    backend = T._CaptureBackend()
+    screen = T._Screen(backend)
+    assert not screen.deltamode()
+    t = T.RawTurtle(screen)
+    t.forward(20)
+    assert backend.deltas == []
+    assert 'id="{}-lines-0"'.format(screen._svg_id) in backend.frames[-1]
+    screen.deltamode(True)
+    t.forward(20)
+    assert backend.deltas
+
+
+def test_simplified_path_is_sent_again_as_it_grows(recorded):
+    screen, backend = recorded()
+    screen.simplify(2)
+    t = T.RawTurtle(screen)
+    t.speed(13)
+    lines = "{}-lines-0".format(screen._svg_id)
+    for i in range(120):
+        t.forward(4)
+        t.left(3 if i % 40 < 20 else -3)
+        if i % 30 == 29:
+            # the window shows the path as simplified with all its vertices
+            assert backend.window.markup(lines) == t.line_store.markup(screen._styles, precision=screen._precision, view=screen._cullView(), lod=2)
+    assert len(t.line_store) == 1
+    ops = [op for js in backend.deltas for op in json.loads(js[js.index(",")+1:-2]) if op[1] == lines]
+    assert ops and all(op[0] != "e" for op in ops)
+    screen.simplify(0)
+    t.forward(4)
+    backend.window.check()
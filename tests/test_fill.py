@@ -0,0 +1,55 @@
+"""Tests of fills, which are kept as one record of the line store."""
+
+import ColabTurtlePlus.Turtle as T
+
+
+def test_fill_without_a_move_adds_nothing():
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    t.forward(50)
+    before = t.line_store.markup(screen._styles)
+    t.begin_fill()
+    t.left(90)
+    t.end_fill()
+    assert len(t.line_store) == 1
+    assert t.line_store.markup(screen._styles) == before
+
+
+def test_lines_of_a_fill_become_its_path():
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    t.pencolor("red")
+    t.forward(10)
+    t.begin_fill()
+    for i in range(4):
+        t.forward(40)
+        t.left(90)
+    t.end_fill()
+    store = t.line_store
+    assert list(store.kinds) == [T._RUN, T._FILL]
+    assert list(store.coords[store.starts[1]:]) == [410, 300, 0, 450, 300, 0, 450, 260, 0, 410, 260, 0, 410, 300]
+    assert '<path d="M 410 300 L 450 300 L 450 260 L 410 260 L 410 300"' in store.markup(screen._inline_styles)
+    assert "stroke:red" in store.markup(screen._inline_styles)
+
+
+def test_fill_leaves_the_drawing_before_it_alone():
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    for i in range(3000):
+        t.forward(1)
+        t.penup() if i % 2 else t.pendown()
+    store = t.line_store
+    drawn = len(store)
+    coords = store.coords[:]
+    store.chunkedMarkup(screen._styles)
+    first = store.render_chunks[0]
+    t.begin_fill()
+    t.circle(20)
+    t.end_fill()
+    assert len(store) == drawn + 1 and store.kinds[-1] == T._FILL
+    assert store.coords[:len(coords)] == coords
+    # only the group of the last chunk is made again
+    assert store.cached == drawn
+    svg = store.chunkedMarkup(screen._styles)
+    assert store.render_chunks[0] is first and len(store.render_chunks) == 2
+    assert svg.endswith('<path d="M 3400 300 A 20 20 0 0 0 3400 260 A 20 20 0 0 0 3400 300" stroke-linecap="round" class="s1" /></g>')
@@ -0,0 +1,64 @@
+"""Tests of when frames are sent to the drawing window."""
+
+import pytest
+
+import ColabTurtlePlus.Turtle as T
+
+
+def test_frame_rate_limits_the_updates_sent(recorded, clock):
+    screen, backend = recorded(realtime=True)
+    screen.framerate(10)
+    t = T.RawTurtle(screen)
+    t.speed(13)
+    for i in range(200):
+        t.dot(2 + i % 5)
+    # one frame for the turtle, and at most one per tenth of a second after it
+    assert len(backend.deltas) <= 2 + clock[0]*10
+    # the dots left out of the last frame are shown at the end of the cell
+    assert screen._frame_pending
+    screen._syncDrawing()
+    assert not screen._frame_pending
+    backend.window.check()
+    sent = len(backend.deltas)
+    start = clock[0]
+    t.forward(2000)
+    # the end of a move is always shown
+    assert len(backend.deltas) - sent <= 2 + (clock[0] - start)*10
+    backend.window.check()
+
+
+def test_turn_after_move_is_animated(recorded, clock):
+    screen, backend = recorded(realtime=True)
+    t = T.RawTurtle(screen)
+    for speed in (5, 13):
+        t.speed(speed)
+        t.forward(50)
+        sent = len(backend.deltas)
+        t.left(90)
+        assert any("animateTransform" in js for js in backend.deltas[sent:])
+
+
+def test_framerate_checks_its_limits():
+    screen = T._Screen("headless")
+    screen.framerate(0, 1000)
+    assert screen.framerate() == (0, 1000)
+    with pytest.raises(ValueError):
+        screen.framerate(-1)
+    with pytest.raises(ValueError):
+        screen.framerate("fast")
+
+
+def test_batch_does_not_wait_and_sends_one_update(recorded, clock):
+    screen, backend = recorded(realtime=True)
+    t = T.RawTurtle(screen)
+    frames, deltas = len(backend.frames), len(backend.deltas)
+    with screen.batch():
+        for i in range(20):
+            t.forward(10)
+            t.left(18)
+            t.delay(0.5)
+        t.done()
+        assert clock[0] == 0
+        assert (len(backend.frames), len(backend.deltas)) == (frames, deltas)
+    assert len(backend.frames) + len(backend.deltas) == frames + deltas + 1
+    backend.window.check()
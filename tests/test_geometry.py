@@ -0,0 +1,112 @@
+"""Tests of the geometry stores: culling boxes and spatial queries."""
+
+import ColabTurtlePlus.Turtle as T
+
+
+def box_of(store):
+    store._boxTo()
+    b = store.boxes
+    return min(b[0::4]), min(b[1::4]), max(b[2::4]), max(b[3::4])
+
+
+def test_clockwise_arc_box_holds_the_arc():
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    t.speed(0)
+    t.jumpto(-20, 0)
+    t.circle(-50, 180)
+    x0, y0, x1, y1 = box_of(t.line_store)
+    # the half circle below the start bulges to the right of its chord
+    assert x0 <= 380 and x1 >= 430 - 1e-9
+    assert y0 <= 300 and y1 >= 400 - 1e-9
+
+
+def test_clockwise_fill_at_the_edge_is_not_culled():
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    t.speed(0)
+    t.penup()
+    t.goto(-420, 50)
+    t.begin_fill()
+    t.circle(-60)
+    t.end_fill()
+    x0, y0, x1, y1 = box_of(t.line_store)
+    # the circle lies right of the start, from -80 to 40 in the window
+    assert x0 <= -80 + 1e-9 and x1 >= 40 - 1e-9
+    view = screen._cullView()
+    assert "<path" in t.line_store.markup(screen._inline_styles, view=view)
+
+
+def test_fill_arcs_use_the_radii_of_the_window():
+    screen = T._Screen("headless")
+    screen.setworldcoordinates(-1, -1, 1, 1)
+    t = T.RawTurtle(screen)
+    t.speed(0)
+    t.penup()
+    t.goto(0, -0.5)
+    t.begin_fill()
+    t.circle(0.5)
+    t.end_fill()
+    # one world unit is 400 pixels across and 300 pixels up
+    x0, y0, x1, y1 = box_of(t.line_store)
+    assert x0 <= 200 + 1e-9 and x1 >= 600 - 1e-9
+    assert y0 <= 150 + 1e-9 and y1 >= 450 - 1e-9
+    assert "A 200 150 0 0 0 " in t.line_store.markup(screen._inline_styles)
+
+
+def test_find_items_gives_the_segments_of_a_long_path_near_the_box():
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    t.walk([10]*400, 0)
+    assert len(t.line_store) == 1
+    items = screen.find_items((95, -5, 125, 5))
+    assert [points for turtle, kind, points in items] == [((x, 0.0), (x + 10, 0.0)) for x in (90, 100, 110, 120)]
+    assert {(turtle, kind) for turtle, kind, points in items} == {(t, "line")}
+    # the path grows after it was searched
+    t.left(90)
+    t.walk([10]*5, 0)
+    assert screen.find_items((3995, 15, 4005, 25)) == [(t, "line", ((4000.0, 10.0), (4000.0, 20.0))), (t, "line", ((4000.0, 20.0), (4000.0, 30.0)))]
+
+
+def test_diagonal_segment_is_found_only_where_it_crosses_the_box():
+    screen = T._Screen("headless")
+    screen.drawline(0, 0, 100, 100)
+    assert screen.find_items((60, 0, 100, 30)) == []
+    assert screen.find_items((60, 50, 100, 70)) == [(None, "line", ((0.0, 0.0), (100.0, 100.0)))]
+
+
+def test_items_other_than_lines_give_their_points():
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    t.speed(0)
+    t.penup()
+    t.begin_fill()
+    for i in range(3):
+        t.forward(50)
+        t.left(120)
+    t.end_fill()
+    t.dot(5)
+    t.goto(0, 100)
+    t.write("hi")
+    kinds = {kind: points for turtle, kind, points in screen.find_items((-10, -10, 60, 110))}
+    assert kinds.keys() == {"fill", "dot", "text"}
+    assert [tuple(round(v, 3) for v in point) for point in kinds["fill"]] == [(0, 0), (50, 0), (25, 43.301), (0, 0)]
+    assert kinds["dot"] == ((0.0, 0.0),)
+    assert kinds["text"] == ((0.0, 100.0),)
+
+
+def test_nearest_gives_the_nearest_segment_in_world_coordinates():
+    screen = T._Screen("headless")
+    screen.setworldcoordinates(0, 0, 10, 10)
+    t = T.RawTurtle(screen)
+    t.speed(0)
+    t.goto(2, 2)
+    t.walk([1]*6, 90)
+    screen.drawline(9, 0, 9, 10)
+    (turtle, kind, points), distance = screen.nearest(3.5, 3.5)
+    assert (turtle, kind) == (t, "line")
+    assert [tuple(round(v, 6) for v in point) for point in points] == [(3, 2), (3, 3)]
+    # from (3.5, 3.5) to (3, 3), with 80 pixels across and 60 pixels up in a unit
+    assert round(distance, 6) == 50
+    assert screen.nearest((8.8, 5))[0] == (None, "line", ((9.0, 0.0), (9.0, 10.0)))
+    assert T._Screen("headless").nearest(0, 0) is None
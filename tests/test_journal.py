@@ -0,0 +1,54 @@
+"""Tests of the command journal and replay()."""
+
+import ColabTurtlePlus.Turtle as T
+
+
+def test_methods_are_only_wrapped_while_journaling():
+    assert not hasattr(T.RawTurtle.forward, "__wrapped__")
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    screen.journaling(True)
+    try:
+        assert T.RawTurtle.forward.__wrapped__
+        t.forward(10)
+    finally:
+        screen.journaling(False)
+    assert not hasattr(T.RawTurtle.forward, "__wrapped__")
+    t.forward(10)
+    assert screen.journal() == [(0, None, (), None), (0, "forward", (10,), None)]
+
+
+def test_journal_keeps_arguments_as_given():
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    t.forward(10)
+    assert screen.journal() == []
+    screen.journaling(True)
+    try:
+        xs, ys = [1.0, 2.0], [3.0, 4.0]
+        t.path(xs, ys)
+        xs[0] = ys[0] = 99
+        t.heading()
+    finally:
+        screen.journaling(False)
+    # the query heading() is not kept
+    assert screen.journal()[-1] == (t._tid, "path", ([1.0, 2.0], [3.0, 4.0]), None)
+
+
+def test_replay_at_another_size_scales_world_coordinates():
+    screen = T._Screen("headless")
+    screen.journaling(True)
+    try:
+        screen.setworldcoordinates(-10, -10, 10, 10)
+        t = T.RawTurtle(screen)
+        t.goto(5, 5)
+        t.dot(3, "blue")
+    finally:
+        screen.journaling(False)
+    big = screen.replay(size=(1600, 1200))
+    assert big.window_size == (1600, 1200)
+    r = big.turtles()[0]
+    assert r.position() == t.position()
+    assert r.turtle_pos == (2*t.turtle_pos[0], 2*t.turtle_pos[1])
+    half = screen.replay(stop=2)
+    assert half.turtles()[0].position() == (0, 0)
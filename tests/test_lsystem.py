@@ -0,0 +1,48 @@
+"""Tests of ColabTurtlePlus.lsystem."""
+
+import pytest
+
+import ColabTurtlePlus.Turtle as T
+from ColabTurtlePlus import lsystem
+from ColabTurtlePlus.lsystem import LSystem
+
+
+def test_expansion_is_streamed_in_chunks():
+    koch = LSystem("F", ["F -> F+F-F-F+F"])
+    assert koch.derivation(1) == "F+F-F-F+F"
+    assert koch.derivation(2) == koch.derivation(1).replace("F", "F+F-F-F+F")
+    chunks = list(koch.expand(8))
+    assert sum(map(len, chunks)) == koch.length(8) == 5**8 + 4*(5**8 - 1)//4
+    assert max(map(len, chunks)) < 2*lsystem.CHUNK_SIZE
+
+
+def test_rules_must_replace_one_symbol():
+    assert LSystem("X", {"X": "F X"}).derivation(2) == "FFX"
+    with pytest.raises(ValueError):
+        LSystem("X", ["XY -> F"])
+    with pytest.raises(ValueError):
+        LSystem("X", ["X = F"])
+
+
+def test_draw_follows_turns_and_branches():
+    t = T.RawTurtle(T._Screen("headless"))
+    LSystem("F+F+F+F+", []).draw(t, 0, 50)
+    assert t.position() == (0, 0) and t.heading() == 0
+    LSystem("[+F]f", []).draw(t, 0, 30)
+    assert t.position() == (30, 0) and t.heading() == 0
+    with pytest.raises(ValueError):
+        LSystem("F]", []).draw(t, 0, 10)
+
+
+def test_replay_of_lsystem_draws_the_same_segments():
+    screen = T._Screen("headless")
+    screen.journaling(True)
+    try:
+        t = T.RawTurtle(screen)
+        LSystem("F", ["F -> F+F-F-F+F"], angle=90).draw(t, 3, 4)
+        LSystem("X", ["X -> F[+X]F[-X]+X", "F -> FF"], angle=25).draw(t, 3, 3)
+    finally:
+        screen.journaling(False)
+    replayed = screen.replay()
+    assert len(t.line_store.coords) > 0
+    assert [r.line_store.coords for r in replayed.turtles()] == [t.line_store.coords]
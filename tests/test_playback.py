@@ -0,0 +1,64 @@
+"""Tests of playback(), where the drawing window plays the animations."""
+
+import json
+
+import pytest
+
+import ColabTurtlePlus.Turtle as T
+
+
+class RealtimeBackend(T._CaptureBackend):
+    realtime = True
+
+
+# The steps of the timelines sent since message 'start'
+def steps(backend, start=0):
+    out = []
+    for js in backend.deltas[start:]:
+        if js.startswith("ColabTurtlePlus.play("):
+            out.extend(json.loads(js[js.index(",")+1:-2]))
+    return out
+
+
+def test_turtle_does_not_wait_for_its_animation(clock):
+    backend = RealtimeBackend()
+    screen = T._Screen(backend)
+    screen.deltamode(True)
+    screen.playback(True)
+    t = T.RawTurtle(screen)
+    t.speed(5)
+    sent = len(backend.deltas)
+    t.forward(100)
+    t.left(90)
+    t.delay(0.5)
+    screen.playback(False)
+    assert clock[0] == 0
+    # the line is drawn at once, and the window glides the turtle along it
+    assert len(t.line_store) == 1
+    (move, turn, wait) = steps(backend, sent)
+    sprite, overlay = screen._groupId("turtle", t), screen._groupId("overlay", t)
+    assert move[0] == pytest.approx(10*0.2*t.timeout)
+    assert move[2] == [[sprite, 100.0, 0.0, 0, 500.0, 300.0, overlay, 400.0, 300.0, 'class="s0"']]
+    assert turn[0] == pytest.approx(t.timeout) and turn[2] == [[sprite, 0.0, 0.0, -90, 500.0, 300.0]]
+    assert wait == [0.5, [], [], []]
+
+
+@pytest.mark.parametrize("speed", [1, 7, 13])
+def test_steps_last_as_long_as_the_speed_says(speed):
+    screen = T._Screen(T._CaptureBackend())
+    screen.playback(True)
+    t = T.RawTurtle(screen)
+    t.speed(speed)
+    screen._flushTimeline()
+    sent = len(screen.backend.deltas)
+    t.forward(55)
+    t.circle(20, 90)
+    screen._flushTimeline()
+    durations = [step[0] for step in steps(screen.backend, sent)]
+    seconds = T.SPEED_TO_SEC_MAP[speed]
+    # 6 pieces of 10 pixels at a fifth of the turtle's delay, and 6 pieces of 15 degrees at half of it,
+    # each rounded to milliseconds
+    assert sum(durations) == pytest.approx(6*0.2*seconds + 6*0.5*seconds, abs=0.0005*len(durations))
+    # the whole drawing still reaches the window at the end of the cell
+    screen._syncDrawing()
+    assert 'id="{}"'.format(screen._svg_id) in screen.backend.frames[-1]
@@ -0,0 +1,69 @@
+"""Tests of simplify(), which draws long paths to a pixel tolerance."""
+
+import io
+import re
+
+import pytest
+
+import ColabTurtlePlus.Turtle as T
+
+
+def vertex_count(svg):
+    d = re.search(r'<path d="([^"]*)"', svg).group(1)
+    return len(re.findall(r"-?[0-9]*\.?[0-9]+", d))//2
+
+
+def wiggle(t, n):
+    for i in range(n):
+        t.forward(1)
+        t.left(1 if i % 2 else -1)
+
+
+def test_straight_path_keeps_only_its_ends():
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    t.walk([5]*100, 0)
+    screen.simplify(0.01)
+    assert screen.simplify() == 0.01
+    svg = t.line_store.markup(screen._styles, lod=screen._lod)
+    assert vertex_count(svg) == 2
+    # the store keeps every vertex
+    assert len(t.line_store.coords) == 202
+    screen.simplify(0)
+    assert vertex_count(t.line_store.markup(screen._styles)) == 101
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_simplified_path_stays_within_the_tolerance(numpy, monkeypatch):
+    if not numpy:
+        monkeypatch.setattr(T, "np", None)
+    elif T.np is None:
+        pytest.skip("NumPy is not installed")
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    wiggle(t, 400)
+    store = t.line_store
+    full = vertex_count(store.markup(screen._styles))
+    kept = vertex_count(store.markup(screen._styles, lod=1))
+    assert kept < full//4
+    xs, ys = store.coords[0::2], store.coords[1::2]
+    keep = [False]*len(xs)
+    keep[0] = keep[-1] = True
+    T._douglasPeucker(list(xs), list(ys), [(0, len(xs)-1)], 1, keep)
+    assert sum(keep) == kept
+
+
+def test_saved_files_are_simplified_only_when_asked():
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    wiggle(t, 300)
+    screen.simplify(1)
+    saved = io.StringIO()
+    screen.saveSVG(saved)
+    assert vertex_count(saved.getvalue()) == 301
+    screen.simplify(files=True)
+    saved = io.StringIO()
+    screen.saveSVG(saved)
+    assert vertex_count(saved.getvalue()) < 100
+    with pytest.raises(ValueError):
+        screen.simplify(-1)
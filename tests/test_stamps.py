@@ -0,0 +1,42 @@
+"""Tests of stamps and their removal."""
+
+import json
+
+import ColabTurtlePlus.Turtle as T
+
+
+def test_clearstamps_removes_the_first_or_last_stamps():
+    t = T.RawTurtle(T._Screen("headless"))
+    ids = []
+    for i in range(6):
+        ids.append(t.stamp(layer=i % 2))
+        t.forward(10)
+    t.clearstamps(2)
+    t.clearstamps(-1)
+    assert list(t.stamp_layer) == ids[2:5]
+    assert list(t.stampsB.items) == [ids[2], ids[4]]
+    assert list(t.stampsT.items) == [ids[3]]
+    t.clearstamp((ids[2], ids[3]))
+    t.clearstamp(ids[0])
+    assert list(t.stamp_layer) == [ids[4]]
+    t.clearstamps()
+    assert len(t.stampsB) == len(t.stampsT) == 0
+
+
+def test_removed_stamps_are_removed_one_by_one_from_the_window(recorded):
+    screen, backend = recorded()
+    t = T.RawTurtle(screen)
+    t.speed(0)
+    ids = [t.stamp() for i in range(50)]
+    t.done()
+    t.clearstamp(ids[10])
+    t.done()
+    backend.window.check()
+    t.clearstamp(ids[20])
+    screen._pushDrawing()
+    ops = json.loads(backend.deltas[-1][backend.deltas[-1].index(",")+1:-2])
+    assert ops == [["r", "{}-stampsB-0-{}".format(screen._svg_id, ids[20])]]
+    t.stamp()
+    t.clearstamps(-3)
+    screen._pushDrawing()
+    backend.window.check()
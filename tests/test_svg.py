@@ -0,0 +1,93 @@
+"""Tests of the svg written by saveSVG() and showSVG()."""
+
+import gzip
+import io
+import re
+
+import pytest
+
+import ColabTurtlePlus.Turtle as T
+
+
+def drawing():
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    t.walk([40]*36, 170)
+    t.begin_fill()
+    t.circle(30)
+    t.end_fill()
+    t.write("svg")
+    t.stamp()
+    return screen
+
+
+def test_svgz_file_holds_the_same_svg(tmp_path):
+    screen = drawing()
+    screen.saveSVG(str(tmp_path / "plain"))
+    screen.saveSVG(str(tmp_path / "packed.svgz"))
+    svg = (tmp_path / "plain.svg").read_bytes()
+    packed = (tmp_path / "packed.svgz").read_bytes()
+    assert packed[:2] == b"\x1f\x8b"
+    assert gzip.decompress(packed) == svg
+    assert svg.startswith(b"<svg") and svg.endswith(b"</svg>")
+
+
+def test_file_objects_get_the_same_svg(tmp_path, capsys):
+    screen = drawing()
+    screen.saveSVG(str(tmp_path / "drawing.svg"), turtle=True)
+    text, binary = io.StringIO(), io.BytesIO()
+    screen.saveSVG(text, turtle=True)
+    screen.saveSVG(binary, turtle=True)
+    svg = (tmp_path / "drawing.svg").read_text()
+    assert text.getvalue() == binary.getvalue().decode("utf-8") == svg
+    screen.showSVG(turtle=True)
+    assert capsys.readouterr().out == svg + "\n"
+
+
+def test_long_path_is_written_in_pieces(monkeypatch):
+    monkeypatch.setattr(T, "SVG_RUN_PIECE", 50)
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    t.walk([3]*500, 1)
+    pieces = list(screen._iterSvgFile())
+    whole = t.line_store.markup(screen._inline_styles, precision=screen._precision, view=screen._cullView())
+    assert max(map(len, pieces)) < len(whole)
+    assert whole in "".join(pieces).replace("\n", "")
+
+
+def test_numbers_are_written_in_their_shortest_form():
+    assert [T._shortNumber(v, 3) for v in (400.0, 0.5, -0.25, -0.0001, 12.3456)] == ["400", ".5", "-.25", "0", "12.346"]
+    assert T._shortNumber(2.5, 0) == "2"
+    assert T._joinNumbers(["1", "-2", ".5"]) == " 1-2 .5"
+
+
+def test_relative_path_ends_at_the_rounded_end_at_any_precision():
+    screen = T._Screen("headless")
+    t = T.RawTurtle(screen)
+    t.walk([0.37]*200, 0.7)
+    end = t.turtle_pos
+    for n in (0, 1, 3):
+        screen.precision(n)
+        path = t.line_store.markup(screen._styles, precision=n)
+        numbers = [float(v) for v in re.findall(r"-?[0-9]*\.?[0-9]+", re.search(r'd="([^"]*)"', path).group(1))]
+        x, y = sum(numbers[0::2]), sum(numbers[1::2])
+        # the offsets come from rounded positions, so their rounding errors do not add up
+        assert (round(x, n), round(y, n)) == (round(end[0], n), round(end[1], n))
+    with pytest.raises(ValueError):
+        screen.precision(11)
+
+
+def test_saved_file_needs_no_style_sheet():
+    screen = drawing()
+    t = screen.turtles()[0]
+    t.dot(6, "red")
+    t.write("bold", font=("Arial", 12, "bold"))
+    out = io.StringIO()
+    screen.saveSVG(out)
+    svg = out.getvalue()
+    assert "<style" not in svg and "class=" not in svg
+    assert '<circle cx="400" cy="300" r="3" style="fill:red;fill-opacity:1" />' in svg
+    assert "style=\"fill:black;text-anchor:start;font-size:12px;font-family:'Arial';font-weight:bold;\">bold</text>" in svg
+    # the drawing window still refers to the styles by class
+    live = screen._generateSvgDrawing()
+    assert 'class="s' in live and "#{} .s0{{".format(screen._svg_id) in live
@@ -0,0 +1,45 @@
+"""Tests of animated motions that follow the clock."""
+
+import pytest
+
+import ColabTurtlePlus.Turtle as T
+
+
+def test_last_frame_shows_the_committed_geometry(recorded, clock):
+    screen, backend = recorded(realtime=True)
+    t = T.RawTurtle(screen)
+    overlay = screen._groupId("overlay", t)
+    for speed in (1, 6, 11):
+        t.speed(speed)
+        t.forward(120)
+        # nothing is left for the end of the cell: the window already shows the line in the drawing
+        backend.window.check()
+        assert backend.window.markup(overlay) == ""
+        t.circle(40, 200)
+        backend.window.check()
+        # a turn is animated by the window itself, so it is checked with the next move
+        t.left(30)
+    # a path and the two arcs of the circle for each speed
+    assert len(t.line_store) == 3*3
+
+
+@pytest.mark.parametrize("cost", [0, 0.1])
+def test_move_takes_its_time_however_slow_the_frames(recorded, clock, cost):
+    screen, backend = recorded(realtime=True)
+    send = backend.delta
+    def slow(js):
+        clock[0] += cost
+        send(js)
+    backend.delta = slow
+    t = T.RawTurtle(screen)
+    t.speed(3)
+    sent, start = len(backend.deltas), clock[0]
+    t.forward(200)
+    # 20 pieces of 10 pixels, each a fifth of half a second, and at most the last two frames late
+    assert clock[0] - start == pytest.approx(2, abs=2*cost + 0.01)
+    frames = len(backend.deltas) - sent
+    assert frames <= 2*screen.framerate()[0] + 1
+    if cost:
+        # frames are dropped when drawing falls behind
+        assert frames <= 2/cost + 1
+    backend.window.check()
@@ -0,0 +1,58 @@
+"""Tests of together(), which moves several turtles at the same time."""
+
+import pytest
+
+import ColabTurtlePlus.Turtle as T
+
+
+def racers(screen, n):
+    turtles = [T.RawTurtle(screen) for i in range(n)]
+    for i, t in enumerate(turtles):
+        t.speed(13)
+        t.penup()
+        t.goto(-300, 100*i - 150)
+        t.pendown()
+    return turtles
+
+
+def test_race_costs_one_update_per_frame(recorded):
+    screen, backend = recorded()
+    turtles = racers(screen, 4)
+    sent = len(backend.deltas)
+    with screen.together():
+        for t in turtles:
+            assert t.forward(100) is None
+        # queries are answered at once, before anything moved
+        assert turtles[0].position() == (-300, -150)
+    # a move of 100 pixels is shown in 10 frames, whatever the number of turtles
+    assert len(backend.deltas) - sent == 10
+    assert [t.position() for t in turtles] == [(-200, 100*i - 150) for i in range(4)]
+    backend.window.check()
+
+
+def test_each_turtle_keeps_its_speed_and_order(recorded, clock):
+    screen, backend = recorded(realtime=True)
+    hare, tortoise = racers(screen, 2)
+    tortoise.speed(1)
+    start = clock[0]
+    with screen.together():
+        tortoise.forward(20)
+        for i in range(4):
+            hare.forward(50)
+            hare.left(90)
+    assert hare.position() == (-300, -150) and tortoise.position() == (-280, -50)
+    # the turtles wait for each other's frames, not for each other's moves
+    assert clock[0] - start == pytest.approx(2*0.2*T.SPEED_TO_SEC_MAP[1], abs=0.01)
+    backend.window.check()
+
+
+def test_failing_call_ends_the_block_with_its_error():
+    screen = T._Screen("headless")
+    a, b = racers(screen, 2)
+    with pytest.raises(ValueError):
+        with screen.together():
+            a.forward(30)
+            b.circle(10, "half")
+            b.forward(30)
+    assert a.position() == (-270, -150)
+    assert b.position() == (-300, -50)
@@ -0,0 +1,40 @@
+"""Tests of the bulk motions walk() and path(), with and without NumPy."""
+
+import pytest
+
+import ColabTurtlePlus.Turtle as T
+
+
+@pytest.fixture(params=["numpy", "no numpy"])
+def turtle(request, monkeypatch):
+    if request.param == "no numpy":
+        monkeypatch.setattr(T, "np", None)
+    elif T.np is None:
+        pytest.skip("NumPy is not installed")
+    return T.RawTurtle(T._Screen("headless"))
+
+
+def test_walk_takes_any_sequence_of_steps(turtle):
+    turtle.walk(range(1, 5), (90 for i in range(4)))
+    # steps of 1, 2, 3 and 4 turning left after each
+    assert turtle.position() == (-2, -2)
+    assert turtle.heading() == 0
+    assert len(turtle.line_store) == 1
+
+
+def test_walk_repeats_a_single_number(turtle):
+    turtle.walk(10, [90, 90, 90, 90])
+    assert turtle.position() == (0, 0)
+    with pytest.raises(ValueError):
+        turtle.walk([1, 2, 3], [90, 90])
+    with pytest.raises(ValueError):
+        turtle.walk("far")
+
+
+def test_path_takes_any_sequence_of_points(turtle):
+    turtle.penup()
+    turtle.path(range(3), (y*y for y in range(3)))
+    assert turtle.position() == (2, 4)
+    assert len(turtle.line_store) == 0
+    with pytest.raises(ValueError):
+        turtle.path([1, 2], [1])